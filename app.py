@@ -1,46 +1,119 @@
+import click
 from flask import Flask
-from werkzeug.security import generate_password_hash
-from models.models import db, User
+from flask.cli import with_appcontext
+from werkzeug.utils import import_string
 from config import Config
-from controllers.auth_controller import init_auth_routes 
-from controllers.admin_controller import init_admin_routes
-from controllers.user_controller import init_user_routes
 
-app = Flask(__name__)
-app.config.from_object(Config)
-db.init_app(app)
+# Controllers are imported by create_app, not here, so importing this module
+# (CLI, workers, benchmarks) only costs Flask itself
+BLUEPRINTS = (
+    "controllers.auth_controller:auth_bp",
+    "controllers.admin_controller:admin_bp",
+    "controllers.user_controller:user_bp",
+    "controllers.live_controller:live_bp",
+    "controllers.api_controller:api_bp",
+)
+
+def create_app(config=Config):
+    """Build the app. Nothing here touches the database; run `flask --app app init-db` once for that."""
+    from models.models import db
+    from models.engine import init_engine
+    from services.metrics import init_metrics
+
+    app = Flask(__name__)
+    app.config.from_object(config)
+    db.init_app(app)
+    init_engine(app)  # SQLite PRAGMAs from the engine profile
+    init_metrics(app)  # no-op unless METRICS_ENABLED
+
+    for blueprint in BLUEPRINTS:
+        app.register_blueprint(import_string(blueprint))
+
+    app.cli.add_command(init_db)
+    app.cli.add_command(backfill_analytics)
+    app.cli.add_command(archive_reservations)
+    app.cli.add_command(run_jobs)
+    return app
 
 def create_admin_user():
-    with app.app_context():
-        db.create_all()  # Create tables if not already created
-
-        # Check if admin exists
-        admin_email = "admin@parking.com"
-        existing_admin = User.query.filter_by(email=admin_email).first()
-
-        if not existing_admin:
-            admin = User(
-                name="Admin",
-                email=admin_email,
-                password=generate_password_hash("admin123"),  # hashed password
-                role="admin",
-                address="Admin HQ",
-                pincode="000000"
-            )
-            db.session.add(admin)
-            db.session.commit()
-            print("Admin user created.")
-        else:
-            print("Admin user already exists.")
-
-# Initialize the DB and create admin BEFORE first request
-# @app.before_request
-# def setup_app():
-#     create_admin_user()
-    
-init_auth_routes(app)
-init_admin_routes(app)
-init_user_routes(app)
+    from models.models import db, User
+    from services.auth import hash_password
+
+    # Check if admin exists
+    admin_email = "admin@parking.com"
+    existing_admin = User.query.filter_by(email=admin_email).first()
+
+    if not existing_admin:
+        admin = User(
+            name="Admin",
+            email=admin_email,
+            password=hash_password("admin123"),  # hashed password
+            role="admin",
+            address="Admin HQ",
+            pincode="000000"
+        )
+        db.session.add(admin)
+        db.session.commit()
+        print("Admin user created.")
+    else:
+        print("Admin user already exists.")
+
+# Create tables or upgrade an existing database, then add the admin: flask --app app init-db
+@click.command("init-db")
+@with_appcontext
+def init_db():
+    from models.migrations import migrate
+    migrate()
+    create_admin_user()
+
+# Rebuild usage rollups from reservation history: flask --app app backfill-analytics
+@click.command("backfill-analytics")
+@with_appcontext
+def backfill_analytics():
+    from services.analytics import backfill
+    print(f"Rolled up {backfill()} finished stays.")
+
+# Move old finished stays to the archive table: flask --app app archive-reservations [--days 180]
+@click.command("archive-reservations")
+@click.option("--days", type=int, help="archive stays that ended more than this many days ago")
+@click.option("--batch", type=int, default=1000, show_default=True, help="rows moved per transaction")
+@click.option("--pause", type=float, default=0.0, show_default=True, help="seconds to sleep between batches")
+@with_appcontext
+def archive_reservations(days, batch, pause):
+    from flask import current_app
+    from services.archive import archive_reservations as archive
+
+    days = current_app.config["ARCHIVE_AFTER_DAYS"] if days is None else days
+    print(f"Archived {archive(days, batch_size=batch, pause=pause)} reservations that ended over {days} days ago.")
+
+# Run background jobs in this process: flask --app app run-jobs [--threads 4] [--once]
+@click.command("run-jobs")
+@click.option("--threads", type=int, help="worker threads (default JOBS_THREADS)")
+@click.option("--once", is_flag=True, help="run the jobs that are due now, then exit")
+@with_appcontext
+def run_jobs(threads, once):
+    import signal
+    import sys
+    import time
+    from flask import current_app
+    from services.jobs import JobWorker, run_due_jobs
+
+    if once:
+        succeeded, failed = run_due_jobs()
+        print(f"Ran {succeeded + failed} jobs, {failed} failed.")
+        return
+
+    app = current_app._get_current_object()
+    worker = app.extensions["job_worker"] = JobWorker(app, threads or app.config["JOBS_THREADS"])
+    worker.start()
+    print(f"Running jobs on {worker.threads} threads; Ctrl+C to stop.")
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))  # stop like Ctrl+C under a process manager
+    try:
+        while True:
+            time.sleep(3600)
+    except (KeyboardInterrupt, SystemExit):
+        print("Stopping after the running jobs finish...")
+        worker.stop()
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    create_app().run(debug=True)
@@ -0,0 +1,117 @@
+"""Multi-threaded booking stress test.
+
+Many threads book spots in the same lot at once through the booking engine.
+Afterwards the database is checked for double bookings (a spot with more than
+one open reservation, or an occupied spot count that differs from the number
+of successful bookings) and the booking rate is reported.
+
+    python benchmarks/booking_stress.py --threads 16 --spots 2000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import func
+from config import Config
+from models.models import db, User, ParkingLot, ParkingSpot, Reservation
+from services.booking import book_first_available, BookingContention
+
+
+def make_app(path):
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{path}"
+    db.init_app(app)
+    return app
+
+
+def seed(app, spots, users):
+    with app.app_context():
+        db.create_all()
+        lot = ParkingLot(prime_location_name="Stress", price_per_hour=10, address="Bench",
+                         pincode="000000", max_spots=spots, free_spots=spots)
+        db.session.add(lot)
+        db.session.flush()
+        db.session.execute(db.insert(ParkingSpot), [
+            {"spot_number": f"S{i}", "status": "A", "lot_id": lot.id} for i in range(1, spots + 1)
+        ])
+        db.session.execute(db.insert(User), [
+            {"name": f"u{i}", "email": f"u{i}@bench", "password": "x", "role": "user"}
+            for i in range(users)
+        ])
+        db.session.commit()
+        return lot.id
+
+
+def worker(app, lot_id, user_id, stats, lock):
+    booked = busy = 0
+    with app.app_context():
+        while True:
+            try:
+                reservation = book_first_available(lot_id, user_id, f"VEH{user_id}")
+            except BookingContention:
+                busy += 1
+                continue
+            if reservation is None:
+                break
+            booked += 1
+    with lock:
+        stats["booked"] += booked
+        stats["contention"] += busy
+
+
+def check(app, lot_id):
+    with app.app_context():
+        doubled = db.session.query(Reservation.spot_id).filter(
+            Reservation.leaving_timestamp.is_(None)
+        ).group_by(Reservation.spot_id).having(func.count() > 1).count()
+        occupied = ParkingSpot.query.filter_by(lot_id=lot_id, status="O").count()
+        reservations = Reservation.query.count()
+        counter = db.session.get(ParkingLot, lot_id).free_spots
+        free = ParkingSpot.query.filter_by(lot_id=lot_id, status="A").count()
+        return doubled, occupied, reservations, counter, free
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--spots", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(os.path.join(tmp, "stress.sqlite3"))
+        lot_id = seed(app, args.spots, args.threads)
+
+        stats = {"booked": 0, "contention": 0}
+        lock = threading.Lock()
+        threads = [
+            threading.Thread(target=worker, args=(app, lot_id, user_id, stats, lock))
+            for user_id in range(1, args.threads + 1)
+        ]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+
+        doubled, occupied, reservations, counter, free = check(app, lot_id)
+        print(f"threads={args.threads} spots={args.spots}")
+        print(f"booked={stats['booked']} reservations={reservations} occupied={occupied} "
+              f"contention_giveups={stats['contention']}")
+        print(f"double_booked_spots={doubled} free_counter={counter} free_actual={free}")
+        print(f"elapsed={elapsed:.2f}s bookings_per_sec={stats['booked'] / elapsed:.0f}")
+
+        ok = doubled == 0 and occupied == reservations == stats["booked"] == args.spots and counter == free
+        print("OK" if ok else "FAILED")
+        sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Free-spot lookup for an advance booking window: interval index versus a scan.
+
+Fills one large lot with back-to-back advance bookings over --days days,
+then asks "which spots are free for [start, end)?" for random windows, once
+through services.advance_booking (the R*Tree interval index) and once by
+scanning every booking of the lot, and checks both agree.
+
+    python benchmarks/booking_window_benchmark.py --spots 5000 --bookings 500000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import insert, select
+from config import Config
+from models.models import db, User, ParkingLot, ParkingSpot, SpotBooking
+from models.migrations import migrate
+from services.advance_booking import free_spots, free_spot_count
+
+BATCH = 10000
+
+
+def seed(spots, bookings, start, days, rng):
+    db.session.add(User(id=1, name="Bench", email="bench@example.com", password="-", role="user"))
+    db.session.add(ParkingLot(id=1, prime_location_name="Bench", price_per_hour=20, address="Road",
+                              pincode="000000", max_spots=spots, free_spots=spots))
+    db.session.execute(insert(ParkingSpot), [{"id": i, "spot_number": f"B-{i}", "status": "A", "lot_id": 1}
+                                             for i in range(1, spots + 1)])
+
+    # Each spot gets its share of bookings, one after another with random gaps
+    span = timedelta(days=days) / max(bookings // spots, 1)
+    rows = []
+    for n in range(bookings):
+        spot = n % spots + 1
+        slot_start = start + span * (n // spots)
+        begin = slot_start + span * rng.uniform(0, 0.4)
+        length = min(timedelta(hours=rng.uniform(1, 8)), slot_start + span - begin)
+        rows.append({"user_id": 1, "lot_id": 1, "spot_id": spot, "vehicle_no": f"BK{n}",
+                     "starts_at": begin.replace(second=0, microsecond=0),
+                     "ends_at": (begin + length).replace(second=0, microsecond=0), "created_at": start})
+        if len(rows) == BATCH:
+            db.session.execute(insert(SpotBooking), rows)
+            rows = []
+    if rows:
+        db.session.execute(insert(SpotBooking), rows)
+    db.session.commit()
+
+
+def scan(spots, window_start, window_end):
+    """Free spot ids found by reading every booking of the lot."""
+    held = {
+        spot_id
+        for spot_id, starts_at, ends_at in db.session.execute(
+            select(SpotBooking.spot_id, SpotBooking.starts_at, SpotBooking.ends_at).where(SpotBooking.lot_id == 1)
+        )
+        if starts_at < window_end and ends_at > window_start
+    }
+    return set(range(1, spots + 1)) - held
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--spots", type=int, default=5000)
+    parser.add_argument("--bookings", type=int, default=500_000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+    rng = random.Random(5)
+    start = datetime.now().replace(second=0, microsecond=0) + timedelta(days=1)
+    before = start - timedelta(days=1)  # "now" for the lookups: every window is well ahead
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = Flask(__name__)
+        app.config.from_object(Config)
+        app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{os.path.join(tmp, 'bookings.sqlite3')}"
+        db.init_app(app)
+        with app.app_context():
+            migrate()
+            begin = time.perf_counter()
+            seed(args.spots, args.bookings, start, args.days, rng)
+            print(f"seeded {args.bookings} bookings on {args.spots} spots in {time.perf_counter() - begin:.1f}s")
+
+            windows = []
+            for _ in range(args.queries):
+                window_start = start + timedelta(minutes=rng.randrange(args.days * 24 * 60))
+                windows.append((window_start, window_start + timedelta(hours=rng.uniform(1, 8))))
+
+            begin = time.perf_counter()
+            counts = [free_spot_count(1, s, e, now=before) for s, e in windows]
+            count_ms = (time.perf_counter() - begin) / args.queries * 1000
+
+            begin = time.perf_counter()
+            picks = [free_spots(1, s, e, now=before) for s, e in windows]
+            pick_ms = (time.perf_counter() - begin) / args.queries * 1000
+
+            begin = time.perf_counter()
+            scanned = [scan(args.spots, s, e) for s, e in windows]
+            scan_ms = (time.perf_counter() - begin) / args.queries * 1000
+
+            mismatches = sum(
+                count != len(free) or not set(pick) <= free
+                for count, pick, free in zip(counts, picks, scanned)
+            )
+            print(f"spots={args.spots} bookings={args.bookings} queries={args.queries} "
+                  f"mean free={sum(counts) / len(counts):.0f}")
+            print(f"index count   {count_ms:8.2f} ms/query")
+            print(f"index pick 8  {pick_ms:8.2f} ms/query")
+            print(f"scan          {scan_ms:8.2f} ms/query")
+            print(f"mismatches={mismatches}")
+            db.engine.dispose()
+            sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
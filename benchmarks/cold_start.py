@@ -0,0 +1,80 @@
+"""Cold-start time of the app factory, checked against a budget.
+
+Each run starts a fresh interpreter (like a new worker or test process) and
+times `import app`, `create_app()` and the first request to /login. Startup
+must not open a database connection; schema work belongs to `flask init-db`.
+Exits non-zero when the median total exceeds the budget or a connection was
+opened, so it can run in CI next to query_budget.py.
+
+    python benchmarks/cold_start.py --runs 10 --budget-ms 1500
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+connections = []
+event.listen(Engine, "connect", lambda *args: connections.append(1))
+
+application = app.create_app()
+created = time.perf_counter()
+status = application.test_client().get("/login").status_code
+served = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "create_ms": (created - imported) * 1000,
+    "first_request_ms": (served - created) * 1000,
+    "total_ms": (served - started) * 1000,
+    "startup_connections": len(connections),
+    "status": status,
+}))
+"""
+
+
+def probe():
+    out = subprocess.run([sys.executable, "-c", PROBE], cwd=ROOT, check=True,
+                         capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float, default=1500)
+    args = parser.parse_args()
+
+    runs = [probe() for _ in range(args.runs)]
+    for key in ("import_ms", "create_ms", "first_request_ms", "total_ms"):
+        values = [r[key] for r in runs]
+        print(f"{key:18s} median={statistics.median(values):7.1f} max={max(values):7.1f}")
+
+    total = statistics.median(r["total_ms"] for r in runs)
+    connections = max(r["startup_connections"] for r in runs)
+    failures = []
+    if total > args.budget_ms:
+        failures.append(f"median cold start {total:.0f}ms exceeds budget {args.budget_ms:.0f}ms")
+    if connections:
+        failures.append(f"create_app opened {connections} database connection(s)")
+    if any(r["status"] != 200 for r in runs):
+        failures.append("first request did not return 200")
+
+    for failure in failures:
+        print(f"FAIL  {failure}")
+    print("OK" if not failures else "FAILED")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
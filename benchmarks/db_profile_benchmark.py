@@ -0,0 +1,153 @@
+"""Read throughput under concurrent writers, per engine profile.
+
+Reader processes repeatedly load the dashboard data (lots with free spots and
+a user's latest reservations) while writer processes book and release spots.
+The same workload runs once with library defaults (rollback journal) and once
+with the tuned SQLite profile from config.py, and reads/s, read latency
+percentiles, writes/s and "database is locked" failures are reported for each. Processes rather than
+threads are used so the numbers reflect SQLite locking, as with several
+gunicorn workers, instead of the GIL.
+
+    python benchmarks/db_profile_benchmark.py --readers 4 --writers 2 --seconds 5
+"""
+import argparse
+import os
+import sys
+import multiprocessing
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy.exc import OperationalError
+from config import Config, ENGINE_PROFILES
+from models.models import db, User, ParkingLot, ParkingSpot, Reservation
+from models.engine import init_engine
+from services.booking import book_first_available, release_spot, BookingContention
+
+
+def make_app(path, profile):
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{path}"
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = ENGINE_PROFILES[profile]["options"]
+    app.config["SQLITE_PRAGMAS"] = ENGINE_PROFILES[profile]["pragmas"]
+    db.init_app(app)
+    init_engine(app)
+    return app
+
+
+def seed(app, lots, spots, users, history):
+    with app.app_context():
+        db.create_all()
+        db.session.execute(db.insert(ParkingLot), [
+            {"prime_location_name": f"Lot {i}", "price_per_hour": 20, "address": "Bench",
+             "pincode": "000000", "max_spots": spots, "free_spots": spots}
+            for i in range(lots)
+        ])
+        db.session.execute(db.insert(ParkingSpot), [
+            {"spot_number": f"S{s}", "status": "A", "lot_id": lot}
+            for lot in range(1, lots + 1) for s in range(1, spots + 1)
+        ])
+        db.session.execute(db.insert(User), [
+            {"name": f"u{i}", "email": f"u{i}@bench", "password": "x", "role": "user"}
+            for i in range(users)
+        ])
+        now = datetime.now()
+        db.session.execute(db.insert(Reservation), [
+            {"user_id": i % users + 1, "spot_id": i % (lots * spots) + 1, "parking_timestamp": now,
+             "leaving_timestamp": now, "parking_cost": 20, "vehicle_no": f"H{i}"}
+            for i in range(history)
+        ])
+        db.session.commit()
+
+
+def reader(path, profile, users, deadline, results):
+    app = make_app(path, profile)
+    latencies = []
+    locked = 0
+    with app.app_context():
+        user_id = 1
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                ParkingLot.query.all()
+                Reservation.query.filter_by(user_id=user_id).order_by(
+                    Reservation.parking_timestamp.desc()).limit(10).all()
+                latencies.append(time.perf_counter() - started)
+            except OperationalError:
+                locked += 1
+            db.session.rollback()
+            user_id = user_id % users + 1
+    results.put({"reads": latencies, "read_locked": locked})
+
+
+def writer(path, profile, lots, user_id, deadline, results):
+    app = make_app(path, profile)
+    writes = locked = 0
+    with app.app_context():
+        lot_id = user_id % lots + 1
+        while time.perf_counter() < deadline:
+            try:
+                reservation = book_first_available(lot_id, user_id, f"W{user_id}")
+                if reservation is not None:
+                    release_spot(reservation, datetime.now(), 20)
+                    writes += 2
+            except (OperationalError, BookingContention):
+                db.session.rollback()
+                locked += 1
+    results.put({"writes": writes, "write_locked": locked})
+
+
+def run(profile, args, tmp):
+    path = os.path.join(tmp, f"{profile}.sqlite3")
+    app = make_app(path, profile)
+    seed(app, args.lots, args.spots, args.readers + args.writers, args.history)
+
+    stats = {"reads": [], "read_locked": 0, "writes": 0, "write_locked": 0}
+    results = multiprocessing.Queue()
+    # perf_counter is system-wide on Linux, so children can share the deadline
+    deadline = time.perf_counter() + args.seconds + 0.5
+    procs = [multiprocessing.Process(target=reader, args=(path, profile, args.readers, deadline, results))
+             for _ in range(args.readers)]
+    procs += [multiprocessing.Process(target=writer, args=(path, profile, args.lots, w + 1, deadline, results))
+              for w in range(args.writers)]
+    for p in procs:
+        p.start()
+    for _ in procs:
+        for key, value in results.get().items():
+            stats[key] += value
+    for p in procs:
+        p.join()
+
+    with app.app_context():
+        mode = db.session.execute(db.text("PRAGMA journal_mode")).scalar()
+        db.engine.dispose()
+    reads = sorted(stats["reads"]) or [0]
+    p50, p99 = (reads[int(q * (len(reads) - 1))] * 1000 for q in (0.5, 0.99))
+    print(f"{profile:8s} journal={mode:8s} reads/s={len(stats['reads']) / args.seconds:7.0f} "
+          f"read_p50={p50:6.2f}ms read_p99={p99:7.2f}ms max={reads[-1] * 1000:7.1f}ms "
+          f"writes/s={stats['writes'] / args.seconds:6.0f} "
+          f"read_errors={stats['read_locked']} write_errors={stats['write_locked']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--lots", type=int, default=20)
+    parser.add_argument("--spots", type=int, default=100)
+    parser.add_argument("--history", type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"readers={args.readers} writers={args.writers} seconds={args.seconds}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for profile in ("default", "sqlite"):
+            run(profile, args, tmp)
+
+
+if __name__ == "__main__":
+    main()
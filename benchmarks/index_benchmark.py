@@ -0,0 +1,137 @@
+"""Query plans and timings for the hot query paths, before and after migration.
+
+Seeds an SQLite database shaped like a busy deployment (1M reservations by
+default) with the pre-index schema, runs the controllers' hottest queries,
+then upgrades the file in place with models.migrations.migrate() and runs
+them again.
+
+    python benchmarks/index_benchmark.py --reservations 1000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import create_engine
+from config import Config
+from models.models import db
+from models.migrations import migrate
+
+# (label, sql, parameter factory) mirroring the controllers' filters
+QUERIES = [
+    ("book_spot: free spot in lot",
+     "SELECT id FROM parking_spot WHERE lot_id = ? AND status = 'A' LIMIT 8",
+     lambda a: (random.randint(1, a.lots),)),
+    ("user_dashboard: user history",
+     "SELECT * FROM reservation WHERE user_id = ? ORDER BY parking_timestamp DESC",
+     lambda a: (random.randint(1, a.users),)),
+    ("view_spot: active reservation of spot",
+     "SELECT * FROM reservation WHERE spot_id = ? AND leaving_timestamp IS NULL LIMIT 1",
+     lambda a: (random.randint(1, a.lots * a.spots),)),
+    ("search_parking: lots by pincode",
+     "SELECT * FROM parking_lot WHERE pincode = ?",
+     lambda a: (f"{random.randint(1, a.lots):06d}",)),
+]
+
+
+def seed(path, args):
+    # Tables come from the models, then the indexes added since are dropped
+    # and the file is stamped as a version 1 database.
+    engine = create_engine(f"sqlite:///{path}")
+    db.metadata.create_all(engine)
+    engine.dispose()
+
+    conn = sqlite3.connect(path)
+    for name in ("ix_parking_spot_lot_status", "ix_reservation_user_parked",
+                 "ix_reservation_spot_leaving", "ix_parking_lot_pincode"):
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+    conn.execute("CREATE TABLE schema_version (version INTEGER NOT NULL)")
+    conn.execute("INSERT INTO schema_version VALUES (1)")
+
+    conn.executemany(
+        "INSERT INTO user (id, name, email, password, role) VALUES (?, ?, ?, 'x', 'user')",
+        ((i, f"user{i}", f"user{i}@bench") for i in range(1, args.users + 1)),
+    )
+    conn.executemany(
+        "INSERT INTO parking_lot (id, prime_location_name, price_per_hour, address, pincode, max_spots, free_spots)"
+        " VALUES (?, ?, 20, ?, ?, ?, ?)",
+        ((i, f"Lot {i}", f"{i} Main Road", f"{i:06d}", args.spots, args.spots) for i in range(1, args.lots + 1)),
+    )
+    conn.executemany(
+        "INSERT INTO parking_spot (lot_id, spot_number, status) VALUES (?, ?, 'A')",
+        ((lot, f"S{n}") for lot in range(1, args.lots + 1) for n in range(1, args.spots + 1)),
+    )
+
+    start = datetime(2024, 1, 1)
+    total_spots = args.lots * args.spots
+
+    def reservations():
+        for i in range(args.reservations):
+            parked = start + timedelta(minutes=i)
+            yield (random.randint(1, args.users), random.randint(1, total_spots), parked,
+                   parked + timedelta(hours=2), 40.0, f"VEH{i % 9999:04d}")
+
+    conn.executemany(
+        "INSERT INTO reservation (user_id, spot_id, parking_timestamp, leaving_timestamp, parking_cost, vehicle_no)"
+        " VALUES (?, ?, ?, ?, ?, ?)",
+        reservations(),
+    )
+    conn.commit()
+    conn.close()
+
+
+def run(path, args, title):
+    conn = sqlite3.connect(path)
+    print(f"\n== {title}")
+    for label, sql, params in QUERIES:
+        plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params(args)).fetchall()
+        random.seed(1)
+        begin = time.perf_counter()
+        for _ in range(args.repeat):
+            conn.execute(sql, params(args)).fetchall()
+        elapsed = (time.perf_counter() - begin) / args.repeat * 1000
+        print(f"{label:40s} {elapsed:9.3f} ms/query")
+        for row in plan:
+            print(f"    plan: {row[-1]}")
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lots", type=int, default=500)
+    parser.add_argument("--spots", type=int, default=100, help="spots per lot")
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--reservations", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.sqlite3")
+        begin = time.perf_counter()
+        seed(path, args)
+        print(f"seeded {args.reservations} reservations in {time.perf_counter() - begin:.1f}s")
+
+        run(path, args, "before migration")
+
+        app = Flask(__name__)
+        app.config.from_object(Config)
+        app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{path}"
+        db.init_app(app)
+        with app.app_context():
+            begin = time.perf_counter()
+            migrate()
+            print(f"migrated in {time.perf_counter() - begin:.1f}s")
+            db.engine.dispose()
+
+        run(path, args, "after migration")
+
+
+if __name__ == "__main__":
+    main()
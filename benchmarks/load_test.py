@@ -0,0 +1,238 @@
+"""Load test of the main user and admin flows, with results saved as JSON.
+
+Worker processes drive the app through the Flask test client. A user worker
+logs in and then loops dashboard -> search -> book -> release, logging in
+again every --session-length rounds. An admin worker loops over the
+dashboard, the reservations list and a lot page. Latency p50/p95/p99 and
+throughput are reported per route. The first --warmup seconds are left out.
+
+The database is a copy of --db (made with benchmarks/seed.py), or a fresh
+seeded one when --db is not given. Pass --compare to print the change
+against an earlier results file, e.g. one saved on the previous commit:
+
+    python benchmarks/seed.py --db /tmp/bench.sqlite3 --reservations 200000
+    python benchmarks/load_test.py --db /tmp/bench.sqlite3 --users 4 --admins 1 --seconds 30 --out before.json
+    git checkout my-branch
+    python benchmarks/load_test.py --db /tmp/bench.sqlite3 --users 4 --admins 1 --seconds 30 --compare before.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.seed import AREAS, PASSWORD, make_app, create
+
+
+class Session:
+    """A test client that times every request under a route label."""
+
+    def __init__(self, client, warm_at, address):
+        self.client = client
+        self.client.environ_base["REMOTE_ADDR"] = address   # one client address per worker, as for login limits
+        self.warm_at = warm_at
+        self.samples = []   # (route, seconds, ok)
+
+    def request(self, route, method, path, expect=(200, 302), **kwargs):
+        started = time.perf_counter()
+        response = self.client.open(path, method=method, **kwargs)
+        finished = time.perf_counter()
+        ok = response.status_code in expect and "/login" not in response.headers.get("Location", "")
+        if started >= self.warm_at:
+            self.samples.append((route, finished - started, ok))
+        return response
+
+    def login(self, email, password=PASSWORD):
+        return self.request("POST /login", "POST", "/login", data={"email": email, "password": password})
+
+
+def user_worker(path, worker, args, warm_at, deadline, results):
+    app = make_app(path)
+    from models.models import db, ParkingLot, Reservation
+
+    rng = random.Random(args.seed + worker)
+    session = Session(app.test_client(), warm_at, f"10.0.1.{worker + 1}")
+    with app.app_context():
+        lot_ids = [lot_id for (lot_id,) in db.session.query(ParkingLot.id)]
+        user_id = worker + 2   # seeded users start after the admin
+        email = f"user{worker + 1}@example.com"
+        rounds = 0
+        while time.perf_counter() < deadline:
+            if rounds % args.session_length == 0:
+                session.login(email)
+            rounds += 1
+
+            session.request("GET /user/dashboard", "GET", "/user/dashboard")
+            session.request("POST /user/search", "POST", "/user/search",
+                            data={"search_location": rng.choice(AREAS)})
+            session.request("POST /book/<lot_id>", "POST", f"/book/{rng.choice(lot_ids)}",
+                            data={"vehicle_number": f"LT{worker:02d}{rounds:06d}"})
+
+            # The booking redirects to the dashboard; find the reservation it made
+            r_id = db.session.query(Reservation.id).filter(
+                Reservation.user_id == user_id, Reservation.leaving_timestamp.is_(None)
+            ).order_by(Reservation.id.desc()).limit(1).scalar()
+            db.session.rollback()
+            if r_id:
+                session.request("POST /release/<r_id>", "POST", f"/release/{r_id}")
+    results.put(session.samples)
+
+
+def admin_worker(path, worker, args, warm_at, deadline, results):
+    app = make_app(path)
+    from models.models import db, ParkingLot
+
+    rng = random.Random(args.seed - worker)
+    session = Session(app.test_client(), warm_at, f"10.0.2.{worker + 1}")
+    with app.app_context():
+        lot_ids = [lot_id for (lot_id,) in db.session.query(ParkingLot.id)]
+        db.session.rollback()
+    session.login("admin@parking.com", "admin123")  # the admin made by init-db
+    while time.perf_counter() < deadline:
+        session.request("GET /admin", "GET", "/admin")
+        session.request("GET /admin/reservations", "GET", "/admin/reservations")
+        session.request("GET /admin/parking_lot/<lot_id>", "GET", f"/admin/parking_lot/{rng.choice(lot_ids)}")
+    results.put(session.samples)
+
+
+def percentile(values, q):
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+def summarize(samples, seconds):
+    routes = {}
+    for route in sorted({route for route, _, _ in samples}):
+        times = sorted(t for r, t, _ in samples if r == route)
+        routes[route] = {
+            "requests": len(times),
+            "errors": sum(1 for r, _, ok in samples if r == route and not ok),
+            "throughput_rps": round(len(times) / seconds, 1),
+            "mean_ms": round(sum(times) / len(times) * 1000, 2),
+            "p50_ms": round(percentile(times, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(times, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(times, 0.99) * 1000, 2),
+        }
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for _, _, ok in samples if not ok),
+        "throughput_rps": round(len(samples) / seconds, 1),
+        "routes": routes,
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "cpus": os.cpu_count(),
+    }
+
+
+def print_report(report, baseline=None):
+    old_routes = baseline["summary"]["routes"] if baseline else {}
+    print(f"{'route':32s} {'req':>6s} {'err':>4s} {'rps':>7s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s}"
+          + ("   p50 vs base   p95 vs base" if baseline else ""))
+    for route, row in report["summary"]["routes"].items():
+        line = (f"{route:32s} {row['requests']:6d} {row['errors']:4d} {row['throughput_rps']:7.1f} "
+                f"{row['p50_ms']:8.2f} {row['p95_ms']:8.2f} {row['p99_ms']:8.2f}")
+        old = old_routes.get(route)
+        if old:
+            line += "".join(f"   {(row[k] - old[k]) / old[k] * 100:+10.1f}%" if old[k] else "          n/a"
+                            for k in ("p50_ms", "p95_ms"))
+        print(line)
+    total = report["summary"]
+    print(f"total: {total['requests']} requests, {total['errors']} errors, {total['throughput_rps']} req/s")
+    if baseline:
+        print(f"baseline: commit {baseline['environment']['commit']} at {baseline['environment']['at']}, "
+              f"{baseline['summary']['throughput_rps']} req/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", help="seeded database to copy (default: seed a small one)")
+    parser.add_argument("--users", type=int, default=4, help="user worker processes")
+    parser.add_argument("--admins", type=int, default=1, help="admin worker processes")
+    parser.add_argument("--seconds", type=float, default=20, help="measured duration")
+    parser.add_argument("--warmup", type=float, default=2)
+    parser.add_argument("--session-length", type=int, default=20, help="rounds per login")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--compare", help="earlier results JSON to compare with")
+    args = parser.parse_args()
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "load.sqlite3")
+        if args.db:
+            # Work on a copy so every run starts from the same data
+            source = sqlite3.connect(args.db)
+            target = sqlite3.connect(path)
+            source.backup(target)
+            source.close()
+            target.close()
+            with sqlite3.connect(path) as conn:
+                dataset = {"source": os.path.abspath(args.db),
+                           "lots": conn.execute("SELECT COUNT(*) FROM parking_lot").fetchone()[0],
+                           "spots": conn.execute("SELECT COUNT(*) FROM parking_spot").fetchone()[0],
+                           "users": conn.execute("SELECT COUNT(*) FROM user").fetchone()[0] - 1,
+                           "reservations": conn.execute("SELECT COUNT(*) FROM reservation").fetchone()[0]}
+        else:
+            print("seeding a small dataset (pass --db for a bigger one)...")
+            _, dataset = create(path, seed=args.seed)
+        if dataset["users"] < args.users:
+            parser.error(f"the dataset has only {dataset['users']} users for {args.users} user workers")
+
+        results = multiprocessing.Queue()
+        # perf_counter is system-wide on Linux, so children can share the clock
+        start = time.perf_counter() + 1.0   # let the workers import the app first
+        warm_at = start + args.warmup
+        deadline = warm_at + args.seconds
+        procs = [multiprocessing.Process(target=user_worker, args=(path, w, args, warm_at, deadline, results))
+                 for w in range(args.users)]
+        procs += [multiprocessing.Process(target=admin_worker, args=(path, w, args, warm_at, deadline, results))
+                  for w in range(args.admins)]
+        for p in procs:
+            p.start()
+        samples = []
+        for _ in procs:
+            samples += results.get()
+        for p in procs:
+            p.join()
+
+    report = {
+        "environment": environment(),
+        "parameters": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "dataset": dataset,
+        "summary": summarize(samples, args.seconds),
+    }
+    print_report(report, baseline)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"results written to {args.out}")
+    if report["summary"]["errors"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Login latency for real users during a credential-stuffing burst.
+
+Attacker threads post wrong passwords for random emails from a handful of
+addresses as fast as they can, while a real user logs in with the right
+password once every --interval seconds, each time from a different address
+(standing in for many users). The run is repeated with the login rate
+limiter off and on, and the legitimate logins' p50/p99 and the number of
+attempts that reached password hashing are printed for each.
+
+    python benchmarks/login_burst.py --attackers 8 --addresses 2 --seconds 10
+
+The per-address burst is lowered (--ip-burst) so a short run outlasts it.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+
+
+def make_app(path, limited, args):
+    from app import create_app
+
+    config = type("BurstConfig", (Config,), {
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{path}",
+        "LOGIN_RATE_LIMIT": limited,
+        "LOGIN_IP_BURST": args.ip_burst,
+        "LOGIN_IP_PER_MINUTE": args.ip_per_minute,
+    })
+    app = create_app(config)
+    app.test_cli_runner().invoke(args=["init-db"])
+    return app
+
+
+def attacker(app, address, deadline, counts):
+    client = app.test_client()
+    n = 0
+    while time.perf_counter() < deadline:
+        client.post("/login", data={"email": f"victim{n}@example.com", "password": "guess"},
+                               environ_base={"REMOTE_ADDR": address})
+        n += 1
+    counts.append(n)
+
+
+def run(args, limited, tmp):
+    from services import auth
+
+    app = make_app(os.path.join(tmp, f"burst-{limited}.sqlite3"), limited, args)
+    hashed = []
+    check = auth.check_password_hash
+    auth.check_password_hash = lambda *a: (hashed.append(1), check(*a))[1]   # count hash work
+
+    deadline = time.perf_counter() + args.seconds
+    counts = []
+    threads = [threading.Thread(target=attacker, args=(app, f"203.0.113.{i % args.addresses}", deadline, counts))
+               for i in range(args.attackers)]
+    for t in threads:
+        t.start()
+
+    user = app.test_client()
+    latencies = []
+    while time.perf_counter() < deadline - args.interval:
+        time.sleep(args.interval)
+        started = time.perf_counter()
+        response = user.post("/login", data={"email": "admin@parking.com", "password": "admin123"},
+                             environ_base={"REMOTE_ADDR": f"198.51.100.{len(latencies) % 250}"})
+        latencies.append(time.perf_counter() - started)
+        assert response.headers["Location"].endswith("/admin"), "legitimate login failed"
+        user.get("/logout")
+    for t in threads:
+        t.join()
+    auth.check_password_hash = check
+
+    latencies.sort()
+    p50, p99 = (latencies[min(int(q * len(latencies)), len(latencies) - 1)] * 1000 for q in (0.5, 0.99))
+    print(f"limiter={'on ' if limited else 'off'} attempts={sum(counts):6d} hashed={len(hashed):5d} "
+          f"user logins={len(latencies):3d} p50={p50:7.1f}ms p99={p99:7.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--attackers", type=int, default=8, help="attacking threads")
+    parser.add_argument("--addresses", type=int, default=2, help="client addresses they share")
+    parser.add_argument("--ip-burst", type=int, default=5, help="LOGIN_IP_BURST for the run")
+    parser.add_argument("--ip-per-minute", type=int, default=30, help="LOGIN_IP_PER_MINUTE for the run")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--interval", type=float, default=0.25, help="seconds between real logins")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for limited in (False, True):
+            run(args, limited, tmp)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Nearest-lot lookup latency: R*Tree bounding boxes versus a full scan.
+
+Scatters lots over a metro area, fills some of them up, then answers "nearest
+N lots with a free spot" for random drivers with services.geo and with a
+brute-force scan of every lot, checking both give the same answer.
+
+    python benchmarks/nearest_benchmark.py --lots 50000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from config import Config
+from models.models import db, ParkingLot
+from models.migrations import migrate
+from services.geo import nearest_lots, distance_km
+
+# Roughly the Mumbai/Pune/Delhi/Bengaluru band
+LAT_RANGE = (12.8, 28.9)
+LNG_RANGE = (72.7, 77.8)
+
+
+def seed(lots, rng):
+    rows = []
+    for i in range(lots):
+        rows.append({
+            "prime_location_name": f"Lot {i}",
+            "price_per_hour": 20,
+            "address": f"{i} Road",
+            "pincode": "000000",
+            "max_spots": 10,
+            "free_spots": 0 if rng.random() < 0.3 else rng.randint(1, 10),
+            "latitude": rng.uniform(*LAT_RANGE),
+            "longitude": rng.uniform(*LNG_RANGE),
+        })
+    for start in range(0, lots, 10000):
+        db.session.execute(db.insert(ParkingLot), rows[start:start + 10000])
+    db.session.commit()
+
+
+def brute_force(lat, lng, limit):
+    rows = db.session.query(ParkingLot.id, ParkingLot.latitude, ParkingLot.longitude).filter(
+        ParkingLot.free_spots > 0
+    ).all()
+    ranked = sorted((distance_km(lat, lng, la, ln), lot_id) for lot_id, la, ln in rows)
+    return [lot_id for _, lot_id in ranked[:limit]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lots", type=int, default=50_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+    rng = random.Random(3)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = Flask(__name__)
+        app.config.from_object(Config)
+        app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{os.path.join(tmp, 'geo.sqlite3')}"
+        db.init_app(app)
+        with app.app_context():
+            migrate()
+            seed(args.lots, rng)
+            drivers = [(rng.uniform(*LAT_RANGE), rng.uniform(*LNG_RANGE)) for _ in range(args.queries)]
+
+            begin = time.perf_counter()
+            indexed = [[lot.id for lot, _, _ in nearest_lots(lat, lng, args.limit)] for lat, lng in drivers]
+            indexed_ms = (time.perf_counter() - begin) / args.queries * 1000
+            db.session.expunge_all()
+
+            begin = time.perf_counter()
+            scanned = [brute_force(lat, lng, args.limit) for lat, lng in drivers]
+            scan_ms = (time.perf_counter() - begin) / args.queries * 1000
+
+            mismatches = sum(a != b for a, b in zip(indexed, scanned))
+            print(f"lots={args.lots} queries={args.queries} nearest={args.limit}")
+            print(f"rtree  {indexed_ms:8.2f} ms/query")
+            print(f"scan   {scan_ms:8.2f} ms/query")
+            print(f"mismatches={mismatches}")
+            db.engine.dispose()
+            sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""SQL statement budgets for the listing pages.
+
+Counts the statements each page issues through the Flask test client and
+exits non-zero if any page goes over its budget, so an N+1 regression (a
+lazy relationship walked per row in a template) fails CI.
+
+    python benchmarks/query_budget.py
+
+count_queries() and assert_max_queries() can also be used on their own:
+
+    with assert_max_queries(2):
+        client.get("/user/summary")
+"""
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+
+
+class QueryCounter:
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+
+@contextmanager
+def count_queries(engine=None):
+    """Record every statement sent to the engine inside the block."""
+    if engine is None:
+        from models.models import db
+        engine = db.engine
+    counter = QueryCounter()
+    event.listen(engine, "before_cursor_execute", counter)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", counter)
+
+
+@contextmanager
+def assert_max_queries(limit, engine=None):
+    """Fail with the offending statements if the block issues more than ``limit``."""
+    with count_queries(engine) as counter:
+        yield counter
+    if counter.count > limit:
+        listing = "\n".join(f"  {i}. {s}" for i, s in enumerate(counter.statements[:20], 1))
+        raise AssertionError(f"{counter.count} statements issued, budget is {limit}:\n{listing}")
+
+
+# (role, path, cold, warm) - budgets do not depend on the number of rows shown.
+# "cold" is the first request, "warm" a repeat once cached fragments are filled.
+# History reads reservation and reservation_archive with one query each.
+BUDGETS = [
+    ("admin", "/admin", 2, 1),
+    ("admin", "/admin/reservations", 2, 2),
+    ("admin", "/admin/users", 2, 2),
+    ("admin", "/admin/parking_lot/1", 3, 2),
+    ("user", "/user/dashboard", 5, 4),
+    ("user", "/user/summary", 2, 2),
+    ("user", "/user/profile", 0, 0),
+]
+
+
+def seed(rows):
+    from models.models import db, User, ParkingLot
+    from services.provisioning import add_spots
+    from services.booking import book_first_available, release_spot
+    from werkzeug.security import generate_password_hash
+
+    users = [
+        User(name=f"User {i}", email=f"user{i}@bench", password=generate_password_hash("pw"), role="user")
+        for i in range(5)
+    ]
+    db.session.add_all(users)
+    for i in range(5):
+        lot = ParkingLot(prime_location_name=f"Lot {i}", price_per_hour=10, address=f"{i} Road",
+                         pincode=f"{i:06d}", max_spots=rows, free_spots=0)
+        db.session.add(lot)
+        db.session.flush()
+        add_spots(lot.id, 1, rows, "S")
+    db.session.commit()
+
+    for n in range(rows):
+        for user in users:
+            reservation = book_first_available(1 + n % 5, user.id, f"VEH{n}")
+            if n % 2:
+                release_spot(reservation, reservation.parking_timestamp, 10)
+
+
+def main():
+    tmp = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'budget.sqlite3')}"
+
+    from app import create_app
+    app = create_app()
+    app.test_cli_runner().invoke(args=["init-db"])
+    with app.app_context():
+        seed(rows=20)
+
+    failures = 0
+    clients = {"admin": app.test_client(), "user": app.test_client()}
+    clients["admin"].post("/login", data={"email": "admin@parking.com", "password": "admin123"})
+    clients["user"].post("/login", data={"email": "user0@bench", "password": "pw"})
+
+    with app.app_context():
+        for role, path, cold, warm in BUDGETS:
+            for label, budget in (("cold", cold), ("warm", warm)):
+                try:
+                    with assert_max_queries(budget) as counter:
+                        response = clients[role].get(path)
+                    assert response.status_code == 200, f"{path} returned {response.status_code}"
+                    print(f"ok    {path:24s} {label} {counter.count}/{budget} statements")
+                except AssertionError as e:
+                    failures += 1
+                    print(f"FAIL  {path:24s} {label} {e}")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
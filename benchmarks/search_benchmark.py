@@ -0,0 +1,81 @@
+"""Lot search latency: LIKE scan versus the FTS5 index.
+
+Builds a database with 100k lots (the FTS index is filled by its triggers as
+the lots are inserted) and times both search paths of services.search over a
+set of typical queries. The LIKE path runs unlimited, as the endpoints did.
+
+    python benchmarks/search_benchmark.py --lots 100000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from config import Config
+from models.models import db, ParkingLot
+from models.migrations import migrate
+from services.search import search_lots, like_search
+
+AREAS = ["Dadar", "Andheri", "Bandra", "Connaught", "Koramangala", "Indiranagar", "Salt Lake",
+         "Park Street", "Banjara Hills", "Hitech City", "Rajpur", "Clock Tower", "Sector"]
+KINDS = ["Mall", "Metro", "Market", "Station", "Hospital", "Stadium", "Plaza", "Tower"]
+QUERIES = ["dad", "Andheri Metro", "park street", "400028", "5600", "clock", "hospital sector", "zzz"]
+
+
+def seed(lots):
+    rng = random.Random(7)
+    rows = []
+    for i in range(lots):
+        area = rng.choice(AREAS)
+        rows.append({
+            "prime_location_name": f"{area} {rng.choice(KINDS)} {i}",
+            "price_per_hour": 20,
+            "address": f"{rng.randint(1, 999)} {rng.choice(AREAS)} Road, {area}",
+            "pincode": f"{rng.randint(100000, 999999)}",
+            "max_spots": 10,
+            "free_spots": 10,
+        })
+    for start in range(0, lots, 10000):
+        db.session.execute(db.insert(ParkingLot), rows[start:start + 10000])
+    db.session.commit()
+
+
+def timed(fn, repeat):
+    begin = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - begin) / repeat * 1000, len(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lots", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = Flask(__name__)
+        app.config.from_object(Config)
+        app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{os.path.join(tmp, 'search.sqlite3')}"
+        db.init_app(app)
+        with app.app_context():
+            migrate()
+            begin = time.perf_counter()
+            seed(args.lots)
+            print(f"seeded {args.lots} lots in {time.perf_counter() - begin:.1f}s\n")
+
+            print(f"{'query':20s} {'LIKE ms':>10s} {'rows':>6s} {'FTS ms':>10s} {'rows':>6s}")
+            for query in QUERIES:
+                like_ms, like_rows = timed(lambda: like_search(query), args.repeat)
+                fts_ms, fts_rows = timed(lambda: search_lots(query), args.repeat)
+                print(f"{query:20s} {like_ms:10.2f} {like_rows:6d} {fts_ms:10.2f} {fts_rows:6d}")
+            db.engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""Synthetic dataset generator.
+
+Builds a database with the current schema (through `flask init-db`, so the
+admin user, search and location indexes exist) and fills it with N lots,
+M spots per lot, K users and R finished reservations spread over the last
+--days days, plus a share of spots currently occupied. Rows are written with
+batched executemany inserts, the parking costs come from the lots' real
+tariffs, and the usage rollups are rebuilt at the end, so every page shows
+consistent numbers. The same --seed always produces the same data.
+
+    python benchmarks/seed.py --db parking.sqlite3 --lots 200 --spots 50 --users 5000 --reservations 1000000
+
+Every seeded user logs in with "<email> / password", e.g. user1@example.com.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+from config import Config
+
+BATCH = 5000
+PASSWORD = "password"
+
+AREAS = (
+    "Koramangala", "Indiranagar", "Whitefield", "Jayanagar", "Malleshwaram", "Hebbal", "Marathahalli",
+    "Banashankari", "Yelahanka", "Electronic City", "MG Road", "Rajajinagar", "BTM Layout", "HSR Layout",
+)
+KINDS = ("Mall", "Metro Station", "Tech Park", "Market", "Hospital", "Stadium", "Central")
+STREETS = ("Main Road", "Cross", "Ring Road", "Outer Ring Road", "Service Road", "Avenue")
+BANDS = (None, None, "8-20:60, 20-23:40", "9-18:80", "7-11:50, 17-21:70")
+CENTER = (12.97, 77.59)  # lots are scattered within ~25 km of this point
+
+
+def make_app(path):
+    from app import create_app
+
+    config = type("SeedConfig", (Config,), {"SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.abspath(path)}"})
+    return create_app(config)
+
+
+def remove_database(path):
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def _batches(rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _insert(table, rows):
+    from models.models import db
+
+    count = 0
+    for batch in _batches(rows):
+        db.session.execute(insert(table), batch)
+        count += len(batch)
+    return count
+
+
+def _plate(user_id, car):
+    return f"KA{user_id % 50 + 1:02d}{chr(65 + user_id % 26)}{chr(65 + car)}{user_id % 10000:04d}"
+
+
+def _lots(rng, lots, spots):
+    for i in range(1, lots + 1):
+        area = AREAS[i % len(AREAS)]
+        yield {
+            "prime_location_name": f"{area} {rng.choice(KINDS)} {i}",
+            "price_per_hour": float(rng.choice((20, 30, 40, 50, 60, 80, 100))),
+            "tariff_bands": rng.choice(BANDS),
+            "daily_cap": rng.choice((None, None, 400.0, 600.0)),
+            "address": f"{rng.randint(1, 200)}, {rng.randint(1, 40)}th {rng.choice(STREETS)}, {area}",
+            "pincode": f"560{AREAS.index(area) + 1:03d}",
+            "max_spots": spots,
+            "free_spots": spots,
+            "latitude": round(CENTER[0] + rng.uniform(-0.2, 0.2), 5),
+            "longitude": round(CENTER[1] + rng.uniform(-0.2, 0.2), 5),
+        }
+
+
+def _stays(rng, count, start, end, mean_hours):
+    """``count`` non-overlapping (arrive, leave) pairs on one spot between ``start`` and ``end``."""
+    slot = (end - start) / count
+    for i in range(count):
+        arrive = start + slot * i + slot * rng.uniform(0, 0.3)
+        hours = min(max(rng.expovariate(1 / mean_hours), 0.25), slot.total_seconds() / 3600 * 0.6)
+        yield arrive.replace(microsecond=0), (arrive + timedelta(hours=hours)).replace(microsecond=0)
+
+
+def seed(app, lots=20, spots=50, users=500, reservations=20000, days=90, occupancy=0.3,
+         mean_stay_hours=3, seed=1):
+    """Fill the (freshly migrated) database of ``app``; returns a summary dict."""
+    from models.models import db, User, ParkingLot, ParkingSpot, Reservation
+    from services.analytics import backfill
+    from services.billing import tariff
+
+    rng = random.Random(seed)
+    now = datetime.now().replace(microsecond=0)
+    password = generate_password_hash(PASSWORD)  # one hash for everyone; hashing K times is the slow part
+    timings = {}
+
+    with app.app_context():
+        started = time.perf_counter()
+        lot_rows = list(_lots(rng, lots, spots))
+        _insert(ParkingLot, lot_rows)
+        _insert(ParkingSpot, (
+            {"spot_number": f"{lot['prime_location_name'][:3].upper()}-{s}", "status": "A", "lot_id": lot_id}
+            for lot_id, lot in enumerate(lot_rows, 1) for s in range(1, spots + 1)
+        ))
+        # The admin from init-db is user 1, so seeded user i has id i + 1
+        _insert(User, (
+            {"name": f"User {i}", "email": f"user{i}@example.com", "password": password, "role": "user",
+             "address": f"{rng.randint(1, 500)}, {rng.choice(AREAS)}", "pincode": f"560{rng.randint(1, 99):03d}"}
+            for i in range(1, users + 1)
+        ))
+        timings["lots_spots_users"] = time.perf_counter() - started
+
+        # History: each spot gets its share of stays, one after another
+        started = time.perf_counter()
+        total_spots = lots * spots
+        per_spot = [reservations // total_spots + (1 if s < reservations % total_spots else 0)
+                    for s in range(total_spots)]
+        history_end = now - timedelta(days=1)
+        history_start = now - timedelta(days=days)
+        tariffs = [tariff(lot["price_per_hour"], lot["tariff_bands"], lot["daily_cap"]) for lot in lot_rows]
+
+        def history():
+            for spot_index, count in enumerate(per_spot):
+                if not count:
+                    continue
+                lot_tariff = tariffs[spot_index // spots]
+                for arrive, leave in _stays(rng, count, history_start, history_end, mean_stay_hours):
+                    user_id = rng.randint(2, users + 1)
+                    yield {"user_id": user_id, "spot_id": spot_index + 1, "vehicle_no": _plate(user_id, rng.randint(0, 1)),
+                           "parking_timestamp": arrive, "leaving_timestamp": leave,
+                           "parking_cost": lot_tariff.cost(arrive, leave)}
+
+        written = _insert(Reservation, history())
+        timings["reservations"] = time.perf_counter() - started
+
+        # Cars parked right now, one per user at most
+        started = time.perf_counter()
+        occupied = rng.sample(range(1, total_spots + 1), min(int(total_spots * occupancy), total_spots, users))
+        parked_users = rng.sample(range(2, users + 2), len(occupied))
+        _insert(Reservation, (
+            {"user_id": user_id, "spot_id": spot_id, "vehicle_no": _plate(user_id, 0),
+             "parking_timestamp": now - timedelta(minutes=rng.randint(5, 12 * 60))}
+            for spot_id, user_id in zip(occupied, parked_users)
+        ))
+        for batch in _batches(occupied):
+            db.session.execute(ParkingSpot.__table__.update()
+                               .where(ParkingSpot.id.in_(batch)).values(status="O"))
+        db.session.execute(db.text(
+            "UPDATE parking_lot SET free_spots = (SELECT COUNT(*) FROM parking_spot"
+            " WHERE parking_spot.lot_id = parking_lot.id AND status = 'A')"
+        ))
+        db.session.commit()
+
+        backfill()  # commits
+        timings["occupancy_and_rollups"] = time.perf_counter() - started
+
+    return {
+        "lots": lots, "spots": total_spots, "users": users, "reservations": written,
+        "open_reservations": len(occupied), "seed": seed,
+        "seconds": {step: round(t, 2) for step, t in timings.items()},
+    }
+
+
+def create(path, **options):
+    """Create a seeded database at ``path``; returns (app, summary)."""
+    app = make_app(path)
+    result = app.test_cli_runner().invoke(args=["init-db"])
+    if result.exit_code != 0:
+        raise RuntimeError(f"init-db failed: {result.output}") from result.exception
+    return app, seed(app, **options)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default="parking.sqlite3", help="SQLite file to create")
+    parser.add_argument("--force", action="store_true", help="replace the file if it exists")
+    parser.add_argument("--lots", type=int, default=20)
+    parser.add_argument("--spots", type=int, default=50, help="spots per lot")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--reservations", type=int, default=20000, help="finished reservations")
+    parser.add_argument("--days", type=int, default=90, help="history spans this many days")
+    parser.add_argument("--occupancy", type=float, default=0.3, help="share of spots occupied now")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        if not args.force:
+            parser.error(f"{args.db} exists; pass --force to replace it")
+        remove_database(args.db)
+
+    _, summary = create(args.db, lots=args.lots, spots=args.spots, users=args.users,
+                        reservations=args.reservations, days=args.days, occupancy=args.occupancy,
+                        seed=args.seed)
+    print(summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,74 @@
 import os
 
+DATABASE_URL = os.environ.get("DATABASE_URL", 'sqlite:///parking.sqlite3')
+
+# Engine profiles, picked with DB_PROFILE (defaults to the DATABASE_URL scheme).
+# "sqlite" keeps readers and writers of a file database out of each other's way
+# (the PRAGMAs below are applied to every new connection, see models/engine.py);
+# "postgres" sizes the connection pool for a Postgres-compatible server.
+ENGINE_PROFILES = {
+    "sqlite": {
+        "options": {},
+        "pragmas": {
+            "journal_mode": "WAL",         # readers don't block the writer and vice versa
+            "synchronous": "NORMAL",       # fsync at checkpoints only; safe with WAL
+            "busy_timeout": int(os.environ.get("DB_BUSY_TIMEOUT", 5000)),  # ms to wait for a lock
+            "mmap_size": 256 * 1024 * 1024,
+            "cache_size": -64 * 1024,      # negative = KiB, so 64 MiB page cache
+        },
+    },
+    "postgres": {
+        "options": {
+            "pool_size": int(os.environ.get("DB_POOL_SIZE", 10)),
+            "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", 20)),
+            "pool_timeout": 30,
+            "pool_recycle": 1800,
+            "pool_pre_ping": True,       # drop connections the server closed
+        },
+        "pragmas": {},
+    },
+    # Library defaults; what the app used before profiles existed
+    "default": {"options": {}, "pragmas": {}},
+}
+
+DB_PROFILE = os.environ.get(
+    "DB_PROFILE", "sqlite" if DATABASE_URL.startswith("sqlite") else "postgres"
+)
+
 class Config:
     SECRET_KEY = "super-secret-key"
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///parking.sqlite3'
+    SQLALCHEMY_DATABASE_URI = DATABASE_URL
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = ENGINE_PROFILES[DB_PROFILE]["options"]
+    SQLITE_PRAGMAS = ENGINE_PROFILES[DB_PROFILE]["pragmas"]
+    # Serve dashboard spot counts from ParkingLot.free_spots instead of counting spots
+    AVAILABILITY_FROM_COUNTER = True
+    # Logged-in user snapshots kept per process (entries, seconds each is trusted)
+    USER_CACHE_SIZE = 1024
+    USER_CACHE_TTL = 300
+    # Memory budget for cached lot tables and spot maps, per process
+    FRAGMENT_CACHE_BYTES = 8 * 1024 * 1024
+    # Per-endpoint latency and SQL statement profiling (see services/metrics.py)
+    METRICS_ENABLED = os.environ.get("METRICS_ENABLED") == "1"
+    SLOW_QUERY_MS = int(os.environ.get("SLOW_QUERY_MS", 100))
+    # Bearer token a Prometheus scraper sends to /metrics; admins can always read it
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+    # werkzeug hash method for new passwords, e.g. "scrypt:16384:8:1" or "pbkdf2:sha256:600000";
+    # stored hashes made with other parameters are replaced at the user's next login
+    PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+    # Login attempts per client address (all) and per email (failed ones): burst, then per minute
+    LOGIN_RATE_LIMIT = os.environ.get("LOGIN_RATE_LIMIT", "1") == "1"
+    LOGIN_IP_BURST = 20
+    LOGIN_IP_PER_MINUTE = 30
+    LOGIN_EMAIL_BURST = 5
+    LOGIN_EMAIL_PER_MINUTE = 5
+    LOGIN_LIMITER_KEYS = 10000  # buckets kept per limiter
+    # Background jobs (services/jobs.py): run them on threads of the web process, or set
+    # JOBS_IN_PROCESS=0 and start `flask --app app run-jobs` next to it
+    JOBS_IN_PROCESS = os.environ.get("JOBS_IN_PROCESS", "1") == "1"
+    JOBS_THREADS = int(os.environ.get("JOBS_THREADS", 2))
+    JOBS_POLL_SECONDS = 2.0     # idle workers look for due retries and other processes' jobs this often
+    JOBS_LEASE_SECONDS = 600    # a job running longer is assumed lost with its worker and queued again
+    JOBS_KEEP_DAYS = 7          # finished jobs (and their idempotency keys) are kept this long
+    # Finished stays older than this move to reservation_archive (flask archive-reservations)
+    ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", 180))
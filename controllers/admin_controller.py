@@ -1,76 +1,46 @@
-from flask import render_template, request, redirect, session, url_for,flash
+import hmac
+from flask import Blueprint, render_template, request, redirect, session, url_for,flash, Response, stream_with_context, jsonify, current_app
 from models.models import db, ParkingLot, ParkingSpot, User ,Reservation
 from sqlalchemy.exc import SQLAlchemyError
-from datetime import datetime
-
-def init_admin_routes(app):
+from models.loading import USER_WITH_OPEN_RESERVATIONS
+from services.pagination import keyset_paginate
+from services.lots import lot_fields, create_lot, update_lot, delete_lot, LotError
+from services.provisioning import ProvisioningError
+from services.auth import login_required
+from services.search import search_lots
+from services.billing import quote, estimate_open_costs
+from services.analytics import usage
+from services.fragments import fragment_cache
+from services.spotmap import spot_map_json, spot_details
+from services.metrics import metrics, prometheus_text
+from services.jobs import job_counts
+from services.export import export_reservations, FORMATS
+from services.archive import reservation_history
+from datetime import datetime, timedelta
+
+def init_admin_routes(bp):
     
     # Create Parking Lot (with spots)
-    @app.route("/admin/parking_lot/create", methods=["GET", "POST"])
+    @bp.route("/admin/parking_lot/create", methods=["GET", "POST"])
+    @login_required("admin")
     def create_parking_lot():
-        #Only admin can access this page
-        if session.get("user_role") != "admin":
-            return redirect("/login")
-
         if request.method == "POST":
-            # Get form data
-            name = request.form.get("prime_location_name", "").strip()
-            price = request.form.get("price_per_hour", "").strip()
-            address = request.form.get("address", "").strip()
-            pincode = request.form.get("pincode", "").strip()
-            max_spots = request.form.get("max_spots", "").strip()
-
-            # Validate presence of all fields
-            if not all([name, price, address, pincode, max_spots]):
-                flash("Fill all required fields", "warning")
-                return redirect("/admin/parking_lot/create")
-
-            # Validate and convert data types
+            # Validate form data
             try:
-                price = float(price)
-                max_spots = int(max_spots)
-                if price < 0 or max_spots <= 0:
-                    raise ValueError
-            except ValueError:
-                flash("Enter valid positive numbers for price and max spots.", "warning")
-                return redirect("/admin/parking_lot/create")
-
-            if not pincode.isdigit() or len(pincode) != 6:
-                flash("Enter a valid 6-digit pincode.", "warning")
+                fields = lot_fields(request.form)
+            except LotError as e:
+                flash(str(e), "warning")
                 return redirect("/admin/parking_lot/create")
 
-            # Create new ParkingLot
+            # Create the ParkingLot and its spots in one transaction
             try:
-                new_lot = ParkingLot(
-                    prime_location_name=name,
-                    price_per_hour=price,
-                    address=address,
-                    pincode=pincode,
-                    max_spots=max_spots
-                )
-                db.session.add(new_lot)
+                create_lot(fields)
                 db.session.commit()
             except SQLAlchemyError as e:
                 db.session.rollback()
                 flash(f"Database error while creating parking lot: {str(e)}", "danger")
                 return redirect("/admin/parking_lot/create")
 
-            # Create parking spots
-            try:
-                for i in range(1, max_spots + 1):
-                    spot_number = f"{name[:3].upper()}-{i}"  # Unique spot number
-                    spot = ParkingSpot(
-                        spot_number=spot_number,
-                        lot_id=new_lot.id,
-                        status='A'  # Available by default
-                    )
-                    db.session.add(spot)
-                db.session.commit()
-            except SQLAlchemyError as e:
-                db.session.rollback()
-                flash(f"Database error while creating parking spots: {str(e)}", "danger")
-                return redirect("/admin/parking_lot/create")
-
             flash("Parking lot created successfully!", "success")
             return redirect("/admin")
 
@@ -80,138 +50,94 @@ def init_admin_routes(app):
 
     # Edit Parking Lot
 
-    @app.route("/admin/parking_lot/edit/<int:lot_id>", methods=["GET", "POST"])
+    @bp.route("/admin/parking_lot/edit/<int:lot_id>", methods=["GET", "POST"])
+    @login_required("admin")
     def edit_parking_lot(lot_id):
-        if session.get("user_role") != "admin":
-            return redirect("/login")
-
         lot = ParkingLot.query.get_or_404(lot_id)
-        old_max_spots = lot.max_spots
 
         if request.method == "POST":
             try:
-                name = request.form.get("prime_location_name", "").strip()
-                price = request.form.get("price_per_hour", "").strip()
-                address = request.form.get("address", "").strip()
-                pincode = request.form.get("pincode", "").strip()
-                new_max_spots_str = request.form.get("max_spots", "").strip()
-
-                if not all([name, price, address, pincode, new_max_spots_str]):
-                    flash("Please fill in all fields.", "warning")
-                    return redirect(f"/admin/parking_lot/edit/{lot_id}")
-
-                if not pincode.isdigit() or len(pincode) != 6:
-                    flash("Enter a valid 6-digit pincode.", "warning")
-                    return redirect(f"/admin/parking_lot/edit/{lot_id}")
-
-                if not new_max_spots_str.isdigit():
-                    flash("Max spots must be a valid number.", "warning")
-                    return redirect(f"/admin/parking_lot/edit/{lot_id}")
-
-                new_max_spots = int(new_max_spots_str)
-
-                if new_max_spots > old_max_spots:
-                    existing_spots = ParkingSpot.query.filter_by(lot_id=lot.id).count()
-                    for i in range(existing_spots + 1, new_max_spots + 1):
-                        spot = ParkingSpot(
-                            spot_number=f"S{i}",
-                            status="A",
-                            lot_id=lot.id
-                        )
-                        db.session.add(spot)
-
-                elif new_max_spots < old_max_spots:
-                    excess = old_max_spots - new_max_spots
-                    deletable_spots = (
-                        ParkingSpot.query
-                        .filter_by(lot_id=lot.id, status="A")
-                        .outerjoin(Reservation, Reservation.spot_id == ParkingSpot.id)
-                        .filter(Reservation.id == None)
-                        .order_by(ParkingSpot.id.desc())
-                        .limit(excess)
-                        .all()
-                    )
-                    if len(deletable_spots) < excess:
-                        flash(f"Cannot reduce to {new_max_spots}. Only {len(deletable_spots)} empty spots available.", "warning")
-                        return redirect(f"/admin/parking_lot/edit/{lot_id}")
-                    for spot in deletable_spots:
-                        db.session.delete(spot)
-
-                # Update lot details
-                lot.prime_location_name = name
-                lot.price_per_hour = float(price)
-                lot.address = address
-                lot.pincode = pincode
-                lot.max_spots = new_max_spots
-
+                # Resize the lot and update its details in one transaction
+                update_lot(lot, lot_fields(request.form))
                 db.session.commit()
                 flash("Parking lot updated successfully.", "success")
                 return redirect("/admin")
 
-            except ValueError:
-                flash("Price must be a valid number.", "warning")
-            except Exception as e:
+            except (LotError, ProvisioningError) as e:
+                db.session.rollback()
+                flash(str(e), "warning")
+                return redirect(f"/admin/parking_lot/edit/{lot_id}")
+            except SQLAlchemyError as e:
                 db.session.rollback()
-                flash(f"An error occurred: {str(e)}", "danger")
+                flash(f"Database error while updating parking lot: {str(e)}", "danger")
 
         return render_template("admin/edit_parking_lot.html", lot=lot)
 
 
     # Delete Parking Lot
     
-    @app.route("/admin/lot/delete/<int:lot_id>", methods=["POST"])
+    @bp.route("/admin/lot/delete/<int:lot_id>", methods=["POST"])
+    @login_required("admin")
     def delete_parking_lot(lot_id):
         lot = ParkingLot.query.get_or_404(lot_id)
 
-        # Check for active reservations in any spot of this lot
-        active_reservations = (
-            db.session.query(Reservation)
-            .join(ParkingSpot)
-            .filter(ParkingSpot.lot_id == lot_id)
-            .first()
-        )
-
-        if active_reservations:
-            flash("Cannot delete lot. Some spots have or had reservations.", "danger")
-            return redirect(url_for("admin_dashboard"))
+        try:
+            delete_lot(lot)
+        except LotError as e:
+            flash(str(e), "danger")
+            return redirect(url_for("auth.admin_dashboard"))
 
-        # Safe to delete
-        db.session.delete(lot)
         db.session.commit()
         flash("Lot deleted successfully.", "success")
-        return redirect(url_for("admin_dashboard"))
+        return redirect(url_for("auth.admin_dashboard"))
 
 
     # View Parking Lot Details & Spots
 
-    @app.route("/admin/parking_lot/<int:lot_id>")
+    @bp.route("/admin/parking_lot/<int:lot_id>")
+    @login_required("admin")
     def view_parking_lot(lot_id):
-        if session.get("user_role") != "admin":
-            return redirect("/login")
-
         lot = ParkingLot.query.get_or_404(lot_id)
 
-        # Get the current page number from query string (default = 1)
-        page = request.args.get("page", 1, type=int)
+        # Every spot of the lot as a compact map, cached until a spot in the lot changes
+        spot_map = spot_map_json(lot)
 
-        # Paginate spots (10 per page)
-        spots_pagination = ParkingSpot.query.filter_by(lot_id=lot_id).paginate(page=page, per_page=10)
+        # Charges accrued so far by every vehicle still parked in the lot
+        accrued = estimate_open_costs(lot_id=lot_id)
 
         return render_template(
             "admin/view_parking_lot.html",
             lot=lot,
-            spots=spots_pagination.items,
-            pagination=spots_pagination
+            spot_map=spot_map,
+            accrued_total=round(sum(accrued.values()), 2),
+            parked=len(accrued)
         )
 
+    # The same map as JSON, for refreshing the page; 304 while the lot is unchanged
+    @bp.route("/admin/parking_lot/<int:lot_id>/spot_map")
+    @login_required("admin")
+    def lot_spot_map(lot_id):
+        lot = ParkingLot.query.get_or_404(lot_id)
+        etag = f"spot-map-{lot.id}-{lot.version}"
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = Response(spot_map_json(lot), mimetype="application/json")
+        response.set_etag(etag)
+        return response
+
     
+    # Number and open reservation of one spot, loaded when it is clicked on the spot map
+    @bp.route("/admin/spot/<int:spot_id>/details")
+    @login_required("admin")
+    def spot_map_details(spot_id):
+        return jsonify(spot_details(ParkingSpot.query.get_or_404(spot_id)))
+
     # view spot details
     
-    @app.route("/admin/spot/<int:spot_id>")
+    @bp.route("/admin/spot/<int:spot_id>")
+    @login_required("admin")
     def view_spot(spot_id):
-        if session.get("user_role") != "admin":
-            return redirect("/login")
-
         spot = ParkingSpot.query.get_or_404(spot_id)
         reservation = Reservation.query.filter(Reservation.spot_id == spot_id,Reservation.leaving_timestamp==None).first()
 
@@ -219,13 +145,8 @@ def init_admin_routes(app):
             # No reservation found for this spot
             return render_template("admin/view_spot.html", spot=spot)
 
-        # Calculate parking duration and cost
-        leaving_time = datetime.now()
-        duration = (leaving_time - reservation.parking_timestamp).total_seconds() / 3600
-        duration = max(duration, 0.5)  # Minimum billing duration: 0.5 hours
-
-        price_per_hour = reservation.spot.lot.price_per_hour
-        parking_cost = round(price_per_hour * duration, 2)
+        # Cost so far under the lot's tariff
+        parking_cost = quote(spot.lot, reservation.parking_timestamp)
 
         return render_template(
             "admin/view_spot_detail.html",
@@ -236,28 +157,30 @@ def init_admin_routes(app):
    
     # View All Users and their Reservations
     
-    @app.route("/admin/users")
+    @bp.route("/admin/users")
+    @login_required("admin")
     def view_users():
-        if session.get("user_role") != "admin":
-            return redirect("/login")
-
-        users = User.query.all()
-        return render_template("admin/view_users.html", users=users)
+        # Page through users by id
+        page = keyset_paginate(
+            User.query.options(*USER_WITH_OPEN_RESERVATIONS).filter(User.role == "user"),
+            [User.id],
+            after=request.args.get("after"),
+            before=request.args.get("before"),
+            descending=False
+        )
+        return render_template("admin/view_users.html", users=page.items, page=page)
     
     
      # Render admin search form
-    @app.route("/admin/search")
+    @bp.route("/admin/search")
+    @login_required("admin")
     def search():
-        if session.get("user_role") != "admin":
-            return redirect("/login")
         return render_template("admin/search.html")
 
     # Handle parking lot search
-    @app.route("/admin/search_lots", methods=["GET"])
+    @bp.route("/admin/search_lots", methods=["GET"])
+    @login_required("admin")
     def search_parking_lots():
-        if session.get("user_role") != "admin":
-            return redirect("/login")
-
         search_by = request.args.get("search_by", "").lower()
         query = request.args.get("query", "").strip()
 
@@ -280,17 +203,143 @@ def init_admin_routes(app):
                 price = float(query)
                 lots = ParkingLot.query.filter(attr <= price).all()
             else:
-                lots = ParkingLot.query.filter(attr.ilike(f"%{query}%")).all()
+                lots = search_lots(query, columns=(attr.key,))
         except ValueError:
             return render_template("admin/search_results.html", lots=[], error="Invalid value for price", search_by=search_by, query=query)
 
         return render_template("admin/search_results.html", lots=lots, search_by=search_by, query=query)
     
     # Summary
-    @app.route("/admin/reservations")
+    @bp.route("/admin/reservations")
+    @login_required("admin")
     def view_all_reservations():
-        if session.get("user_role") != "admin":
-            return redirect("/login")
         
-        reservations = Reservation.query.order_by(Reservation.parking_timestamp.desc()).all()
-        return render_template("admin/all_reservations.html", reservations=reservations)
+        # Newest first, one page at a time, archived stays included
+        page = reservation_history(
+            with_user=True,
+            after=request.args.get("after"),
+            before=request.args.get("before")
+        )
+        # Live cost of the reservations on this page that are still parked (lots already loaded)
+        now = datetime.now()
+        accrued = {
+            r.id: quote(r.spot.lot, r.parking_timestamp, now)
+            for r in page.items if not r.leaving_timestamp
+        }
+        return render_template("admin/all_reservations.html", reservations=page.items, page=page, accrued=accrued)
+
+
+    # Export reservations as CSV or JSONL, streamed row by row
+    @bp.route("/admin/reservations/export")
+    @login_required("admin")
+    def export_all_reservations():
+        fmt = request.args.get("format", "csv").lower()
+        if fmt not in FORMATS:
+            flash("Export format must be csv or jsonl.", "warning")
+            return redirect(url_for("admin.view_all_reservations"))
+
+        try:
+            lot_id = request.args.get("lot_id", type=int)
+            user_id = request.args.get("user_id", type=int)
+            start = request.args.get("start", "").strip()
+            end = request.args.get("end", "").strip()
+            start = datetime.strptime(start, "%Y-%m-%d") if start else None
+            # End date is inclusive
+            end = datetime.strptime(end, "%Y-%m-%d") + timedelta(days=1) if end else None
+        except ValueError:
+            flash("Dates must be in YYYY-MM-DD format.", "warning")
+            return redirect(url_for("admin.view_all_reservations"))
+
+        chunks = export_reservations(fmt, lot_id=lot_id, user_id=user_id, start=start, end=end)
+        return Response(
+            stream_with_context(chunks),
+            mimetype=FORMATS[fmt],
+            headers={"Content-Disposition": f"attachment; filename=reservations.{fmt}"}
+        )
+
+
+    # Occupancy and revenue charts
+    @bp.route("/admin/analytics")
+    @login_required("admin")
+    def analytics():
+        lots = ParkingLot.query.with_entities(ParkingLot.id, ParkingLot.prime_location_name).all()
+        return render_template("admin/analytics.html", lots=lots)
+
+    # Chart data, read only from the hourly/daily rollups
+    @bp.route("/admin/analytics/data")
+    def analytics_data():
+        if session.get("user_role") != "admin":
+            return jsonify(error="Admin login required"), 401
+
+        granularity = request.args.get("granularity", "day")
+        if granularity not in ("day", "hour"):
+            return jsonify(error="granularity must be day or hour"), 400
+        try:
+            start = request.args.get("start", "").strip()
+            end = request.args.get("end", "").strip()
+            start = datetime.strptime(start, "%Y-%m-%d") if start else None
+            # End date is inclusive
+            end = datetime.strptime(end, "%Y-%m-%d") + timedelta(days=1) if end else None
+        except ValueError:
+            return jsonify(error="Dates must be in YYYY-MM-DD format"), 400
+
+        rows = usage(
+            lot_id=request.args.get("lot_id", type=int),
+            start=start,
+            end=end,
+            granularity=granularity
+        )
+        return jsonify(granularity=granularity, rows=rows)
+
+    # Fragment cache hit/miss counters of this worker
+    @bp.route("/admin/cache")
+    @login_required("admin")
+    def cache_stats():
+        return jsonify(fragments=fragment_cache().stats())
+
+    # Request latency and SQL statements per endpoint, slowest first
+    @bp.route("/admin/metrics")
+    @login_required("admin")
+    def view_metrics():
+        recorder = metrics()
+        rows, slow_queries = recorder.summary() if recorder else ([], [])
+        return render_template("admin/metrics.html", metrics=recorder, rows=rows,
+                               slow_queries=slow_queries, cache=fragment_cache().stats())
+
+    @bp.route("/admin/metrics/reset", methods=["POST"])
+    @login_required("admin")
+    def reset_metrics():
+        if metrics():
+            metrics().reset()
+            flash("Metrics reset.", "success")
+        return redirect("/admin/metrics")
+
+    # Prometheus scrape target; admin session or "Authorization: Bearer <METRICS_TOKEN>"
+    @bp.route("/metrics")
+    def prometheus_metrics():
+        recorder = metrics()
+        if recorder is None:
+            return "Metrics are disabled; set METRICS_ENABLED=1.\n", 404, {"Content-Type": "text/plain"}
+        token = current_app.config.get("METRICS_TOKEN")
+        authorized = session.get("user_role") == "admin" or (
+            token and hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}")
+        )
+        if not authorized:
+            return "Unauthorized\n", 401, {"Content-Type": "text/plain", "WWW-Authenticate": "Bearer"}
+
+        cache = fragment_cache().stats()
+        extra = [
+            ("parking_fragment_cache_hits_total", "counter", "Fragment cache hits.", cache["hits"]),
+            ("parking_fragment_cache_misses_total", "counter", "Fragment cache misses.", cache["misses"]),
+            ("parking_fragment_cache_evictions_total", "counter", "Fragments evicted to stay in budget.",
+             cache["evictions"]),
+            ("parking_fragment_cache_bytes", "gauge", "HTML held in the fragment cache.", cache["bytes"]),
+        ]
+        jobs = job_counts()
+        extra += [(f"parking_jobs_{status}", "gauge", f"Background jobs that are {status}.", jobs.get(status, 0))
+                  for status in ("queued", "running", "failed")]
+        return Response(prometheus_text(recorder, extra), mimetype="text/plain; version=0.0.4")
+
+
+admin_bp = Blueprint("admin", __name__)
+init_admin_routes(admin_bp)
@@ -0,0 +1,393 @@
+import hashlib
+from datetime import datetime
+from functools import wraps
+from flask import Blueprint, Response, request, session, jsonify
+from models.models import db, ParkingLot, Reservation, SpotBooking
+from models.loading import RESERVATION_WITH_SPOT
+from services.auth import log_in, authenticate, LoginThrottled
+from services.billing import quote
+from services.booking import book_first_available, release_spot, BookingContention
+from services.lots import lot_fields, create_lot, update_lot, delete_lot, LotError
+from services.provisioning import ProvisioningError
+from services.gates import process_gate_events, MAX_EVENTS
+from sqlalchemy.exc import OperationalError
+from services.archive import reservation_history
+from services.advance_booking import (parse_window, free_spot_count, book_window, conflicting_bookings,
+                                      upcoming_bookings, cancel_booking, check_in, BookingWindowError)
+
+# JSON API, version 1. Same session cookie as the web pages (POST /api/v1/login).
+#
+# Every GET answers with an ETag and honours If-None-Match. For lots the tag
+# is computed from (id, version) alone, so a poll that finds nothing changed
+# costs one narrow query and returns an empty 304. ?fields=a,b trims objects
+# to the listed keys.
+
+LOT_FIELDS = (
+    "id", "prime_location_name", "price_per_hour", "tariff_bands", "daily_cap", "address",
+    "pincode", "max_spots", "free_spots", "latitude", "longitude",
+)
+RESERVATION_FIELDS = (
+    "id", "lot_id", "lot_name", "spot_id", "spot_number", "vehicle_no",
+    "parking_timestamp", "leaving_timestamp", "parking_cost",
+)
+
+BOOKING_FIELDS = (
+    "id", "lot_id", "lot_name", "spot_id", "spot_number", "vehicle_no", "starts_at", "ends_at",
+    "reservation_id",
+)
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+def api_login_required(role=None):
+    """Like login_required, but answers 401/403 JSON instead of redirecting."""
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            if "user_id" not in session:
+                raise ApiError("Login required", 401)
+            if role and session.get("user_role") != role:
+                raise ApiError(f"{role.capitalize()} login required", 403)
+            return view(*args, **kwargs)
+        return wrapped
+    return decorator
+
+
+def selected_fields(available):
+    """Fields named in ?fields=, in the default order, or all of them."""
+    wanted = request.args.get("fields")
+    if not wanted:
+        return available
+    wanted = {f.strip() for f in wanted.split(",") if f.strip()}
+    unknown = wanted.difference(available)
+    if unknown:
+        raise ApiError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return tuple(f for f in available if f in wanted)
+
+
+def lot_json(lot, fields=LOT_FIELDS):
+    return {f: getattr(lot, f) for f in fields}
+
+
+def reservation_json(r, fields=RESERVATION_FIELDS):
+    values = {
+        "id": r.id,
+        "lot_id": r.lot_id,
+        "lot_name": r.lot_name,
+        "spot_id": r.spot_id,
+        "spot_number": r.spot_number,
+        "vehicle_no": r.vehicle_no,
+        "parking_timestamp": r.parking_timestamp.isoformat(),
+        "leaving_timestamp": r.leaving_timestamp.isoformat() if r.leaving_timestamp else None,
+        "parking_cost": r.parking_cost,
+    }
+    return {f: values[f] for f in fields}
+
+
+def booking_json(b, fields=BOOKING_FIELDS):
+    values = {
+        "id": b.id,
+        "lot_id": b.lot_id,
+        "lot_name": b.lot.prime_location_name,
+        "spot_id": b.spot_id,
+        "spot_number": b.spot.spot_number,
+        "vehicle_no": b.vehicle_no,
+        "starts_at": b.starts_at.isoformat(),
+        "ends_at": b.ends_at.isoformat(),
+        "reservation_id": b.reservation_id,
+    }
+    return {f: values[f] for f in fields}
+
+
+def own_booking(booking_id):
+    booking = db.session.get(SpotBooking, booking_id)
+    if booking is None:
+        raise ApiError("No booking with this ID", 404)
+    if booking.user_id != session["user_id"]:
+        raise ApiError("Unauthorized access to this booking", 403)
+    return booking
+
+
+def requested_window(data):
+    try:
+        return parse_window(data.get("start"), data.get("end"))
+    except BookingWindowError as e:
+        raise ApiError(str(e), 422)
+
+
+def version_etag(versions):
+    """Tag for the listed (id, version) rows as seen through this exact URL."""
+    key = repr((versions, request.full_path)).encode()
+    return hashlib.blake2b(key, digest_size=16).hexdigest()
+
+
+def not_modified(etag):
+    response = Response(status=304)
+    response.set_etag(etag)
+    return response
+
+
+def conditional(payload, etag=None):
+    """JSON response tagged with ``etag`` (or a hash of the body), 304 if the client has it."""
+    response = jsonify(payload)
+    if etag:
+        response.set_etag(etag)
+    else:
+        response.add_etag()
+    return response.make_conditional(request)
+
+
+def json_body():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        raise ApiError("Expected a JSON object body")
+    return data
+
+
+def init_api_routes(bp):
+
+    @bp.errorhandler(ApiError)
+    def api_error(e):
+        return jsonify(error=str(e)), e.status, e.headers
+
+    @bp.route("/login", methods=["POST"])
+    def api_login():
+        data = json_body()
+        try:
+            user = authenticate(str(data.get("email", "")), str(data.get("password", "")), request.remote_addr)
+        except LoginThrottled as e:
+            raise ApiError("Too many login attempts", 429, {"Retry-After": str(e.retry_after)})
+        if not user:
+            raise ApiError("Invalid email or password", 401)
+        log_in(user)
+        return jsonify(id=user.id, name=user.name, role=user.role)
+
+    @bp.route("/logout", methods=["POST"])
+    def api_logout():
+        session.clear()
+        return "", 204
+
+    # Lots with availability; ?available=1 leaves out full lots
+    @bp.route("/lots")
+    @api_login_required()
+    def api_lots():
+        fields = selected_fields(LOT_FIELDS)
+        query = ParkingLot.query.order_by(ParkingLot.id)
+        if request.args.get("available", type=int):
+            query = query.filter(ParkingLot.free_spots > 0)
+
+        etag = version_etag(query.with_entities(ParkingLot.id, ParkingLot.version).all())
+        if request.if_none_match.contains(etag):
+            return not_modified(etag)
+        return conditional({"lots": [lot_json(lot, fields) for lot in query]}, etag)
+
+    @bp.route("/lots/<int:lot_id>")
+    @api_login_required()
+    def api_lot(lot_id):
+        fields = selected_fields(LOT_FIELDS)
+        version = db.session.query(ParkingLot.version).filter_by(id=lot_id).scalar()
+        if version is None:
+            raise ApiError("No parking lot with this ID", 404)
+
+        etag = version_etag([(lot_id, version)])
+        if request.if_none_match.contains(etag):
+            return not_modified(etag)
+        return conditional(lot_json(db.session.get(ParkingLot, lot_id), fields), etag)
+
+    @bp.route("/lots/<int:lot_id>/book", methods=["POST"])
+    @api_login_required("user")
+    def api_book(lot_id):
+        vehicle_no = str(json_body().get("vehicle_no", "")).strip()
+        if not vehicle_no:
+            raise ApiError("vehicle_no is required")
+        if db.session.get(ParkingLot, lot_id) is None:
+            raise ApiError("No parking lot with this ID", 404)
+
+        try:
+            reservation = book_first_available(lot_id, session["user_id"], vehicle_no)
+        except BookingContention:
+            raise ApiError("The lot is busy right now, please try again.", 503)
+        if not reservation:
+            raise ApiError("No available spot", 409)
+        return jsonify(reservation_json(reservation)), 201
+
+    @bp.route("/reservations/<int:r_id>/release", methods=["POST"])
+    @api_login_required("user")
+    def api_release(r_id):
+        reservation = Reservation.query.options(*RESERVATION_WITH_SPOT).get(r_id)
+        if not reservation:
+            raise ApiError("No reservation with this ID", 404)
+        if reservation.user_id != session["user_id"]:
+            raise ApiError("Unauthorized access to this reservation", 403)
+
+        leaving_time = datetime.now()
+        parking_cost = quote(reservation.spot.lot, reservation.parking_timestamp, leaving_time)
+        if reservation.leaving_timestamp or not release_spot(reservation, leaving_time, parking_cost):
+            raise ApiError("This reservation has already been released.", 409)
+        return jsonify(reservation_json(reservation))
+
+    # The user's reservations, newest first; page with ?after=/?before= cursors
+    @bp.route("/reservations")
+    @api_login_required("user")
+    def api_reservations():
+        fields = selected_fields(RESERVATION_FIELDS)
+        page = reservation_history(
+            user_id=session["user_id"],
+            after=request.args.get("after"),
+            before=request.args.get("before"),
+            per_page=max(1, min(request.args.get("per_page", 25, type=int), 100))
+        )
+        return conditional({
+            "reservations": [reservation_json(r, fields) for r in page.items],
+            "next": page.next_cursor if page.has_next else None,
+            "prev": page.prev_cursor if page.has_prev else None,
+        })
+
+    # Advance bookings: a spot held for [start, end), both ISO 8601 times
+    @bp.route("/lots/<int:lot_id>/availability")
+    @api_login_required()
+    def api_window_availability(lot_id):
+        if db.session.get(ParkingLot, lot_id) is None:
+            raise ApiError("No parking lot with this ID", 404)
+        start, end = requested_window(request.args)
+        return jsonify(lot_id=lot_id, start=start.isoformat(), end=end.isoformat(),
+                       free_spots=free_spot_count(lot_id, start, end))
+
+    # {"start", "end", "vehicle_no"} and optionally the "spot_id" to book
+    @bp.route("/lots/<int:lot_id>/bookings", methods=["POST"])
+    @api_login_required("user")
+    def api_book_window(lot_id):
+        data = json_body()
+        vehicle_no = str(data.get("vehicle_no", "")).strip()
+        if not vehicle_no:
+            raise ApiError("vehicle_no is required")
+        spot_id = data.get("spot_id")
+        if spot_id is not None and not isinstance(spot_id, int):
+            raise ApiError("spot_id must be an integer")
+        if db.session.get(ParkingLot, lot_id) is None:
+            raise ApiError("No parking lot with this ID", 404)
+        start, end = requested_window(data)
+
+        try:
+            booking = book_window(lot_id, session["user_id"], vehicle_no, start, end, spot_id=spot_id)
+        except BookingWindowError as e:
+            raise ApiError(str(e), 409)
+        except BookingContention:
+            raise ApiError("The lot is busy right now, please try again.", 503)
+        if booking:
+            return jsonify(booking_json(booking)), 201, {"Location": f"/api/v1/bookings/{booking.id}"}
+        if spot_id is None:
+            raise ApiError("No spot is free for this window", 409)
+        # Tell the client what the requested spot is booked for
+        conflicts = [{"starts_at": b.starts_at.isoformat(), "ends_at": b.ends_at.isoformat()}
+                     for b in conflicting_bookings(spot_id, start, end)]
+        return jsonify(error="This spot is not free for this window", conflicts=conflicts), 409
+
+    @bp.route("/bookings")
+    @api_login_required("user")
+    def api_bookings():
+        fields = selected_fields(BOOKING_FIELDS)
+        return conditional({"bookings": [booking_json(b, fields) for b in upcoming_bookings(session["user_id"])]})
+
+    @bp.route("/bookings/<int:booking_id>")
+    @api_login_required("user")
+    def api_booking(booking_id):
+        return conditional(booking_json(own_booking(booking_id), selected_fields(BOOKING_FIELDS)))
+
+    @bp.route("/bookings/<int:booking_id>", methods=["DELETE"])
+    @api_login_required("user")
+    def api_cancel_booking(booking_id):
+        if not cancel_booking(own_booking(booking_id)):
+            raise ApiError("A checked-in booking cannot be cancelled", 409)
+        return "", 204
+
+    # Arrival: opens the stay, on the booked spot if it is free
+    @bp.route("/bookings/<int:booking_id>/check-in", methods=["POST"])
+    @api_login_required("user")
+    def api_check_in(booking_id):
+        booking = own_booking(booking_id)
+        try:
+            reservation = check_in(booking)
+        except BookingWindowError as e:
+            raise ApiError(str(e), 409)
+        except OperationalError:
+            db.session.rollback()
+            raise ApiError("The lot is busy right now, please try again.", 503)
+        if not reservation:
+            raise ApiError("No available spot", 409)
+        return jsonify(reservation_json(reservation)), 201
+
+    # Admin lot CRUD; bodies use the same fields as the lot form
+    @bp.route("/lots", methods=["POST"])
+    @api_login_required("admin")
+    def api_create_lot():
+        try:
+            fields = lot_fields(json_body())
+        except LotError as e:
+            raise ApiError(str(e), 422)
+        lot = create_lot(fields)
+        db.session.commit()
+        return jsonify(lot_json(lot)), 201, {"Location": f"/api/v1/lots/{lot.id}"}
+
+    # PUT replaces every field, PATCH only the ones given
+    @bp.route("/lots/<int:lot_id>", methods=["PUT", "PATCH"])
+    @api_login_required("admin")
+    def api_update_lot(lot_id):
+        lot = db.session.get(ParkingLot, lot_id)
+        if lot is None:
+            raise ApiError("No parking lot with this ID", 404)
+
+        data = json_body()
+        if request.method == "PATCH":
+            data = {**lot_json(lot), **data}
+        try:
+            fields = lot_fields(data)
+        except LotError as e:
+            raise ApiError(str(e), 422)
+        try:
+            update_lot(lot, fields)
+        except (LotError, ProvisioningError) as e:
+            db.session.rollback()
+            raise ApiError(str(e), 409)
+        db.session.commit()
+        return jsonify(lot_json(lot))
+
+    @bp.route("/lots/<int:lot_id>", methods=["DELETE"])
+    @api_login_required("admin")
+    def api_delete_lot(lot_id):
+        lot = db.session.get(ParkingLot, lot_id)
+        if lot is None:
+            raise ApiError("No parking lot with this ID", 404)
+        try:
+            delete_lot(lot)
+        except LotError as e:
+            raise ApiError(str(e), 409)
+        db.session.commit()
+        return "", 204
+
+    # Gate hardware: a burst of check-in/check-out plate reads, applied together
+    @bp.route("/gate/events", methods=["POST"])
+    @api_login_required("admin")
+    def api_gate_events():
+        events = json_body().get("events")
+        if not isinstance(events, list):
+            raise ApiError("events must be a list")
+        if len(events) > MAX_EVENTS:
+            raise ApiError(f"At most {MAX_EVENTS} events per request", 413)
+
+        try:
+            results = process_gate_events(events)
+        except OperationalError:
+            db.session.rollback()
+            raise ApiError("The database is busy right now, please resend the batch.", 503)
+        applied = sum(1 for r in results if r["ok"])
+        return jsonify(applied=applied, failed=len(results) - applied, results=results)
+
+
+api_bp = Blueprint("api_v1", __name__, url_prefix="/api/v1")
+init_api_routes(api_bp)
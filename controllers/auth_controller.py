@@ -1,20 +1,22 @@
-from flask import render_template, request, redirect, session, flash
+from flask import Blueprint, render_template, request, redirect, session, flash
 from models.models import db, User,ParkingLot,Reservation,ParkingSpot
-from werkzeug.security import generate_password_hash, check_password_hash
+from services.fragments import lot_list_fragment
+from services.auth import login_required, current_user, log_in, authenticate, hash_password, LoginThrottled
+from services.live import hub
+from services.archive import dashboard_reservations
 
-def init_auth_routes(app):
+def init_auth_routes(bp):
 
 # route for root url
-    @app.route('/')
+    @bp.route('/')
     def home():
         if ('user_id') not in session:
             return redirect('/login')
-        user_id = session.get('user_id')
-        user = User.query.get(user_id)
-        return redirect("/admin" if user.role == "admin" else "/user/dashboard")
+        # The role is already in the session, no need to load the user
+        return redirect("/admin" if session.get('user_role') == "admin" else "/user/dashboard")
 
 # registration
-    @app.route("/register", methods=["GET", "POST"])
+    @bp.route("/register", methods=["GET", "POST"])
     def register():
         if request.method == "POST":
             email = request.form.get("email").strip()
@@ -41,7 +43,7 @@ def init_auth_routes(app):
             user = User(
                 name=name,
                 email=email,
-                password=generate_password_hash(password),
+                password=hash_password(password),
                 address=address,
                 pincode=pincode,
                 role="user"
@@ -55,81 +57,67 @@ def init_auth_routes(app):
 
 # login
 
-    @app.route("/login", methods=["GET", "POST"])
+    @bp.route("/login", methods=["GET", "POST"])
     def login():
         if request.method == "POST":
             email = request.form.get("email", "")
             password = request.form.get("password", "")
 
-            user = User.query.filter_by(email=email).first()
-            
-            # check is user exists
-            if not user:
-                flash("user does not exist", "danger")
+            # Same message (and about the same time) for an unknown email and a wrong password
+            try:
+                user = authenticate(email, password, request.remote_addr)
+            except LoginThrottled as e:
+                flash(f"Too many login attempts. Try again in {e.retry_after} seconds.", "danger")
                 return redirect("/login")
-
-            # check password
-            if not check_password_hash(user.password, password):
-                flash("Incorrect password", "danger")
+            if not user:
+                flash("Invalid email or password", "danger")
                 return redirect("/login")
 
             # stores login information in session 
-            session['user_id'] = user.id
-            session['user_role'] = user.role
+            log_in(user)
             flash("Login successful!", "success")
             return redirect("/admin" if user.role == "admin" else "/user/dashboard")
 
         return render_template("login.html")
 
 # user dashboard
-    @app.route("/user/dashboard")
+    @bp.route("/user/dashboard")
+    @login_required("user")
     def user_dashboard():
-        # Ensure the user is logged in and has the correct role
-        if 'user_id' not in session or session.get('user_role') != 'user':
-            flash("Login required", "warning")
-            return redirect("/login")
-
         user_id = session.get("user_id")
-        user = User.query.get(user_id)
-        lots = ParkingLot.query.all()
+        user = current_user()
+        live_after = hub.last_id  # live updates continue from the counts read below
 
-        # Dictionary to track available spots per lot
-        available_spots_dict = {}
-        for lot in lots:
-            count = ParkingSpot.query.filter_by(lot_id=lot.id, status='A').count()
-            available_spots_dict[lot.id] = count
+        # Lot table, re-rendered only after a lot or one of its spots changed
+        lots_html = lot_list_fragment("user/lot_table.html")
 
-        # Get user's reservation history
-        reservations = Reservation.query.filter_by(user_id=user_id).order_by(
-            Reservation.parking_timestamp.desc()
-        ).all()
+        # Open reservations and the latest finished stays (full history is on /user/summary)
+        reservations = dashboard_reservations(user_id)
 
         return render_template(
             "user/user_dashboard.html",
             user=user,
             reservations=reservations,
-            lots=lots,
-            available_spots=available_spots_dict
+            lots_html=lots_html,
+            live_after=live_after
         )
 
 # admin dashboard
-    @app.route("/admin")
+    @bp.route("/admin")
+    @login_required("admin")
     def admin_dashboard():
-        # check if logged in and is admin
-        if 'user_id' not in session or session.get('user_role') != 'admin':
-            flash("Admin login required.", "warning")
-            return redirect("/login")
-        parking_lots = ParkingLot.query.all()
-                # Dictionary to track available spots per lot
-        available_spots_dict = {}
-        for lot in parking_lots:
-            count = ParkingSpot.query.filter_by(lot_id=lot.id, status='A').count()
-            available_spots_dict[lot.id] = count
-        return render_template("admin/admin_dashboard.html", lots=parking_lots,available_spots=available_spots_dict)
+        live_after = hub.last_id
+        # Lot table, re-rendered only after a lot or one of its spots changed
+        lots_html = lot_list_fragment("admin/lot_table.html")
+        return render_template("admin/admin_dashboard.html", lots_html=lots_html, live_after=live_after)
     
 # logout
-    @app.route("/logout")
+    @bp.route("/logout")
     def logout():
         session.clear()
         flash("Logged out successfully.", "info")
         return redirect("/login")
+
+
+auth_bp = Blueprint("auth", __name__)
+init_auth_routes(auth_bp)
@@ -0,0 +1,65 @@
+import json
+from flask import Blueprint, request, Response, stream_with_context, jsonify
+from models.models import db, ParkingLot
+from services.auth import login_required
+from services.live import hub
+
+# Seconds between keep-alive comments on an idle stream / longest long-poll wait
+HEARTBEAT = 15
+MAX_POLL = 30
+
+
+def snapshot():
+    """Free spots of every lot, sent when a client is too far behind to catch up from events."""
+    free = dict(db.session.query(ParkingLot.id, ParkingLot.free_spots))
+    db.session.rollback()  # hand the connection back; streams stay open for a long time
+    return free
+
+
+def init_live_routes(bp):
+
+    # Server-sent events: one "availability" event per counter change
+    @bp.route("/availability/stream")
+    @login_required()
+    def availability_stream():
+        last_id = request.headers.get("Last-Event-ID", type=int)
+        if last_id is None:
+            last_id = request.args.get("after", hub.last_id, type=int)
+
+        def events(last_id):
+            yield "retry: 3000\n\n"
+            while True:
+                changes = hub.wait(last_id, HEARTBEAT)
+                if changes is None:
+                    last_id = hub.last_id
+                    yield f"id: {last_id}\nevent: snapshot\ndata: {json.dumps(snapshot())}\n\n"
+                elif not changes:
+                    yield ": keep-alive\n\n"
+                else:
+                    for event_id, change in changes:
+                        yield f"id: {event_id}\nevent: availability\ndata: {json.dumps(change)}\n\n"
+                    last_id = changes[-1][0]
+
+        return Response(
+            stream_with_context(events(last_id)),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
+    # Long-poll fallback: waits for changes after ?after=<id>, then returns them as JSON
+    @bp.route("/availability/poll")
+    @login_required()
+    def availability_poll():
+        last_id = request.args.get("after", hub.last_id, type=int)
+        timeout = min(request.args.get("timeout", MAX_POLL, type=float), MAX_POLL)
+        changes = hub.wait(last_id, timeout)
+        if changes is None:
+            return jsonify(last_id=hub.last_id, snapshot=snapshot())
+        return jsonify(
+            last_id=changes[-1][0] if changes else last_id,
+            changes=[change for _, change in changes]
+        )
+
+
+live_bp = Blueprint("live", __name__)
+init_live_routes(live_bp)
@@ -1,33 +1,36 @@
 from datetime import datetime
-from flask import render_template, request, redirect, session, url_for,flash
+from flask import Blueprint, render_template, request, redirect, session, url_for,flash
 from models.models import db, ParkingLot, ParkingSpot, User,Reservation
-from sqlalchemy import or_, func
+from models.loading import RESERVATION_WITH_SPOT
+from services.availability import available_spots_for
+from services.search import search_lots
+from services.geo import nearest_lots
+from services.billing import quote
+from services.auth import login_required, current_user, invalidate_user
+from services.booking import book_first_available, release_spot, BookingContention
+from services.archive import reservation_history, dashboard_reservations
 
-def init_user_routes(app):
+def init_user_routes(bp):
 
     # view profile and edit profile
-    @app.route("/user/profile",methods=['post','get'])
+    @bp.route("/user/profile",methods=['post','get'])
+    @login_required("user")
     def user_profile():
-        if 'user_id' not in session or session.get('user_role') != 'user':
-            flash("login required", "warning")
-            return redirect("/login")
         user_id = session.get("user_id")
-        user = User.query.get(user_id) 
         if(request.method == "POST"):
+            user = User.query.get(user_id)
             user.name = request.form['name']
             db.session.commit()
+            invalidate_user(user_id)
             flash("Edit successfull", "success")
             return redirect('/user/dashboard')
-        return render_template("user/user_profile.html",user=user)
+        return render_template("user/user_profile.html",user=current_user())
 
     # Release spot
-    @app.route("/release/<int:r_id>", methods=['GET', 'POST'])
+    @bp.route("/release/<int:r_id>", methods=['GET', 'POST'])
+    @login_required("user")
     def release_reservation(r_id):
-        if 'user_id' not in session or session.get('user_role') != 'user':
-            flash("Login required", "warning")
-            return redirect("/login")
-
-        reservation = Reservation.query.get(r_id)
+        reservation = Reservation.query.options(*RESERVATION_WITH_SPOT).get(r_id)
 
         if not reservation:
             flash("No reservation with this ID", "danger")
@@ -44,19 +47,13 @@ def init_user_routes(app):
 
         # Calculate values only once
         leaving_time = datetime.now()
-        duration = (leaving_time - reservation.parking_timestamp).total_seconds() / 3600
-        duration = max(duration, 0.5)  # Enforce minimum billing
-        parking_cost = round(reservation.spot.lot.price_per_hour * duration, 2)
+        parking_cost = quote(reservation.spot.lot, reservation.parking_timestamp, leaving_time)
 
         if request.method == "POST":
-            # Update existing reservation
-            reservation.leaving_timestamp = leaving_time
-            reservation.parking_cost = parking_cost
-
-            # Mark the spot as available
-            reservation.spot.status = 'A'
-
-            db.session.commit()
+            # Close the reservation and free the spot in one transaction
+            if not release_spot(reservation, leaving_time, parking_cost):
+                flash("This reservation has already been released.", "info")
+                return redirect("/user/dashboard")
 
             flash(f"Spot released successfully! Total cost: ₹{parking_cost}", "success")
             return redirect("/user/dashboard")
@@ -71,20 +68,14 @@ def init_user_routes(app):
 
 # Search Parking lot by address or pincode
 
-    @app.route("/user/search", methods=["POST"])
+    @bp.route("/user/search", methods=["POST"])
+    @login_required("user")
     def search_parking():
-        # Ensure the user is logged in and has the correct role
-        if 'user_id' not in session or session.get('user_role') != 'user':
-            flash("Login required", "warning")
-            return redirect("/login")
-
         user_id = session.get('user_id')
-        user = User.query.get_or_404(user_id)
+        user = current_user()
 
-        # Get reservation history
-        reservations = Reservation.query.filter_by(user_id=user_id).order_by(
-            Reservation.parking_timestamp.desc()
-        ).all()
+        # Open reservations and the latest finished stays
+        reservations = dashboard_reservations(user_id)
 
         # Get search input
         location = request.form.get('search_location', '').strip()
@@ -93,22 +84,14 @@ def init_user_routes(app):
             flash("Please enter a location or pincode", "warning")
             return redirect("/user/dashboard")
 
-        # Match by either pincode or address 
-        lots = ParkingLot.query.filter(
-            or_(
-                ParkingLot.pincode == location,
-                func.lower(ParkingLot.address).like(f"%{location.lower()}%")
-            )
-        ).all()
+        # Match words in the lot name, address or pincode, best match first
+        lots = search_lots(location)
 
         if not lots:
             flash(f"No parking lots found for '{location}'.", "info")
 
         # available spots per lot
-        available_spots_dict = {
-            lot.id: ParkingSpot.query.filter_by(lot_id=lot.id, status='A').count()
-            for lot in lots
-        }
+        available_spots_dict = available_spots_for(lots)
 
         return render_template(
             "user/user_dashboard.html",
@@ -119,55 +102,80 @@ def init_user_routes(app):
             available_spots=available_spots_dict
         )
 
-# book spot
-    @app.route("/book/<int:lot_id>", methods=['GET', 'POST'])
-    def book_spot(lot_id):
-        if 'user_id' not in session or session.get('user_role') != 'user':
-            flash("Login required", "warning")
-            return redirect("/login")
+# Nearest lots with free spots
 
-        user_id = session.get("user_id")
-        user = User.query.get(user_id)
+    @bp.route("/user/nearby")
+    @login_required("user")
+    def nearby_parking():
+        lat = request.args.get("lat", type=float)
+        lng = request.args.get("lng", type=float)
+        if lat is None or lng is None or not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            flash("Could not read your location", "warning")
+            return redirect("/user/dashboard")
 
-        spot = ParkingSpot.query.filter(
-            ParkingSpot.lot_id == lot_id,
-            ParkingSpot.status == 'A'
-        ).first()
+        user_id = session.get('user_id')
+        user = current_user()
+        reservations = dashboard_reservations(user_id)
 
-        if request.method == "POST":
-            if not spot:
-                flash("No available spot", "danger")
-                return redirect("/user/dashboard")
+        nearest = nearest_lots(lat, lng, limit=10)
+        if not nearest:
+            flash("No parking lots with free spots near you.", "info")
 
-            vehicle_no = request.form["vehicle_number"]
-            parking_time = datetime.now()  # ⬅️ Automatically set current time
+        return render_template(
+            "user/user_dashboard.html",
+            user=user,
+            lots=[lot for lot, _, _ in nearest],
+            reservations=reservations,
+            search_location="your location",
+            available_spots={lot.id: free for lot, _, free in nearest},
+            distances={lot.id: distance for lot, distance, _ in nearest}
+        )
+
+# book spot
+    @bp.route("/book/<int:lot_id>", methods=['GET', 'POST'])
+    @login_required("user")
+    def book_spot(lot_id):
+        user = current_user()
 
-            # Create booking
-            reservation = Reservation(
-                user_id=user.id,
-                spot_id=spot.id,
-                vehicle_no=vehicle_no,
-                parking_timestamp=parking_time
-            )
+        if request.method == "POST":
+            vehicle_no = request.form["vehicle_number"]
 
-            # Mark spot as booked
-            spot.status = 'O'
+            # Claim a free spot atomically; another user may have taken this one
+            try:
+                reservation = book_first_available(lot_id, user.id, vehicle_no)
+            except BookingContention:
+                flash("The lot is busy right now, please try again.", "warning")
+                return redirect("/user/dashboard")
 
-            db.session.add(reservation)
-            db.session.commit()
+            if not reservation:
+                flash("No available spot", "danger")
+                return redirect("/user/dashboard")
 
             flash("Spot successfully booked!", "success")
             return redirect("/user/dashboard")
 
+        # Preview the spot the booking is likely to get
+        spot = ParkingSpot.query.filter(
+            ParkingSpot.lot_id == lot_id,
+            ParkingSpot.status == 'A'
+        ).first()
+
         return render_template("user/book_spot.html", spot=spot, user=user)
 
 # View reservation history
 
-    @app.route("/user/summary")
+    @bp.route("/user/summary")
+    @login_required("user")
     def user_reservations():
-        if session.get("user_role") != "user":
-            return redirect("/login")
-        
-        user = User.query.get(session.get('user_id'))
-        reservations = Reservation.query.filter(Reservation.user_id==user.id).order_by(Reservation.parking_timestamp.desc()).all()
-        return render_template("user/summary.html", reservations=reservations,user=user)
\ No newline at end of file
+        user = current_user()
+        # Newest first, one page at a time, archived stays included
+        page = reservation_history(
+            user_id=user.id,
+            after=request.args.get("after"),
+            before=request.args.get("before")
+        )
+        return render_template("user/summary.html", reservations=page.items, page=page, user=user)
+
+
+user_bp = Blueprint("user", __name__)
+init_user_routes(user_bp)
@@ -0,0 +1,29 @@
+from sqlalchemy import event
+from models.models import db
+
+
+# Per-connection engine tuning.
+#
+# SQLite settings such as busy_timeout and cache_size only last for one
+# connection, so they are applied from a "connect" event to every connection
+# the pool opens. journal_mode=WAL is stored in the database file and sticks
+# once set. Other databases are tuned through SQLALCHEMY_ENGINE_OPTIONS alone.
+
+
+def apply_pragmas(engine, pragmas):
+    """Run ``PRAGMA name=value`` for each entry on every new SQLite connection."""
+    if engine.dialect.name != "sqlite" or not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def init_engine(app):
+    """Attach the configured SQLITE_PRAGMAS before the app opens its first connection."""
+    with app.app_context():
+        apply_pragmas(db.engine, app.config.get("SQLITE_PRAGMAS", {}))
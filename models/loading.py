@@ -0,0 +1,38 @@
+from sqlalchemy.orm import joinedload, selectinload
+from models.models import User, ParkingSpot, Reservation, ArchivedReservation, SpotBooking
+
+
+# Eager-loading profiles for listing pages.
+#
+# Templates walk r.user, r.spot.lot and u.reservations on every row; with the
+# default lazy relationships that is a query per row. Each profile loads what
+# its page renders up front. Many-to-one hops are joined (the foreign keys are
+# NOT NULL, so inner joins are safe); one-to-many collections use selectin.
+
+# Reservation row showing location and spot (user pages)
+RESERVATION_WITH_SPOT = (
+    joinedload(Reservation.spot, innerjoin=True).joinedload(ParkingSpot.lot, innerjoin=True),
+)
+
+# Reservation row that also shows who booked it (admin pages)
+RESERVATION_WITH_USER_AND_SPOT = RESERVATION_WITH_SPOT + (
+    joinedload(Reservation.user, innerjoin=True),
+)
+
+# Archived reservation row with who booked it (admin pages); lot and spot are columns
+ARCHIVED_WITH_USER = (
+    joinedload(ArchivedReservation.user, innerjoin=True),
+)
+
+# Advance booking with its lot and spot (upcoming bookings)
+BOOKING_WITH_SPOT = (
+    joinedload(SpotBooking.spot, innerjoin=True),
+    joinedload(SpotBooking.lot, innerjoin=True),
+)
+
+# User row listing their open reservations and each one's lot; finished stays are not loaded
+USER_WITH_OPEN_RESERVATIONS = (
+    selectinload(User.reservations.and_(Reservation.leaving_timestamp.is_(None)))
+    .joinedload(Reservation.spot, innerjoin=True)
+    .joinedload(ParkingSpot.lot, innerjoin=True),
+)
@@ -0,0 +1,289 @@
+from sqlalchemy import inspect, text
+from models.models import db
+
+
+# Versioned schema migrations.
+#
+# db.create_all() only creates missing tables, so columns and indexes added to
+# the models later never reach an existing parking.sqlite3. Each step below
+# upgrades the schema by one version; the applied version is stored in the
+# schema_version table. Steps are written as plain SQL against the schema as it
+# was at that version, and are safe to re-run, so a fresh database built by
+# create_all() simply runs them all (some objects, like the search index,
+# exist only here and not on the models).
+
+
+def _add_free_spots(conn):
+    columns = [c["name"] for c in inspect(conn).get_columns("parking_lot")]
+    if "free_spots" not in columns:
+        conn.execute(text("ALTER TABLE parking_lot ADD COLUMN free_spots INTEGER NOT NULL DEFAULT 0"))
+    conn.execute(text(
+        "UPDATE parking_lot SET free_spots = ("
+        " SELECT COUNT(*) FROM parking_spot"
+        " WHERE parking_spot.lot_id = parking_lot.id AND parking_spot.status = 'A')"
+    ))
+
+
+def _add_spot_status_index(conn):
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_parking_spot_lot_status ON parking_spot (lot_id, status)"
+    ))
+
+
+def _add_hot_path_indexes(conn):
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_reservation_user_parked"
+        " ON reservation (user_id, parking_timestamp)"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_reservation_spot_leaving"
+        " ON reservation (spot_id, leaving_timestamp)"
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_parking_lot_pincode ON parking_lot (pincode)"
+    ))
+
+
+def _add_parked_index(conn):
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_reservation_parked ON reservation (parking_timestamp)"
+    ))
+
+
+def _add_lot_search_index(conn):
+    # FTS5 is SQLite only; other databases keep searching with LIKE
+    if conn.dialect.name != "sqlite":
+        return
+    conn.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS parking_lot_fts USING fts5("
+        " prime_location_name, address, pincode,"
+        " content='parking_lot', content_rowid='id', prefix='2 3')"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS parking_lot_fts_insert AFTER INSERT ON parking_lot BEGIN"
+        " INSERT INTO parking_lot_fts (rowid, prime_location_name, address, pincode)"
+        " VALUES (new.id, new.prime_location_name, new.address, new.pincode);"
+        " END"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS parking_lot_fts_delete AFTER DELETE ON parking_lot BEGIN"
+        " INSERT INTO parking_lot_fts (parking_lot_fts, rowid, prime_location_name, address, pincode)"
+        " VALUES ('delete', old.id, old.prime_location_name, old.address, old.pincode);"
+        " END"
+    ))
+    # Only searchable columns, so free_spots counter updates skip the index
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS parking_lot_fts_update"
+        " AFTER UPDATE OF prime_location_name, address, pincode ON parking_lot BEGIN"
+        " INSERT INTO parking_lot_fts (parking_lot_fts, rowid, prime_location_name, address, pincode)"
+        " VALUES ('delete', old.id, old.prime_location_name, old.address, old.pincode);"
+        " INSERT INTO parking_lot_fts (rowid, prime_location_name, address, pincode)"
+        " VALUES (new.id, new.prime_location_name, new.address, new.pincode);"
+        " END"
+    ))
+    conn.execute(text("INSERT INTO parking_lot_fts (parking_lot_fts) VALUES ('rebuild')"))
+
+
+def _add_lot_location(conn):
+    columns = [c["name"] for c in inspect(conn).get_columns("parking_lot")]
+    for name in ("latitude", "longitude"):
+        if name not in columns:
+            conn.execute(text(f"ALTER TABLE parking_lot ADD COLUMN {name} FLOAT"))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_parking_lot_location ON parking_lot (latitude, longitude)"
+    ))
+    if conn.dialect.name != "sqlite":
+        return
+
+    # R*Tree of lot positions (a point is a zero-size box), kept in sync by triggers
+    conn.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS parking_lot_rtree USING rtree("
+        " id, min_lat, max_lat, min_lng, max_lng)"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS parking_lot_rtree_insert AFTER INSERT ON parking_lot"
+        " WHEN new.latitude IS NOT NULL AND new.longitude IS NOT NULL BEGIN"
+        " INSERT INTO parking_lot_rtree VALUES (new.id, new.latitude, new.latitude, new.longitude, new.longitude);"
+        " END"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS parking_lot_rtree_update"
+        " AFTER UPDATE OF latitude, longitude ON parking_lot BEGIN"
+        " DELETE FROM parking_lot_rtree WHERE id = old.id;"
+        " INSERT INTO parking_lot_rtree SELECT new.id, new.latitude, new.latitude, new.longitude, new.longitude"
+        " WHERE new.latitude IS NOT NULL AND new.longitude IS NOT NULL;"
+        " END"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS parking_lot_rtree_delete AFTER DELETE ON parking_lot BEGIN"
+        " DELETE FROM parking_lot_rtree WHERE id = old.id;"
+        " END"
+    ))
+    conn.execute(text(
+        "INSERT OR REPLACE INTO parking_lot_rtree"
+        " SELECT id, latitude, latitude, longitude, longitude FROM parking_lot"
+        " WHERE latitude IS NOT NULL AND longitude IS NOT NULL"
+    ))
+
+
+def _add_lot_tariffs(conn):
+    columns = [c["name"] for c in inspect(conn).get_columns("parking_lot")]
+    if "tariff_bands" not in columns:
+        conn.execute(text("ALTER TABLE parking_lot ADD COLUMN tariff_bands VARCHAR(200)"))
+    if "daily_cap" not in columns:
+        conn.execute(text("ALTER TABLE parking_lot ADD COLUMN daily_cap FLOAT"))
+
+
+def _add_lot_version(conn):
+    columns = [c["name"] for c in inspect(conn).get_columns("parking_lot")]
+    if "version" not in columns:
+        conn.execute(text("ALTER TABLE parking_lot ADD COLUMN version INTEGER NOT NULL DEFAULT 0"))
+
+
+def _add_vehicle_index(conn):
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_reservation_vehicle_leaving"
+        " ON reservation (vehicle_no, leaving_timestamp)"
+    ))
+
+
+def _add_booking_interval_index(conn):
+    # spot_booking itself comes from create_all(); the R*Tree is SQLite only
+    if conn.dialect.name != "sqlite":
+        return
+
+    # One box per booking: [start, end] in epoch seconds by [lot_id, lot_id], kept in sync by triggers
+    conn.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS spot_booking_rtree USING rtree("
+        " id, min_t, max_t, min_lot, max_lot)"
+    ))
+    box = ("CAST(strftime('%s', new.starts_at) AS INTEGER), CAST(strftime('%s', new.ends_at) AS INTEGER),"
+           " new.lot_id, new.lot_id")
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS spot_booking_rtree_insert AFTER INSERT ON spot_booking BEGIN"
+        f" INSERT INTO spot_booking_rtree VALUES (new.id, {box});"
+        " END"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS spot_booking_rtree_update"
+        " AFTER UPDATE OF starts_at, ends_at, lot_id ON spot_booking BEGIN"
+        " DELETE FROM spot_booking_rtree WHERE id = old.id;"
+        f" INSERT INTO spot_booking_rtree VALUES (new.id, {box});"
+        " END"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER IF NOT EXISTS spot_booking_rtree_delete AFTER DELETE ON spot_booking BEGIN"
+        " DELETE FROM spot_booking_rtree WHERE id = old.id;"
+        " END"
+    ))
+    conn.execute(text(
+        "INSERT OR REPLACE INTO spot_booking_rtree"
+        " SELECT id, CAST(strftime('%s', starts_at) AS INTEGER), CAST(strftime('%s', ends_at) AS INTEGER),"
+        " lot_id, lot_id FROM spot_booking"
+    ))
+
+
+def _monotonic_reservation_ids(conn):
+    # Other databases number rows from a sequence that never goes back
+    if conn.dialect.name != "sqlite":
+        return
+
+    # Rebuild reservation with an AUTOINCREMENT key; nothing references it by foreign key
+    table_sql = conn.execute(text(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'reservation'"
+    )).scalar()
+    if "AUTOINCREMENT" not in table_sql.upper():
+        conn.execute(text(
+            "CREATE TABLE reservation_new ("
+            " id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,"
+            " user_id INTEGER NOT NULL REFERENCES user (id),"
+            " spot_id INTEGER NOT NULL REFERENCES parking_spot (id),"
+            " parking_timestamp DATETIME, leaving_timestamp DATETIME, parking_cost FLOAT,"
+            " vehicle_no VARCHAR NOT NULL)"
+        ))
+        columns = "id, user_id, spot_id, parking_timestamp, leaving_timestamp, parking_cost, vehicle_no"
+        conn.execute(text(f"INSERT INTO reservation_new ({columns}) SELECT {columns} FROM reservation"))
+        conn.execute(text("DROP TABLE reservation"))
+        conn.execute(text("ALTER TABLE reservation_new RENAME TO reservation"))
+        for name, columns in (
+            ("ix_reservation_parked", "parking_timestamp"),
+            ("ix_reservation_user_parked", "user_id, parking_timestamp"),
+            ("ix_reservation_spot_leaving", "spot_id, leaving_timestamp"),
+            ("ix_reservation_vehicle_leaving", "vehicle_no, leaving_timestamp"),
+        ):
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON reservation ({columns})"))
+
+    # Stays that were already given the id of an archived one get a fresh id; a booking
+    # checked in to such a stay is the one for its vehicle whose window covers its start
+    next_id = conn.execute(text(
+        "SELECT MAX(COALESCE((SELECT MAX(id) FROM reservation), 0),"
+        " COALESCE((SELECT MAX(id) FROM reservation_archive), 0))"
+    )).scalar()
+    reused = conn.execute(text(
+        "SELECT id, user_id, vehicle_no, parking_timestamp FROM reservation"
+        " WHERE id IN (SELECT id FROM reservation_archive) ORDER BY id"
+    )).all()
+    for old_id, user_id, vehicle_no, parked_at in reused:
+        next_id += 1
+        conn.execute(text(
+            "UPDATE spot_booking SET reservation_id = :new"
+            " WHERE reservation_id = :old AND user_id = :user AND vehicle_no = :vehicle"
+            " AND datetime(starts_at, '-15 minutes') <= :parked AND ends_at > :parked"
+        ), {"new": next_id, "old": old_id, "user": user_id, "vehicle": vehicle_no, "parked": parked_at})
+        conn.execute(text("UPDATE reservation SET id = :new WHERE id = :old"), {"new": next_id, "old": old_id})
+
+    # Start numbering after every id either table has used
+    conn.execute(text("DELETE FROM sqlite_sequence WHERE name = 'reservation'"))
+    conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('reservation', :seq)"), {"seq": next_id})
+
+
+# (version, description, step) in the order they must be applied
+MIGRATIONS = [
+    (1, "free spot counter on parking_lot", _add_free_spots),
+    (2, "index free spots by lot and status", _add_spot_status_index),
+    (3, "indexes for reservation history, active spot lookup and pincode search", _add_hot_path_indexes),
+    (4, "index reservations by parking time for paginated history", _add_parked_index),
+    (5, "full-text search index over lot name, address and pincode", _add_lot_search_index),
+    (6, "optional lot coordinates with a spatial index", _add_lot_location),
+    (7, "time-of-day rates and daily cap per lot", _add_lot_tariffs),
+    (8, "change counter on parking_lot for cached lot listings", _add_lot_version),
+    (9, "index open reservations by vehicle number for gate check-in/out", _add_vehicle_index),
+    (10, "interval index over advance booking windows", _add_booking_interval_index),
+    (11, "never reuse the ids of archived reservations", _monotonic_reservation_ids),
+]
+
+HEAD = MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    if not inspect(conn).has_table("schema_version"):
+        return 0
+    return conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+
+
+def _stamp(conn, version):
+    conn.execute(text("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"))
+    conn.execute(text("DELETE FROM schema_version"))
+    conn.execute(text("INSERT INTO schema_version (version) VALUES (:v)"), {"v": version})
+
+
+def migrate():
+    """Bring the database up to the latest schema version.
+
+    Missing tables are created from the models, then every pending step runs
+    in its own transaction. Returns the list of versions that were applied.
+    """
+    db.create_all()
+
+    applied = []
+    with db.engine.connect() as conn:
+        version = current_version(conn)
+    for step_version, description, step in MIGRATIONS:
+        if step_version <= version:
+            continue
+        with db.engine.begin() as conn:
+            step(conn)
+            _stamp(conn, step_version)
+        print(f"Applied migration {step_version}: {description}")
+        applied.append(step_version)
+    return applied
@@ -30,12 +30,21 @@ class ParkingLot(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     prime_location_name = db.Column(db.String(150), nullable=False)
     price_per_hour = db.Column(db.Float, nullable=False)
+    tariff_bands = db.Column(db.String(200), nullable=True)  # time-of-day rates, e.g. "8-20:60, 20-23:40"
+    daily_cap = db.Column(db.Float, nullable=True)  # most charged per 24 hours parked
     address = db.Column(db.String(250), nullable=False)
-    pincode = db.Column(db.String(10), nullable=False)
+    pincode = db.Column(db.String(10), nullable=False, index=True)
     max_spots = db.Column(db.Integer, nullable=False)
+    free_spots = db.Column(db.Integer, nullable=False, default=0)  # denormalized count of 'A' spots
+    latitude = db.Column(db.Float, nullable=True)   # optional, for nearest lot search
+    longitude = db.Column(db.Float, nullable=True)
+    version = db.Column(db.Integer, nullable=False, default=0)  # bumped on every change shown in lot listings
 
     spots = db.relationship('ParkingSpot', back_populates='lot', cascade="all, delete")
 
+    # Bounding box lookups where the SQLite R*Tree is not available
+    __table_args__ = (db.Index('ix_parking_lot_location', 'latitude', 'longitude'),)
+
 
 # Parking Spot Model
 
@@ -51,6 +60,9 @@ class ParkingSpot(db.Model):
 
     reservation = db.relationship('Reservation', back_populates='spot', uselist=False)
 
+    # Free spot lookup for booking: WHERE lot_id = ? AND status = 'A'
+    __table_args__ = (db.Index('ix_parking_spot_lot_status', 'lot_id', 'status'),)
+
 
 # Reservation Model
 
@@ -68,3 +80,148 @@ class Reservation(db.Model):
 
     user = db.relationship('User', back_populates='reservations')
     spot = db.relationship('ParkingSpot', back_populates='reservation')
+
+    # Same names as the columns of ArchivedReservation, so history rows of either kind render alike
+    @property
+    def lot_id(self):
+        return self.spot.lot_id
+
+    @property
+    def lot_name(self):
+        return self.spot.lot.prime_location_name
+
+    @property
+    def spot_number(self):
+        return self.spot.spot_number
+
+    __table_args__ = (
+        # Admin history, newest first (keyset pagination)
+        db.Index('ix_reservation_parked', 'parking_timestamp'),
+        # User history, newest first
+        db.Index('ix_reservation_user_parked', 'user_id', 'parking_timestamp'),
+        # Active reservation of a spot: WHERE spot_id = ? AND leaving_timestamp IS NULL
+        db.Index('ix_reservation_spot_leaving', 'spot_id', 'leaving_timestamp'),
+        # Gate check-in/out by plate: WHERE vehicle_no IN (...) AND leaving_timestamp IS NULL
+        db.Index('ix_reservation_vehicle_leaving', 'vehicle_no', 'leaving_timestamp'),
+        # Archived stays keep their ids, so an id must never be handed out twice (SQLite reuses the
+        # highest rowid once it is deleted unless the key is AUTOINCREMENT)
+        {'sqlite_autoincrement': True},
+    )
+
+
+# Archived Reservation (finished stays moved out of reservation by services/archive.py)
+
+class ArchivedReservation(db.Model):
+    __tablename__ = 'reservation_archive'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # id it had in reservation
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    # Lot and spot are copied, not referenced: they may be deleted after archiving
+    lot_id = db.Column(db.Integer, nullable=False)
+    spot_id = db.Column(db.Integer, nullable=False)
+    lot_name = db.Column(db.String(150), nullable=False)
+    spot_number = db.Column(db.String(20), nullable=False)
+
+    parking_timestamp = db.Column(db.DateTime, nullable=False)
+    leaving_timestamp = db.Column(db.DateTime, nullable=False)
+    parking_cost = db.Column(db.Float, nullable=True)
+    vehicle_no = db.Column(db.String, nullable=False)
+
+    user = db.relationship('User')
+
+    __table_args__ = (
+        # Same history orderings as reservation
+        db.Index('ix_reservation_archive_parked', 'parking_timestamp'),
+        db.Index('ix_reservation_archive_user_parked', 'user_id', 'parking_timestamp'),
+        # Export and rollup rebuild by lot
+        db.Index('ix_reservation_archive_lot_parked', 'lot_id', 'parking_timestamp'),
+        # Last owner of a plate at the gate
+        db.Index('ix_reservation_archive_vehicle', 'vehicle_no'),
+    )
+
+
+# Advance Booking (a spot held for a future time window, see services/advance_booking.py)
+
+class SpotBooking(db.Model):
+    __tablename__ = 'spot_booking'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    lot_id = db.Column(db.Integer, db.ForeignKey('parking_lot.id'), nullable=False)
+    spot_id = db.Column(db.Integer, db.ForeignKey('parking_spot.id'), nullable=False)
+    vehicle_no = db.Column(db.String, nullable=False)
+
+    starts_at = db.Column(db.DateTime, nullable=False)
+    ends_at = db.Column(db.DateTime, nullable=False)  # exclusive: [starts_at, ends_at)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    # The stay it turned into at check-in; a plain id, the stay may since have been archived
+    reservation_id = db.Column(db.Integer, nullable=True)
+
+    user = db.relationship('User')
+    lot = db.relationship('ParkingLot')
+    spot = db.relationship('ParkingSpot')
+
+    __table_args__ = (
+        # Overlap checks without the R*Tree, bounded by MAX_WINDOW: starts_at in (start - MAX_WINDOW, end)
+        db.Index('ix_spot_booking_lot_starts', 'lot_id', 'starts_at'),
+        db.Index('ix_spot_booking_spot_starts', 'spot_id', 'starts_at'),
+        # A user's upcoming bookings
+        db.Index('ix_spot_booking_user_starts', 'user_id', 'starts_at'),
+    )
+
+
+# Background Job (queued in the enqueuing transaction, run by services/jobs.py workers)
+
+class Job(db.Model):
+    __tablename__ = 'job'
+
+    id = db.Column(db.Integer, primary_key=True)
+    task = db.Column(db.String(200), nullable=False)  # "module:function", called with the payload as kwargs
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON object
+    idempotency_key = db.Column(db.String(200), nullable=True, unique=True)  # a second enqueue with it is dropped
+    status = db.Column(db.String(10), nullable=False, default='queued')  # queued, running, done, failed
+
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.now)  # not before; pushed back on retry
+    locked_at = db.Column(db.DateTime, nullable=True)  # when a worker took it; stale ones are taken back
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    # Next due job: WHERE status = 'queued' AND run_after <= now ORDER BY run_after
+    __table_args__ = (db.Index('ix_job_status_run_after', 'status', 'run_after'),)
+
+
+# Usage Rollups (maintained by services/analytics.py)
+
+class LotUsageHour(db.Model):
+    __tablename__ = 'lot_usage_hour'
+
+    id = db.Column(db.Integer, primary_key=True)
+    lot_id = db.Column(db.Integer, db.ForeignKey('parking_lot.id'), nullable=False)
+    hour = db.Column(db.DateTime, nullable=False)  # start of the hour
+
+    bookings = db.Column(db.Integer, nullable=False, default=0)  # stays that started this hour
+    releases = db.Column(db.Integer, nullable=False, default=0)  # stays that ended this hour
+    occupied_hours = db.Column(db.Float, nullable=False, default=0)  # spot-hours occupied within the hour
+    stay_hours = db.Column(db.Float, nullable=False, default=0)  # full length of stays that ended this hour
+    revenue = db.Column(db.Float, nullable=False, default=0)  # parking_cost of stays that ended this hour
+
+    __table_args__ = (db.UniqueConstraint('lot_id', 'hour', name='uq_lot_usage_hour'),)
+
+
+class LotUsageDay(db.Model):
+    __tablename__ = 'lot_usage_day'
+
+    id = db.Column(db.Integer, primary_key=True)
+    lot_id = db.Column(db.Integer, db.ForeignKey('parking_lot.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+
+    bookings = db.Column(db.Integer, nullable=False, default=0)
+    releases = db.Column(db.Integer, nullable=False, default=0)
+    occupied_hours = db.Column(db.Float, nullable=False, default=0)
+    stay_hours = db.Column(db.Float, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+
+    __table_args__ = (db.UniqueConstraint('lot_id', 'day', name='uq_lot_usage_day'),)
@@ -0,0 +1,228 @@
+import math
+import random
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert, update, delete, func, literal
+from sqlalchemy.exc import OperationalError
+from models.models import db, ParkingSpot, Reservation, SpotBooking
+from models.loading import BOOKING_WITH_SPOT
+from services.availability import adjust_free_spots
+from services.booking import (BookingContention, CANDIDATES, RETRIES, BACKOFF, WALK_IN_HOLD,
+                              walk_in_candidates, _claim)
+from services.intervals import MAX_WINDOW, held_spots, spot_conflicts
+
+
+# Advance bookings: a spot held for a future time window.
+#
+# Allocation picks a few spots of the lot that no booking holds during the
+# window (held ones come from the interval index in services/intervals.py)
+# and inserts the booking with INSERT ... SELECT ... WHERE NOT EXISTS (an
+# overlapping booking of that spot). Like claiming a spot for a walk-in, the
+# check and the write are one statement, so two requests racing for a spot
+# can never both hold it; the loser moves on to another candidate. Windows
+# are whole minutes, at most MAX_WINDOW long and start within HORIZON.
+#
+# Walk-ins have no end time. They stay off spots booked within WALK_IN_HOLD
+# (services/booking.py), and windows starting within WALK_IN_HOLD skip spots
+# that are occupied now. A car that overstays anyway is handled at check-in:
+# the booking gets another free spot of the lot.
+
+HORIZON = timedelta(days=30)
+EARLY_CHECK_IN = timedelta(minutes=15)
+BOOKING_COLUMNS = ("user_id", "lot_id", "spot_id", "vehicle_no", "starts_at", "ends_at", "created_at")
+
+
+class BookingWindowError(ValueError):
+    """Raised for a window that cannot be booked or checked in; the message is fit to show."""
+
+
+def _moment(value, name):
+    if isinstance(value, datetime):
+        moment = value
+    else:
+        try:
+            moment = datetime.fromisoformat(str(value))
+        except ValueError:
+            raise BookingWindowError(f"{name} must be an ISO 8601 timestamp")
+    if moment.tzinfo is not None:
+        moment = moment.astimezone().replace(tzinfo=None)  # bookings store local time
+    return moment
+
+
+def parse_window(start, end, now=None):
+    """Validate a requested window; returns (start, end) widened to whole minutes."""
+    now = now or datetime.now()
+    start = _moment(start, "start").replace(second=0, microsecond=0)
+    end = _moment(end, "end")
+    if end.second or end.microsecond:
+        end = end.replace(second=0, microsecond=0) + timedelta(minutes=1)
+
+    if end <= start:
+        raise BookingWindowError("The window must end after it starts.")
+    if end <= now:
+        raise BookingWindowError("The window is in the past.")
+    if start < now.replace(second=0, microsecond=0):
+        raise BookingWindowError("The window must not start in the past.")
+    if end - start > MAX_WINDOW:
+        raise BookingWindowError(f"A booking can last at most {MAX_WINDOW.total_seconds() / 3600:g} hours.")
+    if start > now + HORIZON:
+        raise BookingWindowError(f"Bookings open {HORIZON.days} days ahead.")
+    return start, end
+
+
+def _free(lot_id, start, end, now, spot_id=None):
+    """Conditions for a spot of ``lot_id`` (or just ``spot_id``) that can be booked for [start, end)."""
+    if spot_id is None:
+        conditions = [ParkingSpot.lot_id == lot_id, ParkingSpot.id.not_in(held_spots(lot_id, start, end))]
+    else:
+        conditions = [ParkingSpot.id == spot_id, ParkingSpot.lot_id == lot_id,
+                      ~spot_conflicts(spot_id, start, end).exists()]
+    if start < now + WALK_IN_HOLD:
+        conditions.append(ParkingSpot.status == 'A')
+    return conditions
+
+
+def free_spots(lot_id, start, end, limit=CANDIDATES, now=None):
+    """Ids of up to ``limit`` spots of a lot that could be booked for [start, end)."""
+    now = now or datetime.now()
+    return db.session.scalars(select(ParkingSpot.id).where(*_free(lot_id, start, end, now)).limit(limit)).all()
+
+
+def free_spot_count(lot_id, start, end, now=None):
+    """How many spots of a lot could still be booked for [start, end)."""
+    now = now or datetime.now()
+    return db.session.scalar(select(func.count(ParkingSpot.id)).where(*_free(lot_id, start, end, now)))
+
+
+def conflicting_bookings(spot_id, start, end):
+    """Bookings of a spot that overlap [start, end), earliest first."""
+    return (
+        SpotBooking.query
+        .filter(SpotBooking.id.in_(spot_conflicts(spot_id, start, end)))
+        .order_by(SpotBooking.starts_at)
+        .all()
+    )
+
+
+def _hold(spot_id, lot_id, user_id, vehicle_no, start, end, now):
+    """Insert a booking of ``spot_id`` unless something holds it; returns the new id or None."""
+    row = select(
+        literal(user_id), literal(lot_id), ParkingSpot.id, literal(vehicle_no),
+        literal(start), literal(end), literal(now),
+    ).where(*_free(lot_id, start, end, now, spot_id))
+    return db.session.execute(
+        insert(SpotBooking).from_select(BOOKING_COLUMNS, row).returning(SpotBooking.id)
+    ).scalar()
+
+
+def book_window(lot_id, user_id, vehicle_no, start, end, spot_id=None, now=None, retries=RETRIES):
+    """Hold a spot of a lot for [start, end) (a parse_window() result) and commit.
+
+    Books ``spot_id`` when given, otherwise any spot free for the whole window.
+    Returns the new SpotBooking, or None when no such spot is left. Raises
+    BookingWindowError when the same vehicle is already booked for an
+    overlapping window.
+    """
+    now = now or datetime.now()
+    same_vehicle = db.session.scalar(
+        select(SpotBooking.id).where(
+            SpotBooking.user_id == user_id, SpotBooking.vehicle_no == vehicle_no,
+            SpotBooking.starts_at > start - MAX_WINDOW, SpotBooking.starts_at < end, SpotBooking.ends_at > start,
+        ).limit(1)
+    )
+    if same_vehicle:
+        raise BookingWindowError("This vehicle is already booked for an overlapping window.")
+
+    delay = BACKOFF
+    for _ in range(retries + 1):
+        try:
+            candidates = [spot_id] if spot_id is not None else free_spots(lot_id, start, end, now=now)
+            if not candidates:
+                db.session.rollback()
+                return None
+
+            random.shuffle(candidates)
+            for candidate in candidates:
+                booking_id = _hold(candidate, lot_id, user_id, vehicle_no, start, end, now)
+                if booking_id:
+                    db.session.commit()
+                    return db.session.get(SpotBooking, booking_id)
+
+            # Booked by someone else in the meantime
+            db.session.rollback()
+            if spot_id is not None:
+                return None
+        except OperationalError:
+            db.session.rollback()
+
+        time.sleep(delay * random.random())
+        delay *= 2
+
+    raise BookingContention(f"Could not book a spot in lot {lot_id}")
+
+
+def upcoming_bookings(user_id, now=None):
+    """The user's bookings that have not ended, soonest first."""
+    now = now or datetime.now()
+    return (
+        SpotBooking.query.options(*BOOKING_WITH_SPOT)
+        .filter(SpotBooking.user_id == user_id, SpotBooking.starts_at > now - MAX_WINDOW,
+                SpotBooking.ends_at > now)
+        .order_by(SpotBooking.starts_at, SpotBooking.id)
+        .all()
+    )
+
+
+def cancel_booking(booking):
+    """Delete a booking that has not been checked in and commit; False if it already was."""
+    deleted = db.session.execute(
+        delete(SpotBooking)
+        .where(SpotBooking.id == booking.id, SpotBooking.reservation_id.is_(None))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not deleted:
+        db.session.rollback()
+        return False
+    db.session.commit()
+    return True
+
+
+def check_in(booking, now=None):
+    """Open the stay of a booking and commit; returns the Reservation.
+
+    The stay goes on the booked spot, or on another free one when the booked
+    spot is still occupied. Returns None when the lot has no free spot at all.
+    """
+    now = now or datetime.now()
+    if booking.reservation_id:
+        raise BookingWindowError("This booking is already checked in.")
+    if now < booking.starts_at - EARLY_CHECK_IN:
+        minutes = math.ceil((booking.starts_at - EARLY_CHECK_IN - now).total_seconds() / 60)
+        raise BookingWindowError(f"Check-in opens {minutes} minutes from now.")
+    if now >= booking.ends_at:
+        raise BookingWindowError("This booking has expired.")
+
+    spot_id = booking.spot_id if _claim(booking.spot_id) else None
+    if spot_id is None:
+        spot_id = next((c for c in walk_in_candidates(booking.lot_id, now) if _claim(c)), None)
+    if spot_id is None:
+        db.session.rollback()
+        return None
+
+    reservation = Reservation(user_id=booking.user_id, spot_id=spot_id, vehicle_no=booking.vehicle_no,
+                              parking_timestamp=now)
+    db.session.add(reservation)
+    db.session.flush()
+    # Two check-ins of one booking: only the first one links its stay
+    linked = db.session.execute(
+        update(SpotBooking)
+        .where(SpotBooking.id == booking.id, SpotBooking.reservation_id.is_(None))
+        .values(reservation_id=reservation.id)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not linked:
+        db.session.rollback()
+        raise BookingWindowError("This booking is already checked in.")
+    adjust_free_spots(booking.lot_id, -1)
+    db.session.commit()
+    return reservation
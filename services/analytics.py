@@ -0,0 +1,184 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, func, delete, union_all
+from models.models import (db, ParkingLot, ParkingSpot, Reservation, ArchivedReservation, LotUsageHour,
+                           LotUsageDay, Job)
+
+
+# Occupancy analytics.
+#
+# Finished stays are folded into per-lot hourly and daily rollups when they
+# are released (a web release queues STAY_JOB in its transaction, see
+# services/jobs.py; gate check-outs roll up inline, in bulk), so reports
+# read a handful of pre-aggregated rows instead of scanning reservation. A
+# stay counts as a booking in the hour it started, and its cost, length and
+# release in the hour it ended; its occupied time is spread over every hour it
+# covered. backfill() rebuilds the rollups from existing history.
+
+METRICS = ("bookings", "releases", "occupied_hours", "stay_hours", "revenue")
+BACKFILL_CHUNK = 5000
+STAY_JOB = "services.analytics:record_stay_job"
+
+
+def stay_buckets(start, end, cost):
+    """Split one stay into {hour_start: {metric: value}} contributions."""
+    buckets = defaultdict(lambda: dict.fromkeys(METRICS, 0))
+    hour = start.replace(minute=0, second=0, microsecond=0)
+    buckets[hour]["bookings"] += 1
+
+    while hour < end:
+        following = hour + timedelta(hours=1)
+        overlap = (min(end, following) - max(start, hour)).total_seconds() / 3600
+        if overlap > 0:
+            buckets[hour]["occupied_hours"] += overlap
+        hour = following
+
+    last = end.replace(minute=0, second=0, microsecond=0)
+    buckets[last]["releases"] += 1
+    buckets[last]["stay_hours"] += max((end - start).total_seconds() / 3600, 0)
+    buckets[last]["revenue"] += cost or 0
+    return buckets
+
+
+def record_stay(lot_id, start, end, cost):
+    """Add a finished stay to the rollups in the current transaction."""
+    _apply(_rows(lot_id, stay_buckets(start, end, cost)))
+
+
+def record_stay_job(lot_id, start, end, cost):
+    """STAY_JOB: record_stay() with the times as ISO strings."""
+    record_stay(lot_id, datetime.fromisoformat(start), datetime.fromisoformat(end), cost)
+
+
+def record_stays(stays):
+    """Add many finished stays, given as (lot_id, start, end, cost), with one upsert per table."""
+    by_lot = defaultdict(lambda: defaultdict(lambda: dict.fromkeys(METRICS, 0)))
+    for lot_id, start, end, cost in stays:
+        for hour, values in stay_buckets(start, end, cost).items():
+            bucket = by_lot[lot_id][hour]
+            for metric, value in values.items():
+                bucket[metric] += value
+
+    hourly, daily = [], []
+    for lot_id, buckets in by_lot.items():
+        lot_hourly, lot_daily = _rows(lot_id, buckets)
+        hourly += lot_hourly
+        daily += lot_daily
+    _apply((hourly, daily))
+
+
+def backfill():
+    """Rebuild every rollup from closed reservations, archived ones included; returns the number of stays read.
+
+    Runs as one serializable transaction, so the stays read and the rollup
+    jobs it takes over are the same set: stays released meanwhile keep their
+    queued jobs and are counted by those instead.
+    """
+    if db.engine.dialect.name != "sqlite":
+        # SQLite write transactions are serializable already
+        db.session.connection(execution_options={"isolation_level": "SERIALIZABLE"})
+    # Rollup jobs already queued or running are for stays the read below counts. Marking them done
+    # first also stops a worker that is running one: it only keeps its work while the job is running.
+    db.session.execute(
+        update(Job)
+        .where(Job.task == STAY_JOB, Job.status.in_(("queued", "running")))
+        .values(status="done", finished_at=datetime.now(), locked_at=None)
+        .execution_options(synchronize_session=False)
+    )
+
+    hot = (
+        select(ParkingSpot.lot_id, Reservation.parking_timestamp,
+               Reservation.leaving_timestamp, Reservation.parking_cost)
+        .join(ParkingSpot, Reservation.spot_id == ParkingSpot.id)
+        .where(Reservation.leaving_timestamp.is_not(None))
+    )
+    # Archived stays of lots deleted since have no rollups to go to
+    cold = (
+        select(ArchivedReservation.lot_id, ArchivedReservation.parking_timestamp,
+               ArchivedReservation.leaving_timestamp, ArchivedReservation.parking_cost)
+        .join(ParkingLot, ArchivedReservation.lot_id == ParkingLot.id)
+    )
+    stmt = union_all(hot, cold).execution_options(yield_per=BACKFILL_CHUNK)
+    totals = defaultdict(lambda: dict.fromkeys(METRICS, 0))
+    stays = 0
+    for lot_id, start, end, cost in db.session.execute(stmt):
+        for hour, values in stay_buckets(start, end, cost).items():
+            bucket = totals[(lot_id, hour)]
+            for metric, value in values.items():
+                bucket[metric] += value
+        stays += 1
+
+    db.session.execute(delete(LotUsageHour))
+    db.session.execute(delete(LotUsageDay))
+    by_lot = defaultdict(dict)
+    for (lot_id, hour), values in totals.items():
+        by_lot[lot_id][hour] = values
+    for lot_id, buckets in by_lot.items():
+        _apply(_rows(lot_id, buckets))
+    db.session.commit()
+    return stays
+
+
+def usage(lot_id=None, start=None, end=None, granularity="day"):
+    """Read rollups for a lot (or all lots summed) between [start, end).
+
+    Returns a list of dicts ordered by period, with average stay and
+    utilisation (occupied spot-hours over available spot-hours) derived.
+    """
+    model, period = (LotUsageHour, LotUsageHour.hour) if granularity == "hour" else (LotUsageDay, LotUsageDay.day)
+    if granularity != "hour":
+        start, end = start and start.date(), end and end.date()
+
+    stmt = select(period, *[func.sum(getattr(model, m)) for m in METRICS]).group_by(period).order_by(period)
+    if lot_id is not None:
+        stmt = stmt.where(model.lot_id == lot_id)
+        capacity = db.session.scalar(select(ParkingLot.max_spots).where(ParkingLot.id == lot_id)) or 0
+    else:
+        capacity = db.session.scalar(select(func.sum(ParkingLot.max_spots))) or 0
+    if start is not None:
+        stmt = stmt.where(period >= start)
+    if end is not None:
+        stmt = stmt.where(period < end)
+
+    span = 1 if granularity == "hour" else 24
+    result = []
+    for row in db.session.execute(stmt):
+        values = dict(zip(METRICS, row[1:]))
+        values["period"] = row[0].isoformat()
+        values["avg_stay_hours"] = round(values["stay_hours"] / values["releases"], 2) if values["releases"] else 0
+        values["utilisation"] = round(values["occupied_hours"] / (capacity * span), 4) if capacity else 0
+        for metric in ("occupied_hours", "stay_hours", "revenue"):
+            values[metric] = round(values[metric], 2)
+        result.append(values)
+    return result
+
+
+def _rows(lot_id, buckets):
+    hourly, daily = [], defaultdict(lambda: dict.fromkeys(METRICS, 0))
+    for hour, values in buckets.items():
+        hourly.append({"lot_id": lot_id, "hour": hour, **values})
+        day = daily[hour.date()]
+        for metric, value in values.items():
+            day[metric] += value
+    return hourly, [{"lot_id": lot_id, "day": day, **values} for day, values in daily.items()]
+
+
+def _apply(rows):
+    hourly, daily = rows
+    for model, key, batch in ((LotUsageHour, "hour", hourly), (LotUsageDay, "day", daily)):
+        if batch:
+            db.session.execute(_upsert(model, key), batch)
+
+
+def _upsert(model, key):
+    # INSERT ... ON CONFLICT (lot_id, key) DO UPDATE SET metric = metric + excluded.metric
+    if db.engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    table = model.__table__
+    stmt = insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.lot_id, table.c[key]],
+        set_={m: table.c[m] + stmt.excluded[m] for m in METRICS},
+    )
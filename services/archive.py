@@ -0,0 +1,124 @@
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert, delete
+from models.models import db, ParkingLot, ParkingSpot, Reservation, ArchivedReservation
+from models.loading import RESERVATION_WITH_SPOT, RESERVATION_WITH_USER_AND_SPOT, ARCHIVED_WITH_USER
+from services.pagination import merged_keyset_paginate, PER_PAGE
+
+
+# Hot/cold reservation history.
+#
+# reservation holds open stays and recent history; finished stays older than
+# ARCHIVE_AFTER_DAYS are moved to reservation_archive, which keeps their ids
+# and a copy of the lot name and spot number, so archived rows survive the lot
+# being deleted. Moving happens in batches of ARCHIVE_BATCH rows walked by id,
+# each batch its own short transaction, so bookings and releases only ever
+# wait for one batch. History pages read both tables through the same keyset
+# cursors (parking_timestamp, id) and never notice where a row lives.
+
+ARCHIVE_BATCH = 1000
+DASHBOARD_HISTORY = 10  # finished stays shown on the user dashboard
+
+ARCHIVE_COLUMNS = ("id", "user_id", "lot_id", "spot_id", "lot_name", "spot_number",
+                   "parking_timestamp", "leaving_timestamp", "parking_cost", "vehicle_no")
+
+
+def _move(ids):
+    """Copy the given finished reservations to the archive and delete them; no commit."""
+    rows = (
+        select(
+            Reservation.id, Reservation.user_id, ParkingSpot.lot_id, Reservation.spot_id,
+            ParkingLot.prime_location_name, ParkingSpot.spot_number, Reservation.parking_timestamp,
+            Reservation.leaving_timestamp, Reservation.parking_cost, Reservation.vehicle_no,
+        )
+        .join(ParkingSpot, Reservation.spot_id == ParkingSpot.id)
+        .join(ParkingLot, ParkingSpot.lot_id == ParkingLot.id)
+        .where(Reservation.id.in_(ids))
+    )
+    db.session.execute(insert(ArchivedReservation).from_select(ARCHIVE_COLUMNS, rows))
+    db.session.execute(
+        delete(Reservation).where(Reservation.id.in_(ids)).execution_options(synchronize_session=False)
+    )
+
+
+def _finished(after_id, limit, closed_before=None, lot_id=None):
+    stmt = (
+        select(Reservation.id)
+        .where(Reservation.id > after_id, Reservation.leaving_timestamp.is_not(None))
+        .order_by(Reservation.id)
+        .limit(limit)
+    )
+    if closed_before is not None:
+        stmt = stmt.where(Reservation.leaving_timestamp < closed_before)
+    if lot_id is not None:
+        stmt = stmt.join(ParkingSpot, Reservation.spot_id == ParkingSpot.id).where(ParkingSpot.lot_id == lot_id)
+    return db.session.scalars(stmt).all()
+
+
+def archive_reservations(days, batch_size=ARCHIVE_BATCH, pause=0.0):
+    """Move stays that ended more than ``days`` days ago to the archive.
+
+    Commits after every batch and sleeps ``pause`` seconds in between, so
+    it can run next to live traffic. Returns the number of rows moved.
+    """
+    closed_before = datetime.now() - timedelta(days=days)
+    moved = last_id = 0
+    while True:
+        ids = _finished(last_id, batch_size, closed_before=closed_before)
+        if not ids:
+            return moved
+        _move(ids)
+        db.session.commit()
+        moved += len(ids)
+        last_id = ids[-1]
+        if pause:
+            time.sleep(pause)
+
+
+def archive_lot_history(lot_id):
+    """Move every finished stay of a lot to the archive, in the caller's transaction."""
+    moved = last_id = 0
+    while True:
+        ids = _finished(last_id, ARCHIVE_BATCH, lot_id=lot_id)
+        if not ids:
+            return moved
+        _move(ids)
+        moved += len(ids)
+        last_id = ids[-1]
+
+
+def history_sources(user_id=None, with_user=False):
+    """(query, keys) pairs for reservation history, hot table first."""
+    hot = Reservation.query.options(*(RESERVATION_WITH_USER_AND_SPOT if with_user else RESERVATION_WITH_SPOT))
+    cold = ArchivedReservation.query
+    if with_user:
+        cold = cold.options(*ARCHIVED_WITH_USER)
+    if user_id is not None:
+        hot = hot.filter(Reservation.user_id == user_id)
+        cold = cold.filter(ArchivedReservation.user_id == user_id)
+    return [
+        (hot, [Reservation.parking_timestamp, Reservation.id]),
+        (cold, [ArchivedReservation.parking_timestamp, ArchivedReservation.id]),
+    ]
+
+
+def reservation_history(user_id=None, with_user=False, after=None, before=None, per_page=PER_PAGE):
+    """One KeysetPage of reservations from both tables, newest first."""
+    return merged_keyset_paginate(history_sources(user_id, with_user), after=after, before=before,
+                                  per_page=per_page)
+
+
+def dashboard_reservations(user_id):
+    """The user's open reservations, then their latest finished stays."""
+    parked = (
+        Reservation.query.options(*RESERVATION_WITH_SPOT)
+        .filter(Reservation.user_id == user_id, Reservation.leaving_timestamp.is_(None))
+        .order_by(Reservation.parking_timestamp.desc())
+        .all()
+    )
+    hot, cold = history_sources(user_id)
+    finished = merged_keyset_paginate(
+        [(hot[0].filter(Reservation.leaving_timestamp.is_not(None)), hot[1]), cold],
+        per_page=DASHBOARD_HISTORY,
+    )
+    return parked + finished.items
@@ -0,0 +1,185 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import wraps, lru_cache
+from flask import current_app, g, session, flash, redirect
+from werkzeug.security import generate_password_hash, check_password_hash
+from models.models import db, User
+from services.ratelimit import login_limiters
+
+
+# Logged-in user lookup and access checks.
+#
+# Pages only need a few profile fields of the current user, so they get a
+# read-only CachedUser snapshot instead of a User row. Snapshots are kept per
+# request on flask.g and per process in a small LRU (USER_CACHE_SIZE entries,
+# each trusted for USER_CACHE_TTL seconds so edits made through another
+# worker show up eventually). Code that changes a user calls invalidate_user().
+#
+# Passwords are hashed with PASSWORD_HASH_METHOD; a user whose stored hash was
+# made with other parameters gets a fresh one the next time they log in. An
+# unknown email is checked against a dummy hash, so both failures take as long.
+# Login attempts are rate limited per client address and per email (see
+# services/ratelimit.py) before any hashing is done.
+
+
+class LoginThrottled(Exception):
+    def __init__(self, retry_after):
+        super().__init__("Too many login attempts")
+        self.retry_after = math.ceil(retry_after)  # whole seconds, for messages and Retry-After
+
+
+@dataclass(frozen=True)
+class CachedUser:
+    id: int
+    name: str
+    email: str
+    role: str
+    address: str
+    pincode: str
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(user.id, user.name, user.email, user.role, user.address, user.pincode)
+
+
+class UserCache:
+    def __init__(self, size=1024, ttl=300):
+        self.size = size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            user, stored_at = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return user
+
+    def put(self, user):
+        with self._lock:
+            self._entries[user.id] = (user, time.monotonic())
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def pop(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def _cache():
+    cache = current_app.extensions.get("user_cache")
+    if cache is None:
+        cache = current_app.extensions["user_cache"] = UserCache(
+            current_app.config.get("USER_CACHE_SIZE", 1024),
+            current_app.config.get("USER_CACHE_TTL", 300),
+        )
+    return cache
+
+
+def remember_user(user):
+    """Cache a freshly loaded User row (e.g. at login) and return its snapshot."""
+    snapshot = CachedUser.from_user(user)
+    _cache().put(snapshot)
+    g.current_user = snapshot
+    return snapshot
+
+
+def log_in(user):
+    """Start a session for ``user`` after their password was checked."""
+    session["user_id"] = user.id
+    session["user_role"] = user.role
+    return remember_user(user)
+
+
+def current_user():
+    """The logged-in user as a CachedUser, or None if nobody (or a deleted user) is logged in."""
+    if "current_user" in g:
+        return g.current_user
+    user_id = session.get("user_id")
+    if user_id is None:
+        return None
+
+    snapshot = _cache().get(user_id)
+    if snapshot is None:
+        user = db.session.get(User, user_id)
+        snapshot = remember_user(user) if user else None
+    g.current_user = snapshot
+    return snapshot
+
+
+def invalidate_user(user_id):
+    """Drop a user's cached snapshot after their row changed."""
+    _cache().pop(user_id)
+    g.pop("current_user", None)
+
+
+def _method():
+    return current_app.config.get("PASSWORD_HASH_METHOD", "scrypt")
+
+
+@lru_cache
+def _hash_prefix(method):
+    # "scrypt" -> "scrypt:32768:8:1": the full parameters a new hash records
+    return generate_password_hash("", method=method).split("$", 1)[0]
+
+
+@lru_cache
+def _dummy_hash(method):
+    return generate_password_hash("no user has this password", method=method)
+
+
+def hash_password(password):
+    return generate_password_hash(password, method=_method())
+
+
+def authenticate(email, password, address=None):
+    """The User with this email and password, or None.
+
+    Raises LoginThrottled, without checking anything, while ``address`` or
+    ``email`` is over its attempt rate. Only failed attempts count against
+    the email; every attempt counts against the address.
+    """
+    email = email.strip()
+    by_address, by_email = login_limiters()
+    if current_app.config.get("LOGIN_RATE_LIMIT", True):
+        wait = by_address.take(address) or by_email.retry_after(email.lower())
+        if wait:
+            raise LoginThrottled(wait)
+
+    method = _method()
+    user = User.query.filter_by(email=email).first()
+    if not check_password_hash(user.password if user else _dummy_hash(method), password) or user is None:
+        by_email.take(email.lower())
+        return None
+
+    if user.password.split("$", 1)[0] != _hash_prefix(method):
+        user.password = hash_password(password)
+        db.session.commit()
+    return user
+
+
+def login_required(role=None):
+    """Redirect to /login unless someone (with ``role``, if given) is logged in."""
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            if "user_id" not in session or (role and session.get("user_role") != role):
+                flash("Admin login required." if role == "admin" else "Login required", "warning")
+                return redirect("/login")
+            return view(*args, **kwargs)
+        return wrapped
+    return decorator
@@ -0,0 +1,80 @@
+from flask import current_app
+from sqlalchemy import func, case
+from models.models import db, ParkingLot, ParkingSpot
+from services.live import record_change
+
+
+# Spot availability per lot.
+#
+# Dashboards and search need "free / occupied" for every lot they list. Instead
+# of one COUNT(*) per lot, counts come either from a single grouped query over
+# parking_spot or, when AVAILABILITY_FROM_COUNTER is on, straight from the
+# denormalized ParkingLot.free_spots counter that the controllers keep in sync.
+
+
+def count_spots(lot_ids=None):
+    """Return {lot_id: (free, occupied)} for the given lots in one grouped query.
+
+    With ``lot_ids=None`` every lot that has spots is counted.
+    """
+    if lot_ids is not None:
+        lot_ids = list(lot_ids)
+        if not lot_ids:
+            return {}
+
+    query = db.session.query(
+        ParkingSpot.lot_id,
+        func.sum(case((ParkingSpot.status == 'A', 1), else_=0)),
+        func.count(ParkingSpot.id),
+    ).group_by(ParkingSpot.lot_id)
+    if lot_ids is not None:
+        query = query.filter(ParkingSpot.lot_id.in_(lot_ids))
+
+    counts = {lot_id: (0, 0) for lot_id in lot_ids or []}
+    for lot_id, free, total in query:
+        free = int(free or 0)
+        counts[lot_id] = (free, total - free)
+    return counts
+
+
+def available_spots_for(lots):
+    """Return {lot_id: free spot count} for already loaded ParkingLot rows.
+
+    Reads the per-lot counter when enabled, so no extra query is issued;
+    otherwise falls back to one grouped query for all the lots.
+    """
+    if current_app.config.get("AVAILABILITY_FROM_COUNTER", True):
+        return {lot.id: lot.free_spots for lot in lots}
+    counts = count_spots(lot.id for lot in lots)
+    return {lot_id: free for lot_id, (free, _) in counts.items()}
+
+
+def adjust_free_spots(lot_id, delta):
+    """Shift the free spot counter of a lot by ``delta`` inside the current transaction.
+
+    Also bumps the lot's version, which keys its cached page fragments. The
+    new count is read back with RETURNING and published to live availability
+    subscribers once the transaction commits.
+    """
+    if not delta:
+        return
+    free = db.session.execute(
+        db.update(ParkingLot)
+        .where(ParkingLot.id == lot_id)
+        .values(free_spots=ParkingLot.free_spots + delta, version=ParkingLot.version + 1)
+        .returning(ParkingLot.free_spots)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+    if free is not None:
+        record_change(db.session(), lot_id, delta, free)
+
+
+def rebuild_counters():
+    """Recompute every lot's free spot counter from parking_spot in one UPDATE."""
+    free = (
+        db.select(func.count(ParkingSpot.id))
+        .where(ParkingSpot.lot_id == ParkingLot.id, ParkingSpot.status == 'A')
+        .scalar_subquery()
+    )
+    db.session.execute(db.update(ParkingLot).values(free_spots=free))
+    db.session.commit()
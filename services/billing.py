@@ -0,0 +1,134 @@
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+from sqlalchemy import select
+from models.models import db, ParkingLot, ParkingSpot, Reservation
+
+
+# Parking charges.
+#
+# A lot's tariff is its price_per_hour, optionally overridden for some hours of
+# the day by tariff_bands ("8-20:60, 20-23:40" = 60/hr from 08:00 to 20:00 and
+# 40/hr from 20:00 to 23:00) and limited by daily_cap per 24 hours parked.
+# Stays are billed for at least MIN_BILLED_HOURS.
+#
+# Each distinct (price, bands, cap) is parsed once into a Tariff holding hourly
+# rates and their running totals, so pricing a stay is a few lookups whatever
+# its length. estimate_open_costs() prices every open reservation of a lot (or
+# of all lots) from a single column-only query.
+
+MIN_BILLED_HOURS = 0.5
+
+BAND = re.compile(r"^\s*(\d{1,2})\s*-\s*(\d{1,2})\s*:\s*(\d+(?:\.\d+)?)\s*$")
+
+
+@dataclass(frozen=True)
+class Tariff:
+    hourly: tuple          # rate for each hour of the day, 24 entries
+    cumulative: tuple      # cumulative[h] = cost of 00:00 -> h:00, 25 entries
+    daily_cap: float = None
+    flat: bool = False     # same rate all day
+
+    def cost(self, start, end):
+        """Charge for parking from ``start`` to ``end``, rounded to paise."""
+        hours = max((end - start).total_seconds() / 3600, MIN_BILLED_HOURS)
+        if self.flat and self.daily_cap is None:
+            return round(self.hourly[0] * hours, 2)
+
+        full_days, rest = divmod(hours, 24)
+        offset = start.hour + start.minute / 60 + start.second / 3600 + start.microsecond / 3.6e9
+
+        day = self._window(offset, 24) if full_days else 0
+        total = full_days * day + self._window(offset, rest)
+        return round(total, 2)
+
+    def _window(self, offset, hours):
+        # Cost of ``hours`` (at most 24) starting ``offset`` hours into the day
+        if self.flat:
+            cost = self.hourly[0] * hours
+        else:
+            cost = self._until(offset + hours) - self._until(offset)
+        return min(cost, self.daily_cap) if self.daily_cap is not None else cost
+
+    def _until(self, t):
+        # Cost from midnight to t hours, where t may run into the next day
+        days, t = divmod(t, 24)
+        hour = min(int(t), 23)
+        return days * self.cumulative[24] + self.cumulative[hour] + self.hourly[hour] * (t - hour)
+
+
+def parse_bands(text):
+    """Validate a tariff band string and return it normalised ("" if empty).
+
+    Raises ValueError for malformed or overlapping bands.
+    """
+    bands = []
+    for part in filter(str.strip, (text or "").split(",")):
+        match = BAND.match(part)
+        if not match:
+            raise ValueError(f"Invalid tariff band '{part.strip()}'")
+        start, end, rate = int(match[1]), int(match[2]), float(match[3])
+        if not 0 <= start < end <= 24:
+            raise ValueError(f"Invalid hours in tariff band '{part.strip()}'")
+        bands.append((start, end, rate))
+
+    bands.sort()
+    for (_, end, _), (start, _, _) in zip(bands, bands[1:]):
+        if start < end:
+            raise ValueError("Tariff bands overlap")
+    return ", ".join(f"{s}-{e}:{r:g}" for s, e, r in bands)
+
+
+@lru_cache(maxsize=1024)
+def tariff(price_per_hour, bands=None, daily_cap=None):
+    """Return the (cached) Tariff for a lot's pricing settings."""
+    hourly = [float(price_per_hour)] * 24
+    for part in filter(None, (bands or "").split(",")):
+        start, end, rate = BAND.match(part).groups()
+        for hour in range(int(start), int(end)):
+            hourly[hour] = float(rate)
+
+    cumulative = [0.0]
+    for rate in hourly:
+        cumulative.append(cumulative[-1] + rate)
+    return Tariff(tuple(hourly), tuple(cumulative), daily_cap, flat=len(set(hourly)) == 1)
+
+
+def lot_tariff(lot):
+    return tariff(lot.price_per_hour, lot.tariff_bands or None, lot.daily_cap)
+
+
+def quote(lot, start, end=None):
+    """Cost of parking in ``lot`` from ``start`` until ``end`` (default now)."""
+    return lot_tariff(lot).cost(start, end or datetime.now())
+
+
+def estimate_open_costs(lot_id=None, reservation_ids=None, now=None):
+    """Return {reservation_id: cost so far} for open reservations.
+
+    Restricted to one lot and/or the given reservation ids when passed. One
+    query fetches just the columns pricing needs.
+    """
+    now = now or datetime.now()
+    stmt = (
+        select(
+            Reservation.id, Reservation.parking_timestamp,
+            ParkingLot.price_per_hour, ParkingLot.tariff_bands, ParkingLot.daily_cap,
+        )
+        .join(ParkingSpot, Reservation.spot_id == ParkingSpot.id)
+        .join(ParkingLot, ParkingSpot.lot_id == ParkingLot.id)
+        .where(Reservation.leaving_timestamp.is_(None))
+    )
+    if lot_id is not None:
+        stmt = stmt.where(ParkingSpot.lot_id == lot_id)
+    if reservation_ids is not None:
+        reservation_ids = list(reservation_ids)
+        if not reservation_ids:
+            return {}
+        stmt = stmt.where(Reservation.id.in_(reservation_ids))
+
+    return {
+        reservation_id: tariff(price, bands or None, cap).cost(parked_at, now)
+        for reservation_id, parked_at, price, bands, cap in db.session.execute(stmt)
+    }
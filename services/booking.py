@@ -0,0 +1,125 @@
+import random
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import select, update
+from sqlalchemy.exc import OperationalError
+from models.models import db, ParkingSpot, Reservation
+from services.availability import adjust_free_spots
+from services.analytics import STAY_JOB
+from services.intervals import held_spots
+from services.jobs import enqueue
+
+
+# Booking engine.
+#
+# A spot is claimed with a conditional UPDATE (... WHERE status = 'A'), so two
+# requests racing for the same spot can never both win: the loser sees a
+# rowcount of 0 and moves on to another candidate. Candidates come from the
+# (lot_id, status) index, so picking a free spot costs the same in a 10 spot
+# lot as in a 10,000 spot one. A walk-in has no end time, so spots that an
+# advance booking needs within WALK_IN_HOLD are left alone (services/advance_booking.py).
+
+# How many free spots to fetch per attempt; claimers shuffle them so that
+# concurrent bookings in the same lot rarely fight over the same row.
+CANDIDATES = 8
+RETRIES = 5
+BACKOFF = 0.01  # seconds, doubled after every failed attempt
+WALK_IN_HOLD = timedelta(hours=2)
+
+
+class BookingContention(Exception):
+    """Raised when a spot could not be claimed within the retry budget."""
+
+
+def book_first_available(lot_id, user_id, vehicle_no, parked_at=None, retries=RETRIES):
+    """Atomically claim a free spot in a lot and open a reservation on it.
+
+    Returns the new Reservation, or None when the lot has no free spot.
+    """
+    parked_at = parked_at or datetime.now()
+    delay = BACKOFF
+
+    for _ in range(retries + 1):
+        try:
+            candidates = walk_in_candidates(lot_id, parked_at)
+            if not candidates:
+                db.session.rollback()
+                return None
+
+            random.shuffle(candidates)
+            for spot_id in candidates:
+                if _claim(spot_id):
+                    reservation = Reservation(
+                        user_id=user_id,
+                        spot_id=spot_id,
+                        vehicle_no=vehicle_no,
+                        parking_timestamp=parked_at
+                    )
+                    db.session.add(reservation)
+                    adjust_free_spots(lot_id, -1)
+                    db.session.commit()
+                    return reservation
+
+            # Every candidate was taken by someone else in the meantime
+            db.session.rollback()
+        except OperationalError:
+            # SQLite reports "database is locked" when the writer lock is busy
+            db.session.rollback()
+
+        time.sleep(delay * random.random())
+        delay *= 2
+
+    raise BookingContention(f"Could not claim a spot in lot {lot_id}")
+
+
+def walk_in_candidates(lot_id, parked_at, limit=CANDIDATES):
+    """Ids of up to ``limit`` free spots of a lot that no booking needs soon after ``parked_at``."""
+    return db.session.scalars(
+        select(ParkingSpot.id)
+        .where(
+            ParkingSpot.lot_id == lot_id, ParkingSpot.status == 'A',
+            ParkingSpot.id.not_in(held_spots(lot_id, parked_at, parked_at + WALK_IN_HOLD)),
+        )
+        .limit(limit)
+    ).all()
+
+
+def release_spot(reservation, leaving_time, parking_cost):
+    """Close a reservation, free its spot and queue the stay for the usage rollups.
+
+    Returns False if the reservation had already been released.
+    """
+    closed = db.session.execute(
+        update(Reservation)
+        .where(Reservation.id == reservation.id, Reservation.leaving_timestamp.is_(None))
+        .values(leaving_timestamp=leaving_time, parking_cost=parking_cost)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not closed:
+        db.session.rollback()
+        return False
+
+    spot = reservation.spot
+    db.session.execute(
+        update(ParkingSpot)
+        .where(ParkingSpot.id == spot.id)
+        .values(status='A')
+        .execution_options(synchronize_session=False)
+    )
+    adjust_free_spots(spot.lot_id, +1)
+    # Keyed by id and release time, so no two stays can ever share a key
+    enqueue(STAY_JOB, {"lot_id": spot.lot_id, "start": reservation.parking_timestamp.isoformat(),
+                       "end": leaving_time.isoformat(), "cost": parking_cost},
+            key=f"stay:{reservation.id}:{leaving_time.isoformat()}")
+    db.session.commit()
+    return True
+
+
+def _claim(spot_id):
+    result = db.session.execute(
+        update(ParkingSpot)
+        .where(ParkingSpot.id == spot_id, ParkingSpot.status == 'A')
+        .values(status='O')
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
@@ -0,0 +1,118 @@
+import csv
+import io
+import json
+from datetime import datetime
+from sqlalchemy import select, union_all, literal_column
+from models.models import db, User, ParkingLot, ParkingSpot, Reservation, ArchivedReservation
+
+
+# Streaming reservation export.
+#
+# Rows are read as plain column tuples (no ORM objects) with yield_per, so the
+# driver fetches them in chunks and an export of any size runs in constant
+# memory. Each format turns the rows into an iterator of text chunks that the
+# controller hands to a streaming response. Archived reservations are read
+# from their own table and merged in on the same ordering.
+
+CHUNK_SIZE = 1000
+
+COLUMNS = [
+    ("reservation_id", Reservation.id),
+    ("user_id", User.id),
+    ("user_name", User.name),
+    ("user_email", User.email),
+    ("vehicle_no", Reservation.vehicle_no),
+    ("lot_id", ParkingLot.id),
+    ("location", ParkingLot.prime_location_name),
+    ("spot_number", ParkingSpot.spot_number),
+    ("parking_timestamp", Reservation.parking_timestamp),
+    ("leaving_timestamp", Reservation.leaving_timestamp),
+    ("parking_cost", Reservation.parking_cost),
+]
+
+# The same columns from reservation_archive, which keeps lot and spot itself
+ARCHIVE_COLUMNS = [
+    ArchivedReservation.id, User.id, User.name, User.email, ArchivedReservation.vehicle_no,
+    ArchivedReservation.lot_id, ArchivedReservation.lot_name, ArchivedReservation.spot_number,
+    ArchivedReservation.parking_timestamp, ArchivedReservation.leaving_timestamp,
+    ArchivedReservation.parking_cost,
+]
+
+FORMATS = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+}
+
+
+def reservation_rows(lot_id=None, user_id=None, start=None, end=None):
+    """Yield export rows oldest first, optionally filtered by lot, user and [start, end)."""
+    hot = _filtered(
+        select(*[column.label(name) for name, column in COLUMNS])
+        .join(ParkingSpot, Reservation.spot_id == ParkingSpot.id)
+        .join(ParkingLot, ParkingSpot.lot_id == ParkingLot.id)
+        .join(User, Reservation.user_id == User.id),
+        Reservation, ParkingSpot.lot_id, lot_id, user_id, start, end
+    )
+    cold = _filtered(
+        select(*ARCHIVE_COLUMNS).join(User, ArchivedReservation.user_id == User.id),
+        ArchivedReservation, ArchivedReservation.lot_id, lot_id, user_id, start, end
+    )
+    # Each side is read in index order and SQLite merges the two
+    stmt = union_all(hot, cold).order_by(literal_column("parking_timestamp"), literal_column("reservation_id"))
+    result = db.session.execute(stmt.execution_options(yield_per=CHUNK_SIZE))
+    for partition in result.partitions():
+        yield from partition
+
+
+def _filtered(stmt, table, lot_column, lot_id, user_id, start, end):
+    if lot_id is not None:
+        stmt = stmt.where(lot_column == lot_id)
+    if user_id is not None:
+        stmt = stmt.where(table.user_id == user_id)
+    if start is not None:
+        stmt = stmt.where(table.parking_timestamp >= start)
+    if end is not None:
+        stmt = stmt.where(table.parking_timestamp < end)
+    return stmt
+
+
+def to_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in COLUMNS])
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % CHUNK_SIZE == 0:
+            yield _drain(buffer)
+    yield _drain(buffer)
+
+
+def to_jsonl(rows):
+    names = [name for name, _ in COLUMNS]
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(names, row)), default=_json_value))
+        if len(lines) == CHUNK_SIZE:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+def export_reservations(fmt, **filters):
+    """Return an iterator of text chunks for the export in format ``fmt``."""
+    rows = reservation_rows(**filters)
+    return to_csv(rows) if fmt == "csv" else to_jsonl(rows)
+
+
+def _drain(buffer):
+    chunk = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return chunk
+
+
+def _json_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialise {type(value).__name__}")
@@ -0,0 +1,103 @@
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+from flask import current_app, render_template
+from markupsafe import Markup
+from models.models import db, ParkingLot
+from services.availability import available_spots_for
+
+
+# Rendered HTML fragments for the lot tables (and the encoded spot maps of
+# services/spotmap.py).
+#
+# A fragment is cached under a key that embeds the version of every lot it
+# shows. ParkingLot.version goes up whenever a spot changes status (inside
+# adjust_free_spots) and whenever an admin edits the lot, and deleting or
+# creating a lot changes the set of ids, so a changed page simply misses and
+# old entries age out of the LRU. Because the versions live in the database,
+# a write in one worker process invalidates the fragments of all of them. The
+# cache holds at most FRAGMENT_CACHE_BYTES of text per process.
+
+
+class FragmentCache:
+    def __init__(self, max_bytes=8 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = self.misses = self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            html = self._entries.get(key)
+            if html is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return html
+
+    def put(self, key, html):
+        size = sys.getsizeof(html)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= sys.getsizeof(old)
+            self._entries[key] = html
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= sys.getsizeof(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            }
+
+
+def fragment_cache():
+    cache = current_app.extensions.get("fragment_cache")
+    if cache is None:
+        cache = current_app.extensions["fragment_cache"] = FragmentCache(
+            current_app.config.get("FRAGMENT_CACHE_BYTES", 8 * 1024 * 1024)
+        )
+    return cache
+
+
+def cached_render(key, template, load):
+    """Return ``template`` rendered with the context from ``load()``, or the cached HTML for ``key``."""
+    cache = fragment_cache()
+    html = cache.get(key)
+    if html is None:
+        html = render_template(template, **load())
+        cache.put(key, html)
+    return Markup(html)
+
+
+def lot_list_fragment(template):
+    """The lot table in ``template`` for every lot, re-rendered only after some lot changed."""
+    versions = db.session.query(ParkingLot.id, ParkingLot.version).order_by(ParkingLot.id).all()
+    key = (template, hashlib.blake2b(repr(versions).encode(), digest_size=16).hexdigest())
+
+    def load():
+        lots = ParkingLot.query.order_by(ParkingLot.id).all()
+        return {"lots": lots, "available_spots": available_spots_for(lots)}
+
+    return cached_render(key, template, load)
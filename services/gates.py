@@ -0,0 +1,348 @@
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from itertools import groupby
+from sqlalchemy import select, update, insert, case
+from models.models import db, User, ParkingLot, ParkingSpot, Reservation, ArchivedReservation, SpotBooking
+from services.advance_booking import EARLY_CHECK_IN
+from services.availability import adjust_free_spots
+from services.analytics import record_stays
+from services.billing import tariff
+from services.booking import WALK_IN_HOLD
+from services.intervals import MAX_WINDOW, held_spots
+
+
+# Batch check-in/check-out for gate hardware.
+#
+# Gates buffer plate reads and submit them in bursts. A burst is applied in one
+# transaction with a fixed number of statements per lot rather than per
+# vehicle: open reservations are looked up with one IN (...) query, closed with
+# one UPDATE ... RETURNING whose values come from CASE on the reservation id,
+# spots are claimed with UPDATE ... WHERE id IN (SELECT ... LIMIT n) and the
+# new reservations are inserted in bulk. Events are handled in runs of the
+# same type, in the order sent, so "in" then "out" for one vehicle in the same
+# burst works. An event that cannot be applied (unknown plate, full lot,
+# already out, ...) gets an error in its result; the others still go through.
+# A plate arriving within the check-in window of its advance booking for that
+# lot parks on the booked spot (or, if that is still occupied, on any free
+# one) and the booking is linked to the stay, as in advance_booking.check_in.
+
+MAX_EVENTS = 1000
+CHUNK = 500           # ids per IN (...) / CASE statement
+CLAIM_ROUNDS = 3      # re-claim spots lost to concurrent bookings this many times
+CLOCK_SKEW = timedelta(minutes=5)  # how far in the future a gate's clock may be
+
+
+class GateError(ValueError):
+    pass
+
+
+def _chunks(items, size=CHUNK):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _parse(raw, now):
+    if not isinstance(raw, dict):
+        raise GateError("Event must be an object")
+    kind = raw.get("type")
+    if kind not in ("in", "out"):
+        raise GateError("type must be 'in' or 'out'")
+    vehicle_no = str(raw.get("vehicle_no") or "").strip()
+    if not vehicle_no:
+        raise GateError("vehicle_no is required")
+
+    at = raw.get("at")
+    if at:
+        try:
+            at = datetime.fromisoformat(str(at))
+        except ValueError:
+            raise GateError("at must be an ISO 8601 timestamp")
+        if at.tzinfo is not None:
+            at = at.astimezone().replace(tzinfo=None)  # reservations store local time
+        if at > now + CLOCK_SKEW:
+            raise GateError("at is in the future")
+    else:
+        at = now
+
+    event = {"type": kind, "vehicle_no": vehicle_no, "at": at}
+    if kind == "in":
+        try:
+            event["lot_id"] = int(raw["lot_id"])
+            event["user_id"] = int(raw["user_id"]) if raw.get("user_id") is not None else None
+        except (KeyError, TypeError, ValueError):
+            raise GateError("lot_id (and user_id, if given) must be integers")
+    return event
+
+
+def _result(index, event, **values):
+    return {"index": index, "type": event.get("type"), "vehicle_no": event.get("vehicle_no"), **values}
+
+
+def _fail(results, index, event, error):
+    results[index] = _result(index, event, ok=False, error=error)
+
+
+def process_gate_events(events, now=None):
+    """Apply a burst of gate reads; returns one result per event, in the order given.
+
+    Each event is {"type": "in"|"out", "vehicle_no": ..., "at": ISO time
+    (default now)}; check-ins also carry "lot_id" and, for plates never seen
+    before, the "user_id" to book for. Commits once at the end.
+    """
+    now = now or datetime.now()
+    results = [None] * len(events)
+    parsed = []
+    for index, raw in enumerate(events):
+        try:
+            parsed.append((index, _parse(raw, now)))
+        except GateError as e:
+            _fail(results, index, raw if isinstance(raw, dict) else {}, str(e))
+
+    for kind, run in groupby(parsed, key=lambda item: item[1]["type"]):
+        (_check_in if kind == "in" else _check_out)(list(run), results)
+
+    db.session.commit()
+    return results
+
+
+def _unique(run, results, what):
+    """Drop (with an error) a second event for the same plate within one run."""
+    seen = {}
+    for index, event in run:
+        if event["vehicle_no"] in seen:
+            _fail(results, index, event, f"Duplicate {what} in this batch")
+        else:
+            seen[event["vehicle_no"]] = (index, event)
+    return seen
+
+
+def _check_out(run, results):
+    pending = _unique(run, results, "check-out")
+
+    # Oldest open reservation of every plate, with what is needed to price it
+    open_by_vehicle = {}
+    for plates in _chunks(pending):
+        rows = db.session.execute(
+            select(
+                Reservation.id, Reservation.vehicle_no, Reservation.parking_timestamp, Reservation.spot_id,
+                ParkingSpot.lot_id, ParkingLot.price_per_hour, ParkingLot.tariff_bands, ParkingLot.daily_cap,
+            )
+            .join(ParkingSpot, Reservation.spot_id == ParkingSpot.id)
+            .join(ParkingLot, ParkingSpot.lot_id == ParkingLot.id)
+            .where(Reservation.vehicle_no.in_(plates), Reservation.leaving_timestamp.is_(None))
+            .order_by(Reservation.parking_timestamp.desc())
+        )
+        for row in rows:
+            open_by_vehicle[row.vehicle_no] = row
+
+    closing = {}
+    for vehicle_no, (index, event) in pending.items():
+        row = open_by_vehicle.get(vehicle_no)
+        if row is None:
+            _fail(results, index, event, "No open reservation for this vehicle")
+        elif event["at"] < row.parking_timestamp:
+            _fail(results, index, event, "Check-out is earlier than check-in")
+        else:
+            cost = tariff(row.price_per_hour, row.tariff_bands or None, row.daily_cap).cost(
+                row.parking_timestamp, event["at"])
+            closing[row.id] = (index, event, row, cost)
+
+    # Close them all; RETURNING tells which were still open
+    closed = set()
+    for ids in _chunks(closing):
+        closed.update(db.session.scalars(
+            update(Reservation)
+            .where(Reservation.id.in_(ids), Reservation.leaving_timestamp.is_(None))
+            .values(
+                leaving_timestamp=case({i: closing[i][1]["at"] for i in ids}, value=Reservation.id),
+                parking_cost=case({i: closing[i][3] for i in ids}, value=Reservation.id),
+            )
+            .returning(Reservation.id)
+            .execution_options(synchronize_session=False)
+        ))
+
+    freed = Counter()
+    stays = []
+    for reservation_id, (index, event, row, cost) in closing.items():
+        if reservation_id not in closed:
+            _fail(results, index, event, "This reservation has already been released.")
+            continue
+        freed[row.lot_id] += 1
+        stays.append((row.lot_id, row.parking_timestamp, event["at"], cost))
+        results[index] = _result(index, event, ok=True, reservation_id=reservation_id,
+                                 lot_id=row.lot_id, spot_id=row.spot_id, parking_cost=cost)
+
+    for ids in _chunks(closing[i][2].spot_id for i in closed):
+        db.session.execute(
+            update(ParkingSpot).where(ParkingSpot.id.in_(ids)).values(status='A')
+            .execution_options(synchronize_session=False)
+        )
+    for lot_id, count in freed.items():
+        adjust_free_spots(lot_id, count)
+    if stays:
+        record_stays(stays)
+
+
+def _check_in(run, results):
+    pending = _unique(run, results, "check-in")
+
+    # Plates already parked, and who parked each plate last
+    parked, owner = set(), {}
+    for plates in _chunks(pending):
+        rows = db.session.execute(
+            select(Reservation.vehicle_no, Reservation.user_id, Reservation.leaving_timestamp)
+            .where(Reservation.vehicle_no.in_(plates))
+            .order_by(Reservation.parking_timestamp)
+        )
+        for vehicle_no, user_id, left in rows:
+            owner[vehicle_no] = user_id
+            if left is None:
+                parked.add(vehicle_no)
+
+    # Plates only seen long ago are in the archive
+    for plates in _chunks(set(pending) - set(owner)):
+        rows = db.session.execute(
+            select(ArchivedReservation.vehicle_no, ArchivedReservation.user_id)
+            .where(ArchivedReservation.vehicle_no.in_(plates))
+            .order_by(ArchivedReservation.parking_timestamp)
+        )
+        owner.update((vehicle_no, user_id) for vehicle_no, user_id in rows)
+
+    lot_ids = {event["lot_id"] for _, event in pending.values()}
+    bookings = _bookings(pending, lot_ids)
+    lots = set(db.session.scalars(select(ParkingLot.id).where(ParkingLot.id.in_(lot_ids))))
+    given_users = {event["user_id"] for _, event in pending.values() if event["user_id"] is not None}
+    users = set(db.session.scalars(select(User.id).where(User.id.in_(given_users)))) if given_users else set()
+
+    by_lot = defaultdict(list)
+    for vehicle_no, (index, event) in pending.items():
+        booking = bookings.get(vehicle_no)
+        user_id = event["user_id"] or (booking.user_id if booking else owner.get(vehicle_no))
+        if vehicle_no in parked:
+            _fail(results, index, event, "Vehicle is already checked in")
+        elif event["lot_id"] not in lots:
+            _fail(results, index, event, "No parking lot with this ID")
+        elif user_id is None:
+            _fail(results, index, event, "Unknown vehicle; send the user_id to book for")
+        elif event["user_id"] is not None and event["user_id"] not in users:
+            _fail(results, index, event, "No user with this ID")
+        else:
+            by_lot[event["lot_id"]].append((index, event, user_id, booking))
+
+    for lot_id, arrivals in by_lot.items():
+        # Booked plates take their own spot while it is free
+        on_booked = _claim_booked_spots(arrivals)
+        rest = [arrival for arrival in arrivals if arrival[0] not in on_booked]
+        arrived = [event["at"] for _, event, _, _ in rest]
+        spots = _claim_spots(lot_id, len(rest), min(arrived), max(arrived)) if rest else []
+        for index, event, _, _ in rest[len(spots):]:
+            _fail(results, index, event, "No available spot")
+        placed = [(arrival, on_booked[arrival[0]]) for arrival in arrivals if arrival[0] in on_booked]
+        placed += list(zip(rest, spots))
+        if not placed:
+            continue
+
+        reservation_ids = db.session.scalars(
+            insert(Reservation).returning(Reservation.id, sort_by_parameter_order=True),
+            [
+                {"user_id": user_id, "spot_id": spot_id, "vehicle_no": event["vehicle_no"],
+                 "parking_timestamp": event["at"]}
+                for (index, event, user_id, _), (spot_id, _) in placed
+            ]
+        ).all()
+        adjust_free_spots(lot_id, -len(placed))
+        linked = _link_bookings({
+            booking.id: reservation_id
+            for ((_, _, _, booking), _), reservation_id in zip(placed, reservation_ids) if booking
+        })
+
+        for ((index, event, user_id, booking), (spot_id, spot_number)), reservation_id in zip(placed, reservation_ids):
+            results[index] = _result(index, event, ok=True, reservation_id=reservation_id, lot_id=lot_id,
+                                     spot_id=spot_id, spot_number=spot_number, user_id=user_id,
+                                     booking_id=booking.id if booking and booking.id in linked else None)
+
+
+def _bookings(pending, lot_ids):
+    """{plate: booking} for plates arriving within the check-in window of a booking at that lot."""
+    arrived = [event["at"] for _, event in pending.values()]
+    first, last = min(arrived), max(arrived)
+    found = {}
+    for plates in _chunks(pending):
+        rows = db.session.execute(
+            select(SpotBooking.id, SpotBooking.vehicle_no, SpotBooking.lot_id, SpotBooking.spot_id,
+                   SpotBooking.user_id, SpotBooking.starts_at, SpotBooking.ends_at)
+            .where(SpotBooking.lot_id.in_(lot_ids), SpotBooking.vehicle_no.in_(plates),
+                   SpotBooking.reservation_id.is_(None),
+                   SpotBooking.starts_at > first - MAX_WINDOW, SpotBooking.starts_at <= last + EARLY_CHECK_IN,
+                   SpotBooking.ends_at > first)
+            .order_by(SpotBooking.starts_at)
+        )
+        for row in rows:
+            _, event = pending[row.vehicle_no]
+            if (row.vehicle_no not in found and row.lot_id == event["lot_id"]
+                    and row.starts_at - EARLY_CHECK_IN <= event["at"] < row.ends_at):
+                found[row.vehicle_no] = row
+    return found
+
+
+def _claim_booked_spots(arrivals):
+    """Occupy the booked spots of the booked arrivals that are free; returns {index: (id, spot_number)}."""
+    booked = [(index, booking.spot_id) for index, _, _, booking in arrivals if booking]
+    if not booked:
+        return {}
+    free = dict(db.session.execute(
+        update(ParkingSpot)
+        .where(ParkingSpot.id.in_({spot_id for _, spot_id in booked}), ParkingSpot.status == 'A')
+        .values(status='O')
+        .returning(ParkingSpot.id, ParkingSpot.spot_number)
+        .execution_options(synchronize_session=False)
+    ).all())
+    # Back-to-back bookings of one spot can both be in their check-in window: the first arrival gets it
+    claimed = {}
+    for index, spot_id in booked:
+        if spot_id in free:
+            claimed[index] = (spot_id, free.pop(spot_id))
+    return claimed
+
+
+def _link_bookings(reservation_of):
+    """Point bookings at their new stays, unless already checked in; returns the linked booking ids."""
+    linked = set()
+    for ids in _chunks(reservation_of):
+        linked.update(db.session.scalars(
+            update(SpotBooking)
+            .where(SpotBooking.id.in_(ids), SpotBooking.reservation_id.is_(None))
+            .values(reservation_id=case({i: reservation_of[i] for i in ids}, value=SpotBooking.id))
+            .returning(SpotBooking.id)
+            .execution_options(synchronize_session=False)
+        ))
+    return linked
+
+
+def _claim_spots(lot_id, count, first_at, last_at):
+    """Mark up to ``count`` free spots of a lot occupied; returns [(id, spot_number)].
+
+    Like a walk-in booking, skips spots that advance bookings need between the
+    first arrival and WALK_IN_HOLD after the last one.
+    """
+    held = held_spots(lot_id, first_at, last_at + WALK_IN_HOLD)
+    claimed = []
+    for _ in range(CLAIM_ROUNDS):
+        free = (
+            select(ParkingSpot.id)
+            .where(ParkingSpot.lot_id == lot_id, ParkingSpot.status == 'A', ParkingSpot.id.not_in(held))
+            .limit(count - len(claimed))
+        )
+        rows = db.session.execute(
+            update(ParkingSpot)
+            .where(ParkingSpot.id.in_(free), ParkingSpot.status == 'A')
+            .values(status='O')
+            .returning(ParkingSpot.id, ParkingSpot.spot_number)
+            .execution_options(synchronize_session=False)
+        ).all()
+        claimed += [tuple(row) for row in rows]
+        # Nothing left to claim, or everything asked for was claimed
+        if not rows or len(claimed) == count:
+            break
+    return claimed
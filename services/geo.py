@@ -0,0 +1,79 @@
+import math
+from sqlalchemy import and_, table, column
+from models.models import db, ParkingLot
+from services.availability import available_spots_for
+
+
+# Nearest lot lookup.
+#
+# Lots with coordinates are found through a bounding box around the driver:
+# the parking_lot_rtree R*Tree on SQLite (migration 6), or the
+# (latitude, longitude) index elsewhere. The box starts small and doubles until
+# it holds enough lots with free spots, so a search only ever touches the lots
+# near the driver however many lots exist. Free spot counts come from the
+# availability service.
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+START_RADIUS_KM = 1.0
+MAX_RADIUS_KM = 50.0
+
+lot_rtree = table(
+    "parking_lot_rtree", column("id"),
+    column("min_lat"), column("max_lat"), column("min_lng"), column("max_lng"),
+)
+
+
+def distance_km(lat1, lng1, lat2, lng2):
+    """Great-circle (haversine) distance between two points."""
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def lots_in_box(lat, lng, radius_km):
+    """ParkingLots whose coordinates fall in the box enclosing a circle of ``radius_km``."""
+    dlat = radius_km / KM_PER_DEGREE
+    dlng = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+    lat_lo, lat_hi, lng_lo, lng_hi = lat - dlat, lat + dlat, lng - dlng, lng + dlng
+
+    if db.engine.dialect.name == "sqlite":
+        return (
+            ParkingLot.query
+            .join(lot_rtree, lot_rtree.c.id == ParkingLot.id)
+            .filter(
+                lot_rtree.c.max_lat >= lat_lo, lot_rtree.c.min_lat <= lat_hi,
+                lot_rtree.c.max_lng >= lng_lo, lot_rtree.c.min_lng <= lng_hi,
+            )
+            .all()
+        )
+    return ParkingLot.query.filter(and_(
+        ParkingLot.latitude.between(lat_lo, lat_hi),
+        ParkingLot.longitude.between(lng_lo, lng_hi),
+    )).all()
+
+
+def nearest_lots(lat, lng, limit=5, only_available=True, max_km=MAX_RADIUS_KM):
+    """Return up to ``limit`` (lot, distance_km, free_spots) tuples, nearest first.
+
+    With ``only_available`` lots without a free spot are skipped. Lots further
+    than ``max_km`` are never returned.
+    """
+    radius = min(START_RADIUS_KM, max_km)
+    while True:
+        lots = lots_in_box(lat, lng, radius)
+        free = available_spots_for(lots)
+        found = []
+        for lot in lots:
+            if only_available and free[lot.id] <= 0:
+                continue
+            distance = distance_km(lat, lng, lot.latitude, lot.longitude)
+            if distance <= radius:
+                found.append((lot, distance, free[lot.id]))
+
+        # Everything within the radius has been seen, so these are the nearest
+        if len(found) >= limit or radius >= max_km:
+            found.sort(key=lambda item: item[1])
+            return found[:limit]
+        radius = min(radius * 2, max_km)
@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, table, column, inspect
+from models.models import db, SpotBooking
+
+
+# Interval index over advance booking windows.
+#
+# A booking holds its spot for [starts_at, ends_at). On SQLite every booking
+# is also a box in the spot_booking_rtree R*Tree (migration 10): epoch seconds
+# on one axis, its lot id (a point) on the other, so "bookings in lot L that
+# overlap [start, end)" is one R*Tree search whose cost follows the number of
+# bookings it finds, not the lot's whole booking history. The R*Tree keeps
+# 32-bit floats rounded outwards, so its hits are re-checked against the exact
+# columns. Elsewhere, or on a database that has not been migrated yet, the
+# (lot_id, starts_at) index does the job: no booking is longer than
+# MAX_WINDOW, so any that overlaps started within (start - MAX_WINDOW, end).
+# The same bound keeps per-spot checks on the (spot_id, starts_at) index short.
+
+MAX_WINDOW = timedelta(hours=24)
+EPOCH = datetime(1970, 1, 1)  # naive, like the stored times; SQLite's strftime('%s') agrees
+
+booking_rtree = table(
+    "spot_booking_rtree", column("id"), column("min_t"), column("max_t"), column("min_lot"), column("max_lot"),
+)
+
+
+def epoch_seconds(moment):
+    return (moment - EPOCH).total_seconds()
+
+
+def _overlaps(start, end):
+    return (SpotBooking.starts_at < end, SpotBooking.ends_at > start)
+
+
+def _has_rtree():
+    """Whether this app's database has the booking R*Tree; looked up once per process."""
+    found = current_app.extensions.get("booking_rtree")
+    if found is None:
+        found = current_app.extensions["booking_rtree"] = (
+            db.engine.dialect.name == "sqlite" and inspect(db.engine).has_table("spot_booking_rtree")
+        )
+    return found
+
+
+def held_spots(lot_id, start, end):
+    """SELECT of the spot ids of ``lot_id`` that a booking holds at some point in [start, end)."""
+    if _has_rtree():
+        return (
+            select(SpotBooking.spot_id)
+            .select_from(booking_rtree)
+            .join(SpotBooking, SpotBooking.id == booking_rtree.c.id)
+            .where(
+                booking_rtree.c.min_lot <= lot_id, booking_rtree.c.max_lot >= lot_id,
+                booking_rtree.c.min_t < epoch_seconds(end), booking_rtree.c.max_t > epoch_seconds(start),
+                *_overlaps(start, end),
+            )
+        )
+    return select(SpotBooking.spot_id).where(
+        SpotBooking.lot_id == lot_id, SpotBooking.starts_at > start - MAX_WINDOW, *_overlaps(start, end),
+    )
+
+
+def spot_conflicts(spot_id, start, end):
+    """SELECT of the ids of bookings of one spot that overlap [start, end)."""
+    return select(SpotBooking.id).where(
+        SpotBooking.spot_id == spot_id, SpotBooking.starts_at > start - MAX_WINDOW, *_overlaps(start, end),
+    )
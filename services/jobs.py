@@ -0,0 +1,256 @@
+import json
+import logging
+import random
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, update, delete, case, func, event
+from sqlalchemy.orm import Session
+from werkzeug.utils import import_string
+from models.models import db, Job
+
+logger = logging.getLogger("parking.jobs")
+
+
+# Background jobs.
+#
+# enqueue() adds a row to the job table inside the caller's transaction, so a
+# job exists exactly when the work that asked for it was committed, and a
+# rollback drops it. After the commit the in-process worker of this process
+# is woken (started on first use when JOBS_IN_PROCESS is on); `flask run-jobs`
+# runs workers in a separate process instead. Workers take due jobs with a
+# conditional UPDATE ... RETURNING, so several threads and processes can share
+# the table without running a job twice. A job calls "module:function" with
+# its JSON payload as keyword arguments and is marked done in the same
+# transaction, so a task that only touches the database (and does not commit
+# itself) takes effect exactly once. A failed job is retried with exponential
+# backoff up to its max_attempts, then left as failed. A job whose worker died
+# is taken back after JOBS_LEASE_SECONDS. A second enqueue with the same
+# idempotency key is dropped for as long as the first job is kept
+# (JOBS_KEEP_DAYS after it finished).
+
+MAX_ATTEMPTS = 5
+RETRY_BASE = 5.0      # seconds before the first retry, doubled after each failure
+RETRY_MAX = 3600.0
+SWEEP_EVERY = 60.0    # seconds between looks for stale and expired jobs
+PENDING = "jobs_enqueued"
+
+_start_lock = threading.Lock()
+
+
+def _insert_ignoring_duplicates():
+    # INSERT ... ON CONFLICT (idempotency_key) DO NOTHING
+    if db.engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(Job).on_conflict_do_nothing(index_elements=[Job.idempotency_key])
+
+
+def enqueue(task, payload=None, key=None, delay=None, max_attempts=MAX_ATTEMPTS):
+    """Queue ``task`` ("module:function") in the current transaction; it runs after the commit.
+
+    ``payload`` must be JSON-serializable. Returns False when a job with the
+    same idempotency ``key`` already exists.
+    """
+    now = datetime.now()
+    added = db.session.execute(_insert_ignoring_duplicates().values(
+        task=task, payload=json.dumps(payload or {}), idempotency_key=key, status="queued", attempts=0,
+        max_attempts=max_attempts, run_after=now + (delay or timedelta()), created_at=now,
+    )).rowcount
+    if added:
+        db.session.info[PENDING] = True
+    return bool(added)
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_after_commit(session):
+    if session.info.pop(PENDING, None):
+        wake_worker()
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_rolled_back(session):
+    session.info.pop(PENDING, None)
+
+
+def wake_worker():
+    """Tell this process's worker there is work, starting it if JOBS_IN_PROCESS allows."""
+    app = current_app._get_current_object()
+    worker = app.extensions.get("job_worker")
+    if worker is None and app.config.get("JOBS_IN_PROCESS"):
+        with _start_lock:
+            worker = app.extensions.get("job_worker")
+            if worker is None:
+                worker = app.extensions["job_worker"] = JobWorker(app, app.config.get("JOBS_THREADS", 2))
+                worker.start()
+    if worker is not None:
+        worker.wake()
+
+
+def claim_job(now=None):
+    """Mark the next due job running and commit; returns its row, or None if nothing is due."""
+    now = now or datetime.now()
+    due = (
+        select(Job.id)
+        .where(Job.status == "queued", Job.run_after <= now)
+        .order_by(Job.run_after, Job.id)
+        .limit(1)
+    )
+    # Read first: an idle poll must not take SQLite's write lock
+    while (job_id := db.session.scalar(due)) is not None:
+        row = db.session.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == "queued")
+            .values(status="running", locked_at=now, attempts=Job.attempts + 1)
+            .returning(Job.id, Job.task, Job.payload, Job.attempts, Job.max_attempts, Job.locked_at)
+            .execution_options(synchronize_session=False)
+        ).first()
+        db.session.commit()
+        if row is not None:
+            return row
+        # Another worker took it first
+    db.session.rollback()
+    return None
+
+
+def _still_claimed(job):
+    # The claim this worker holds; gone once sweep() gave the job to another worker
+    return (Job.id == job.id, Job.status == "running", Job.locked_at == job.locked_at)
+
+
+def run_job(job):
+    """Run a claimed job and record the outcome; returns True if it succeeded.
+
+    Nothing is kept, not even the task's writes, when the job's lease expired
+    while it ran: by then it is queued again for another worker.
+    """
+    try:
+        import_string(job.task)(**json.loads(job.payload))
+        finished = db.session.execute(
+            update(Job).where(*_still_claimed(job))
+            .values(status="done", finished_at=datetime.now(), locked_at=None, last_error=None)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not finished:
+            db.session.rollback()
+            logger.warning("job %s (%s) outlived its lease; its work was rolled back", job.id, job.task)
+            return False
+        db.session.commit()
+        return True
+    except Exception:
+        db.session.rollback()
+        error = traceback.format_exc(limit=5)
+        retry = job.attempts < job.max_attempts
+        if retry:
+            delay = min(RETRY_BASE * 2 ** (job.attempts - 1), RETRY_MAX) * random.uniform(0.5, 1.0)
+            values = {"status": "queued", "run_after": datetime.now() + timedelta(seconds=delay)}
+        else:
+            values = {"status": "failed", "finished_at": datetime.now()}
+        db.session.execute(
+            update(Job).where(*_still_claimed(job)).values(locked_at=None, last_error=error, **values)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        logger.warning("job %s (%s) failed, attempt %s of %s%s", job.id, job.task, job.attempts,
+                       job.max_attempts, "; will retry" if retry else "", exc_info=True)
+        return False
+
+
+def sweep(lease_seconds, keep_days, now=None):
+    """Take back jobs whose worker stopped answering and delete old finished ones; commits."""
+    now = now or datetime.now()
+    db.session.execute(
+        update(Job)
+        .where(Job.status == "running", Job.locked_at < now - timedelta(seconds=lease_seconds))
+        .values(status=case((Job.attempts >= Job.max_attempts, "failed"), else_="queued"),
+                finished_at=case((Job.attempts >= Job.max_attempts, now), else_=None),
+                locked_at=None, last_error="worker lease expired")
+        .execution_options(synchronize_session=False)
+    )
+    db.session.execute(
+        delete(Job)
+        .where(Job.status.in_(("done", "failed")), Job.finished_at < now - timedelta(days=keep_days))
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+def run_due_jobs():
+    """Run every due job in the calling thread; returns (succeeded, failed)."""
+    succeeded = failed = 0
+    while (job := claim_job()) is not None:
+        if run_job(job):
+            succeeded += 1
+        else:
+            failed += 1
+    return succeeded, failed
+
+
+def job_counts():
+    """{status: number of jobs}, for monitoring."""
+    return dict(db.session.execute(select(Job.status, func.count()).group_by(Job.status)).all())
+
+
+class JobWorker:
+    """A pool of threads that run due jobs until stopped.
+
+    Idle threads sleep until wake() or JOBS_POLL_SECONDS pass, whichever is
+    first; the poll picks up retries that came due and jobs queued by other
+    processes.
+    """
+
+    def __init__(self, app, threads=2):
+        self.app = app
+        self.threads = threads
+        self.poll = app.config.get("JOBS_POLL_SECONDS", 2.0)
+        self.lease = app.config.get("JOBS_LEASE_SECONDS", 600)
+        self.keep_days = app.config.get("JOBS_KEEP_DAYS", 7)
+        self._signals = 0
+        self._changed = threading.Condition()
+        self._stopping = threading.Event()
+        self._swept = 0.0
+        self._pool = []
+
+    def start(self):
+        for n in range(self.threads):
+            thread = threading.Thread(target=self._loop, name=f"job-worker-{n}", daemon=True)
+            thread.start()
+            self._pool.append(thread)
+
+    def wake(self):
+        with self._changed:
+            self._signals += 1
+            self._changed.notify_all()
+
+    def stop(self, timeout=None):
+        """Let running jobs finish, then end the threads."""
+        self._stopping.set()
+        self.wake()
+        for thread in self._pool:
+            thread.join(timeout)
+
+    def _loop(self):
+        seen = -1
+        while not self._stopping.is_set():
+            with self._changed:
+                if seen == self._signals:
+                    self._changed.wait(self.poll)
+                seen = self._signals
+            try:
+                with self.app.app_context():
+                    self._maybe_sweep()
+                    while not self._stopping.is_set() and (job := claim_job()) is not None:
+                        run_job(job)
+            except Exception:
+                # Database unreachable or locked; try again at the next poll
+                logger.exception("job worker error")
+
+    def _maybe_sweep(self):
+        with self._changed:
+            if time.monotonic() - self._swept < SWEEP_EVERY:
+                return
+            self._swept = time.monotonic()
+        sweep(self.lease, self.keep_days)
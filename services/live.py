@@ -0,0 +1,77 @@
+import threading
+from collections import deque
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+# Live availability feed.
+#
+# adjust_free_spots() records every counter change on the session it ran in;
+# once that transaction commits the changes are published to the process-wide
+# hub, and a rollback drops them. The hub keeps a single ring buffer of
+# numbered events and one condition variable: a subscriber is nothing more
+# than the id of the last event it saw, so idle clients cost no queue and,
+# under an async worker (gunicorn -k gevent), no thread either. Events only
+# reach clients of the worker process that committed them.
+
+BACKLOG = 1024
+PENDING = "availability_changes"
+
+
+class AvailabilityHub:
+    def __init__(self, backlog=BACKLOG):
+        self._events = deque(maxlen=backlog)
+        self._last_id = 0
+        self._changed = threading.Condition()
+
+    @property
+    def last_id(self):
+        return self._last_id
+
+    def publish(self, changes):
+        """Append ``changes`` (dicts with lot_id, delta and free) and wake every waiting subscriber."""
+        with self._changed:
+            for change in changes:
+                self._last_id += 1
+                self._events.append((self._last_id, change))
+            self._changed.notify_all()
+
+    def since(self, last_id):
+        """Events after ``last_id`` as [(id, change)], or None if some already fell out of the buffer."""
+        with self._changed:
+            return self._collect(last_id)
+
+    def wait(self, last_id, timeout):
+        """Like since(), but block up to ``timeout`` seconds until there is something newer."""
+        with self._changed:
+            self._changed.wait_for(lambda: self._last_id != last_id, timeout)
+            return self._collect(last_id)
+
+    def _collect(self, last_id):
+        if last_id > self._last_id:
+            return None  # id from before a restart of this worker
+        if self._events and self._events[0][0] > last_id + 1:
+            return None
+        if last_id == self._last_id:
+            return []
+        return [(i, change) for i, change in self._events if i > last_id]
+
+
+hub = AvailabilityHub()
+
+
+def record_change(session, lot_id, delta, free):
+    """Remember a counter change to publish when ``session`` commits."""
+    session.info.setdefault(PENDING, []).append({"lot_id": lot_id, "delta": delta, "free": free})
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_committed(session):
+    changes = session.info.pop(PENDING, None)
+    if changes:
+        hub.publish(changes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_rolled_back(session):
+    session.info.pop(PENDING, None)
@@ -0,0 +1,149 @@
+from datetime import datetime
+from sqlalchemy import delete
+from models.models import db, ParkingLot, ParkingSpot, Reservation, SpotBooking, LotUsageHour, LotUsageDay
+from services.archive import archive_lot_history
+from services.billing import parse_bands
+from services.provisioning import add_spots, removable_spot_ids, remove_spots
+
+
+# Creating, editing and deleting parking lots.
+#
+# Shared by the admin forms and the JSON API. Input is any mapping of field
+# name to value (request.form or a decoded JSON body); problems are reported
+# as LotError with a message fit to show the admin. Like provisioning, nothing
+# here commits: the caller owns the transaction.
+
+REQUIRED = ("prime_location_name", "price_per_hour", "address", "pincode", "max_spots")
+
+
+class LotError(ValueError):
+    pass
+
+
+def _text(data, key):
+    value = data.get(key)
+    return "" if value is None else str(value).strip()
+
+
+# Optional latitude/longitude: (lat, lng), (None, None) or ValueError
+def parse_coordinates(data):
+    lat = _text(data, "latitude")
+    lng = _text(data, "longitude")
+    if not lat and not lng:
+        return None, None
+    lat, lng = float(lat), float(lng)
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ValueError
+    return lat, lng
+
+
+# Optional time-of-day bands and daily cap, or ValueError
+def parse_tariff(data):
+    bands = parse_bands(_text(data, "tariff_bands"))
+    cap = _text(data, "daily_cap")
+    cap = float(cap) if cap else None
+    if cap is not None and cap <= 0:
+        raise ValueError("Daily cap must be a positive amount")
+    return bands or None, cap
+
+
+def lot_fields(data):
+    """Validate a lot form and return the ParkingLot column values, or raise LotError."""
+    values = {key: _text(data, key) for key in REQUIRED}
+    if not all(values.values()):
+        raise LotError("Fill all required fields")
+
+    try:
+        price = float(values["price_per_hour"])
+        max_spots = int(values["max_spots"])
+        if price < 0 or max_spots <= 0:
+            raise ValueError
+    except ValueError:
+        raise LotError("Enter valid positive numbers for price and max spots.")
+
+    pincode = values["pincode"]
+    if not pincode.isdigit() or len(pincode) != 6:
+        raise LotError("Enter a valid 6-digit pincode.")
+
+    try:
+        latitude, longitude = parse_coordinates(data)
+    except ValueError:
+        raise LotError("Enter both latitude and longitude as valid coordinates, or leave both empty.")
+
+    try:
+        tariff_bands, daily_cap = parse_tariff(data)
+    except ValueError as e:
+        raise LotError(f"Invalid tariff: {e}")
+
+    return {
+        "prime_location_name": values["prime_location_name"],
+        "price_per_hour": price,
+        "tariff_bands": tariff_bands,
+        "daily_cap": daily_cap,
+        "address": values["address"],
+        "pincode": pincode,
+        "latitude": latitude,
+        "longitude": longitude,
+        "max_spots": max_spots,
+    }
+
+
+def create_lot(fields):
+    """Add a lot with ``max_spots`` free spots numbered after its name."""
+    lot = ParkingLot(free_spots=0, **fields)
+    db.session.add(lot)
+    db.session.flush()  # assigns lot.id
+    add_spots(lot.id, 1, lot.max_spots, f"{lot.prime_location_name[:3].upper()}-")  # Unique spot number
+    return lot
+
+
+def update_lot(lot, fields):
+    """Apply ``fields`` to ``lot``, adding spots or removing empty ones to match max_spots."""
+    old_max_spots = lot.max_spots
+    new_max_spots = fields["max_spots"]
+
+    if new_max_spots > old_max_spots:
+        existing_spots = ParkingSpot.query.filter_by(lot_id=lot.id).count()
+        add_spots(lot.id, existing_spots + 1, new_max_spots, "S")
+
+    elif new_max_spots < old_max_spots:
+        excess = old_max_spots - new_max_spots
+        deletable_spots = removable_spot_ids(lot.id, excess)
+        if len(deletable_spots) < excess:
+            raise LotError(f"Cannot reduce to {new_max_spots}. Only {len(deletable_spots)} empty spots available.")
+        remove_spots(lot.id, deletable_spots)
+
+    for key, value in fields.items():
+        setattr(lot, key, value)
+    lot.version = ParkingLot.version + 1  # re-render cached lot tables
+    return lot
+
+
+def delete_lot(lot):
+    """Delete a lot and its spots; refused while a spot is occupied or booked ahead.
+
+    Finished stays move to the reservation archive, which keeps the lot name,
+    so users and exports still see them. The lot's usage rollups and past
+    advance bookings go with it.
+    """
+    occupied = (
+        db.session.query(Reservation.id)
+        .join(ParkingSpot)
+        .filter(ParkingSpot.lot_id == lot.id, Reservation.leaving_timestamp.is_(None))
+        .first()
+    )
+    if occupied:
+        raise LotError("Cannot delete lot. Some spots are occupied.")
+    upcoming = (
+        db.session.query(SpotBooking.id)
+        .filter(SpotBooking.lot_id == lot.id, SpotBooking.ends_at > datetime.now(),
+                SpotBooking.reservation_id.is_(None))
+        .first()
+    )
+    if upcoming:
+        raise LotError("Cannot delete lot. Some spots are booked in advance.")
+    db.session.execute(delete(SpotBooking).where(SpotBooking.lot_id == lot.id))
+    archive_lot_history(lot.id)
+    db.session.execute(delete(LotUsageHour).where(LotUsageHour.lot_id == lot.id))
+    db.session.execute(delete(LotUsageDay).where(LotUsageDay.lot_id == lot.id))
+    db.session.delete(lot)
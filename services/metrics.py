@@ -0,0 +1,245 @@
+import bisect
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from models.models import db
+
+
+# Per-request profiling, switched on with METRICS_ENABLED.
+#
+# Every request is timed and the SQL statements it sends are counted and timed
+# through the engine's before/after_cursor_execute events. Results are folded
+# into fixed-bucket histograms per endpoint (Flask endpoint name and method),
+# so memory stays bounded by the number of routes whatever the traffic. A
+# statement slower than SLOW_QUERY_MS is logged on the "parking.sql" logger and
+# kept in a short ring buffer with its text; parameters are left out because
+# they can hold emails and password hashes. Counters are per process, like the
+# fragment and user caches: each worker reports its own share.
+#
+# Latency of streamed responses (CSV export, SSE) is the time to the first
+# byte; the body is produced after the request has been recorded.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # seconds
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)  # statements per request
+SLOW_QUERY_LOG = 50       # slow statements kept for the admin page
+STATEMENT_TEXT = 2000     # characters of a slow statement that are kept
+
+logger = logging.getLogger("parking.sql")
+
+
+class Histogram:
+    """Counts per upper bound (plus one overflow bucket), their sum and total."""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimate of the ``q`` quantile, interpolated inside its bucket."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.bounds[i - 1] if i else 0
+                if i == len(self.bounds):
+                    return lower  # overflow bucket has no upper bound
+                return lower + (self.bounds[i] - lower) * (rank - seen) / n
+            seen += n
+        return self.bounds[-1]
+
+    def cumulative(self):
+        """(upper bound, count of observations <= bound) pairs, Prometheus style."""
+        total = 0
+        for bound, n in zip(self.bounds + (float("inf"),), self.counts):
+            total += n
+            yield bound, total
+
+
+class EndpointStats:
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.statements = Histogram(STATEMENT_BUCKETS)
+        self.sql_seconds = 0.0
+        self.max_statements = 0
+        self.statuses = {}
+
+
+class Metrics:
+    def __init__(self, slow_query_ms=100):
+        self.slow_query_ms = slow_query_ms
+        self.started = datetime.now()
+        self.endpoints = {}
+        self.slow_queries = deque(maxlen=SLOW_QUERY_LOG)
+        self.slow_total = 0
+        self._lock = threading.Lock()
+
+    def observe_request(self, endpoint, method, status, seconds, statements, sql_seconds):
+        with self._lock:
+            stats = self.endpoints.get((endpoint, method))
+            if stats is None:
+                stats = self.endpoints[(endpoint, method)] = EndpointStats()
+            stats.latency.observe(seconds)
+            stats.statements.observe(statements)
+            stats.sql_seconds += sql_seconds
+            stats.max_statements = max(stats.max_statements, statements)
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+
+    def observe_slow(self, endpoint, statement, seconds):
+        statement = " ".join(statement.split())[:STATEMENT_TEXT]
+        logger.warning("slow query (%.1f ms) in %s: %s", seconds * 1000, endpoint or "-", statement)
+        with self._lock:
+            self.slow_total += 1
+            self.slow_queries.appendleft({
+                "at": datetime.now(), "endpoint": endpoint, "ms": round(seconds * 1000, 1), "statement": statement,
+            })
+
+    def reset(self):
+        with self._lock:
+            self.started = datetime.now()
+            self.endpoints.clear()
+            self.slow_queries.clear()
+            self.slow_total = 0
+
+    def summary(self):
+        """One row per endpoint for the admin page, slowest p95 first."""
+        with self._lock:
+            rows = []
+            for (endpoint, method), s in self.endpoints.items():
+                count = s.latency.count
+                rows.append({
+                    "endpoint": endpoint,
+                    "method": method,
+                    "requests": count,
+                    "errors": sum(n for status, n in s.statuses.items() if status >= 500),
+                    "p50_ms": round(s.latency.quantile(0.5) * 1000, 1),
+                    "p95_ms": round(s.latency.quantile(0.95) * 1000, 1),
+                    "p99_ms": round(s.latency.quantile(0.99) * 1000, 1),
+                    "avg_statements": round(s.statements.sum / count, 1),
+                    "max_statements": s.max_statements,
+                    "avg_sql_ms": round(s.sql_seconds / count * 1000, 1),
+                })
+            return sorted(rows, key=lambda row: row["p95_ms"], reverse=True), list(self.slow_queries)
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _bound(value):
+    return "+Inf" if value == float("inf") else repr(float(value))
+
+
+def prometheus_text(metrics, extra=()):
+    """Render ``metrics`` in the Prometheus text exposition format.
+
+    ``extra`` is an iterable of (name, type, help, value) gauges/counters
+    without labels, e.g. cache counters.
+    """
+    lines = []
+
+    def header(name, kind, text):
+        lines.append(f"# HELP {name} {text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    with metrics._lock:
+        endpoints = sorted(metrics.endpoints.items(), key=lambda item: (str(item[0][0]), item[0][1]))
+
+        header("parking_requests_total", "counter", "Requests by endpoint, method and status.")
+        for (endpoint, method), s in endpoints:
+            for status, n in sorted(s.statuses.items()):
+                lines.append(f'parking_requests_total{{endpoint="{_label(endpoint)}",method="{method}",'
+                             f'status="{status}"}} {n}')
+
+        for name, text, attr in (
+            ("parking_request_duration_seconds", "Request latency.", "latency"),
+            ("parking_request_sql_statements", "SQL statements issued per request.", "statements"),
+        ):
+            header(name, "histogram", text)
+            for (endpoint, method), s in endpoints:
+                labels = f'endpoint="{_label(endpoint)}",method="{method}"'
+                histogram = getattr(s, attr)
+                for bound, total in histogram.cumulative():
+                    lines.append(f'{name}_bucket{{{labels},le="{_bound(bound)}"}} {total}')
+                lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+                lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+        header("parking_request_sql_seconds_total", "counter", "Time spent in SQL statements.")
+        for (endpoint, method), s in endpoints:
+            lines.append(f'parking_request_sql_seconds_total{{endpoint="{_label(endpoint)}",method="{method}"}} '
+                         f'{s.sql_seconds:.6f}')
+
+        header("parking_slow_queries_total", "counter", f"Statements slower than {metrics.slow_query_ms} ms.")
+        lines.append(f"parking_slow_queries_total {metrics.slow_total}")
+
+    for name, kind, text, value in extra:
+        header(name, kind, text)
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def metrics():
+    """This process's Metrics, or None when METRICS_ENABLED is off."""
+    return current_app.extensions.get("metrics")
+
+
+def init_metrics(app):
+    """Time requests and their SQL for ``app`` if METRICS_ENABLED is set."""
+    if not app.config.get("METRICS_ENABLED"):
+        return
+    recorder = app.extensions["metrics"] = Metrics(app.config.get("SLOW_QUERY_MS", 100))
+    slow_seconds = recorder.slow_query_ms / 1000
+
+    @app.before_request
+    def start_timer():
+        g.metrics_started = time.perf_counter()
+        g.metrics_statements = 0
+        g.metrics_sql_seconds = 0.0
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop("metrics_started", None)
+        if started is not None:
+            # 404/405 have no endpoint; pool them so junk URLs can't grow the table
+            endpoint, method = (request.endpoint, request.method) if request.endpoint else ("<unmatched>", "-")
+            recorder.observe_request(
+                endpoint, method, response.status_code, time.perf_counter() - started,
+                g.metrics_statements, g.metrics_sql_seconds,
+            )
+        return response
+
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_statement(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def record_statement(conn, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - conn.info["metrics_started"].pop()
+        endpoint = None
+        if has_request_context() and "metrics_started" in g:
+            g.metrics_statements += 1
+            g.metrics_sql_seconds += seconds
+            endpoint = request.endpoint
+        if seconds >= slow_seconds:
+            recorder.observe_slow(endpoint, statement, seconds)
+
+    @event.listens_for(engine, "handle_error")
+    def drop_statement(context):
+        # A failed statement never reaches after_cursor_execute
+        if context.connection is not None and context.connection.info.get("metrics_started"):
+            context.connection.info["metrics_started"].pop()
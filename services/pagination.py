@@ -0,0 +1,109 @@
+from dataclasses import dataclass
+from datetime import datetime
+from sqlalchemy import tuple_
+
+
+# Keyset (cursor) pagination.
+#
+# Pages are addressed by the sort key of the row at their edge instead of an
+# OFFSET, so page N costs one index seek whatever N is. The sort key must be
+# unique (end it with the primary key). Cursors are the key values joined with
+# "_", e.g. "2025-01-03T10:15:00_412".
+
+PER_PAGE = 25
+
+
+@dataclass
+class KeysetPage:
+    items: list
+    next_cursor: str = None
+    prev_cursor: str = None
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def encode_cursor(values):
+    return "_".join(v.isoformat() if isinstance(v, datetime) else str(v) for v in values)
+
+
+def decode_cursor(cursor, keys):
+    """Parse a cursor for the given key columns; None if it is missing or malformed."""
+    if not cursor:
+        return None
+    parts = cursor.split("_")
+    if len(parts) != len(keys):
+        return None
+    try:
+        return tuple(
+            datetime.fromisoformat(raw) if key.type.python_type is datetime else key.type.python_type(raw)
+            for key, raw in zip(keys, parts)
+        )
+    except ValueError:
+        return None
+
+
+def keyset_paginate(query, keys, after=None, before=None, per_page=PER_PAGE, descending=True):
+    """Return the KeysetPage of ``query`` ordered by ``keys``.
+
+    ``after`` continues past a next_cursor, ``before`` goes back from a
+    prev_cursor; with neither the first page is returned.
+    """
+    return merged_keyset_paginate([(query, keys)], after, before, per_page, descending)
+
+
+def merged_keyset_paginate(sources, after=None, before=None, per_page=PER_PAGE, descending=True):
+    """Like keyset_paginate, over the rows of several (query, keys) sources together.
+
+    Each source must be sorted by keys of the same names and types, and a key
+    value must not appear in two sources. Every source is read with its own
+    index seek and the pages are merged in Python.
+    """
+    keys = sources[0][1]
+    after = decode_cursor(after, keys)
+    before = decode_cursor(before, keys) if after is None else None
+
+    backwards = before is not None
+    # Walking backwards reads in the opposite order, then flips the page
+    ascending = descending == backwards
+    items = []
+    for query, source_keys in sources:
+        row = tuple_(*source_keys)
+        if after is not None:
+            query = query.filter(row < after if descending else row > after)
+        elif backwards:
+            query = query.filter(row > before if descending else row < before)
+        order = [key.asc() if ascending else key.desc() for key in source_keys]
+        items += query.order_by(*order).limit(per_page + 1).all()
+    if len(sources) > 1:
+        items.sort(key=lambda item: _key_of(item, keys), reverse=not ascending)
+
+    more = len(items) > per_page
+    items = items[:per_page]
+    if backwards:
+        items.reverse()
+
+    if backwards:
+        has_next, has_prev = True, more
+    else:
+        has_next, has_prev = more, after is not None
+
+    page = KeysetPage(items=items)
+    if items and has_next:
+        page.next_cursor = _cursor_of(items[-1], keys)
+    if items and has_prev:
+        page.prev_cursor = _cursor_of(items[0], keys)
+    return page
+
+
+def _key_of(item, keys):
+    return tuple(getattr(item, key.key) for key in keys)
+
+
+def _cursor_of(item, keys):
+    return encode_cursor(_key_of(item, keys))
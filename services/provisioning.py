@@ -0,0 +1,58 @@
+from sqlalchemy import select, insert, delete
+from models.models import db, ParkingSpot, Reservation, SpotBooking
+from services.availability import adjust_free_spots
+
+
+# Bulk spot provisioning.
+#
+# Spots are written with executemany-style Core statements in batches instead
+# of one ORM object per spot. Nothing here commits: callers run lot changes and
+# spot changes in one transaction and commit (or roll back) once.
+
+BATCH_SIZE = 1000
+
+
+class ProvisioningError(Exception):
+    """Raised when spots cannot be removed without touching occupied ones."""
+
+
+def add_spots(lot_id, first, last, prefix):
+    """Insert available spots numbered ``prefix + i`` for i in [first, last]."""
+    for start in range(first, last + 1, BATCH_SIZE):
+        stop = min(start + BATCH_SIZE, last + 1)
+        db.session.execute(insert(ParkingSpot), [
+            {"spot_number": f"{prefix}{i}", "status": "A", "lot_id": lot_id}
+            for i in range(start, stop)
+        ])
+    adjust_free_spots(lot_id, max(last - first + 1, 0))
+
+
+def removable_spot_ids(lot_id, limit):
+    """Ids of up to ``limit`` free spots that never had a reservation or booking, newest first."""
+    return db.session.scalars(
+        select(ParkingSpot.id)
+        .outerjoin(Reservation, Reservation.spot_id == ParkingSpot.id)
+        .where(ParkingSpot.lot_id == lot_id, ParkingSpot.status == "A", Reservation.id.is_(None),
+               ~select(SpotBooking.id).where(SpotBooking.spot_id == ParkingSpot.id).exists())
+        .order_by(ParkingSpot.id.desc())
+        .limit(limit)
+    ).all()
+
+
+def remove_spots(lot_id, spot_ids):
+    """Delete the given free spots in batches.
+
+    Raises ProvisioningError if any of them was booked (now or in advance) in the meantime.
+    """
+    deleted = 0
+    for start in range(0, len(spot_ids), BATCH_SIZE):
+        batch = spot_ids[start:start + BATCH_SIZE]
+        deleted += db.session.execute(
+            delete(ParkingSpot)
+            .where(ParkingSpot.id.in_(batch), ParkingSpot.status == "A",
+                   ~select(SpotBooking.id).where(SpotBooking.spot_id == ParkingSpot.id).exists())
+            .execution_options(synchronize_session=False)
+        ).rowcount
+    if deleted != len(spot_ids):
+        raise ProvisioningError("Some spots were booked while the lot was being resized.")
+    adjust_free_spots(lot_id, -deleted)
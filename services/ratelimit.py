@@ -0,0 +1,67 @@
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+
+
+# In-process token buckets for login attempts.
+#
+# Each key (an email or a client address) gets a bucket of ``burst`` tokens
+# that refills at ``per_minute`` tokens a minute; an attempt costs one token
+# and is refused while the bucket is empty, before any password hashing. At
+# most ``max_keys`` buckets are kept, least recently used first out. A bucket
+# that has refilled completely carries no state, so evicting it loses
+# nothing, and a flood of fresh keys can only push out buckets that were idle
+# longest. Like the user and fragment caches, buckets are per worker process.
+
+
+class TokenBucketLimiter:
+    def __init__(self, burst, per_minute, max_keys=10000):
+        self.burst = burst
+        self.rate = per_minute / 60.0   # tokens per second
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()   # key -> (tokens, monotonic time of last update)
+        self._lock = threading.Lock()
+
+    def _tokens(self, key, now):
+        tokens, updated = self._buckets.get(key, (self.burst, now))
+        return min(self.burst, tokens + (now - updated) * self.rate)
+
+    def retry_after(self, key):
+        """Seconds until ``key`` may try again; 0 if it has a token now."""
+        with self._lock:
+            tokens = self._tokens(key, time.monotonic())
+        return 0 if tokens >= 1 else (1 - tokens) / self.rate
+
+    def take(self, key):
+        """Spend one token of ``key``; returns retry_after() as it was before."""
+        now = time.monotonic()
+        with self._lock:
+            tokens = self._tokens(key, now)
+            if tokens < 1:
+                return (1 - tokens) / self.rate
+            self._buckets[key] = (tokens - 1, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return 0
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+def login_limiters():
+    """(per address, per email) limiters of this process, from the LOGIN_* settings."""
+    limiters = current_app.extensions.get("login_limiters")
+    if limiters is None:
+        config = current_app.config
+        max_keys = config.get("LOGIN_LIMITER_KEYS", 10000)
+        limiters = current_app.extensions["login_limiters"] = (
+            TokenBucketLimiter(config.get("LOGIN_IP_BURST", 20), config.get("LOGIN_IP_PER_MINUTE", 30), max_keys),
+            TokenBucketLimiter(config.get("LOGIN_EMAIL_BURST", 5), config.get("LOGIN_EMAIL_PER_MINUTE", 5), max_keys),
+        )
+    return limiters
@@ -0,0 +1,61 @@
+import re
+from sqlalchemy import func, literal_column, or_, select, table, column
+from models.models import db, ParkingLot
+
+
+# Parking lot text search.
+#
+# On SQLite, lots are matched through the parking_lot_fts FTS5 index (created
+# by migration 5 and kept in sync by triggers): every word typed becomes a
+# prefix term, all terms must match, and results come back best match first.
+# Other databases fall back to the LIKE scan.
+
+SEARCH_COLUMNS = ("prime_location_name", "address", "pincode")
+MAX_RESULTS = 100
+
+lot_fts = table("parking_lot_fts", column("rowid"), column("rank"))
+
+
+def search_lots(text, columns=SEARCH_COLUMNS, limit=MAX_RESULTS):
+    """Return ParkingLots matching ``text`` in any of ``columns``, best first."""
+    if db.engine.dialect.name != "sqlite":
+        return like_search(text, columns, limit)
+
+    expression = fts_expression(text, columns)
+    if not expression:
+        return []
+    # Rank and limit inside the FTS table so FTS5 can keep just the top rows
+    best = (
+        select(lot_fts.c.rowid, lot_fts.c.rank)
+        .where(literal_column("parking_lot_fts").op("MATCH")(expression))
+        .order_by(lot_fts.c.rank)
+        .limit(limit)
+        .subquery()
+    )
+    return (
+        ParkingLot.query
+        .join(best, best.c.rowid == ParkingLot.id)
+        .order_by(best.c.rank)
+        .all()
+    )
+
+
+def fts_expression(text, columns=SEARCH_COLUMNS):
+    """Build an FTS5 query: each word a quoted prefix term, restricted to ``columns``."""
+    terms = " ".join(f'"{word}"*' for word in re.findall(r"\w+", text.lower()))
+    if not terms:
+        return None
+    if tuple(columns) == SEARCH_COLUMNS:
+        return terms
+    return f"{{{' '.join(columns)}}} : ({terms})"
+
+
+def like_search(text, columns=SEARCH_COLUMNS, limit=None):
+    """Case-insensitive substring match; scans the whole table."""
+    pattern = f"%{text.lower()}%"
+    query = ParkingLot.query.filter(or_(
+        *[func.lower(getattr(ParkingLot, name)).like(pattern) for name in columns]
+    ))
+    if limit:
+        query = query.limit(limit)
+    return query.all()
@@ -0,0 +1,82 @@
+import base64
+import json
+from sqlalchemy import select
+from models.models import db, ParkingSpot, Reservation
+from services.billing import quote
+from services.fragments import fragment_cache
+
+
+# Whole-lot spot map for the admin lot page.
+#
+# One query reads just (id, status) of every spot of the lot, in id order,
+# and no ORM objects are built. The map is sent as two compact parts:
+#
+#   ids       runs of consecutive spot ids, [[first_id, count], ...]. Spots
+#             are inserted in batches, so a lot is usually one or a few runs.
+#   occupied  a base64 bitmap, bit i (byte i // 8, lowest bit first) set when
+#             the i-th spot is occupied. Occupancy is scattered, so a bitmap
+#             stays at spots / 8 bytes where runs could grow to one per spot.
+#
+# A 10,000-spot lot comes to about 1.7 kB of JSON. The encoded map is kept in
+# the fragment cache under the lot's version, which changes with every spot
+# status change, so it is rebuilt only after the lot changed. Details of one
+# spot (its number and open reservation) are fetched when it is clicked.
+
+
+def _encode(rows):
+    """(id, status) rows in id order -> (count, id runs, occupied bitmap)."""
+    runs = []
+    bitmap = bytearray()
+    count = 0
+    for spot_id, status in rows:
+        if runs and runs[-1][0] + runs[-1][1] == spot_id:
+            runs[-1][1] += 1
+        else:
+            runs.append([spot_id, 1])
+        if count % 8 == 0:
+            bitmap.append(0)
+        if status != 'A':
+            bitmap[-1] |= 1 << (count % 8)
+        count += 1
+    return count, runs, bitmap
+
+
+def spot_map_json(lot):
+    """The spot map of ``lot`` as JSON text, re-encoded only after the lot changed."""
+    cache = fragment_cache()
+    key = ("spot_map", lot.id, lot.version)
+    text = cache.get(key)
+    if text is None:
+        rows = db.session.execute(
+            select(ParkingSpot.id, ParkingSpot.status)
+            .where(ParkingSpot.lot_id == lot.id)
+            .order_by(ParkingSpot.id)
+        )
+        count, runs, bitmap = _encode(rows)
+        text = json.dumps({
+            "lot_id": lot.id,
+            "version": lot.version,
+            "spots": count,
+            "free": lot.free_spots,
+            "ids": runs,
+            "occupied": base64.b64encode(bitmap).decode(),
+        }, separators=(",", ":"))
+        cache.put(key, text)
+    return text
+
+
+def spot_details(spot):
+    """Number, status and open reservation (with the cost so far) of one spot, as a dict."""
+    details = {"id": spot.id, "spot_number": spot.spot_number, "status": spot.status, "reservation": None}
+    reservation = Reservation.query.filter(
+        Reservation.spot_id == spot.id, Reservation.leaving_timestamp.is_(None)
+    ).first()
+    if reservation is not None:
+        details["reservation"] = {
+            "id": reservation.id,
+            "user_name": reservation.user.name,
+            "vehicle_no": reservation.vehicle_no,
+            "parking_timestamp": reservation.parking_timestamp.isoformat(),
+            "cost_so_far": quote(spot.lot, reservation.parking_timestamp),
+        }
+    return details